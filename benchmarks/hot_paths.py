@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""Benchmarks for the generation, ingest, sync and billing hot paths.
+
+Every benchmark runs in a fresh interpreter against a local Metronome
+stand-in (``stand_in.py``) and its own temporary SQLite database. Data comes
+from fixed seeds and scale parameters, so two runs with the same arguments
+do the same work. For each benchmark the throughput, per-operation latency
+percentiles and peak RSS are printed and can be written to JSON. Results
+are compared with the committed baseline (``baseline.json``, recorded at
+the default scale); a benchmark whose throughput, p95 latency or peak RSS
+is worse than the baseline by more than the tolerance fails the run. A run
+with no baseline at its scale fails too, unless ``--no-compare`` is given.
+
+    python benchmarks/hot_paths.py [--customers 100] [--contracts 2] [--events-per-day 100]
+                                   [--only ingest customer_sync] [--json results.json]
+                                   [--baseline benchmarks/baseline.json] [--save-baseline | --no-compare]
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.stand_in import MetronomeStandIn, StandInData  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / 'baseline.json'
+# Usage is generated for a fixed window, so the same seed always yields the same events
+USAGE_END = datetime(2025, 1, 1, tzinfo=timezone.utc)
+CHUNK = 1000
+RENDER_ROUNDS = 20
+RESYNC_ROUNDS = 3
+UPSERT_ROUNDS = 3
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register ``fn(recorder, args, workdir)`` as benchmark ``name``."""
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+class Recorder:
+    """Collects per-operation latencies and the items they processed during the timed part of a benchmark."""
+
+    def __init__(self):
+        self.samples = []
+        self.items = 0
+        self.seconds = None
+        self._lap = None
+
+    def add(self, seconds, items=1):
+        self.samples.append(seconds)
+        self.items += items
+
+    @contextmanager
+    def op(self, items=1):
+        start = time.perf_counter()
+        yield
+        self.add(time.perf_counter() - start, items)
+
+    @contextmanager
+    def timed(self):
+        """Wall-clock the measured section; throughput is items over this time."""
+        start = self._lap = time.perf_counter()
+        yield
+        self.seconds = time.perf_counter() - start
+
+    def lap(self, items=1):
+        """Record the time since the previous lap (or the start of ``timed``) as one operation."""
+        now = time.perf_counter()
+        self.add(now - self._lap, items)
+        self._lap = now
+
+    def stream(self, chunks):
+        """Yield from an iterable of lists, timing the production of each one."""
+        chunks = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            self.add(time.perf_counter() - start, len(chunk))
+            yield chunk
+
+
+def percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return None
+    index = min(len(sorted_samples) - 1, max(0, round(fraction * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def customer_ids(args):
+    return [customer['id'] for customer in StandInData(args.customers, args.contracts, args.seed).customers]
+
+
+def usage_events(args):
+    from metronome_billing.core.usage import generate_usage_events
+    return generate_usage_events(customer_ids(args), days=args.days, events_per_day=args.events_per_day,
+                                 seed=args.seed, end=USAGE_END)
+
+
+@contextmanager
+def web_app(workdir):
+    from website.app import create_app
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{Path(workdir) / 'bench.db'}"})
+    with app.app_context():
+        yield app
+
+
+@benchmark('generate')
+def bench_generate(recorder, args, workdir):
+    from metronome_billing.utils.concurrency import batched
+    with recorder.timed():
+        for _ in recorder.stream(batched(usage_events(args), CHUNK)):
+            pass
+
+
+@benchmark('ndjson')
+def bench_ndjson(recorder, args, workdir):
+    from metronome_billing.utils.concurrency import batched
+    from metronome_billing.utils.streams import write_ndjson
+    chunks = list(batched(usage_events(args), CHUNK))
+    with recorder.timed():
+        for chunk in chunks:
+            with recorder.op(len(chunk)):
+                write_ndjson(chunk, io.StringIO())
+
+
+@benchmark('ingest')
+def bench_ingest(recorder, args, workdir):
+    from metronome_billing.core.metronome_api import MetronomeAPI
+    from metronome_billing.utils.concurrency import batched, bounded_map
+    api = MetronomeAPI(api_key='bench', pool_size=args.workers)
+    batches = list(batched(usage_events(args), 100))
+
+    def send(batch):
+        with recorder.op(len(batch)):
+            api.ingest(batch)
+
+    with recorder.timed():
+        for batch, _, error in bounded_map(send, batches, workers=args.workers):
+            if error:
+                raise error
+
+
+@benchmark('customer_sync')
+def bench_customer_sync(recorder, args, workdir):
+    from website.app import refresh_customers
+    with web_app(workdir), recorder.timed(), recorder.op(args.customers):
+        success, message = refresh_customers()
+    if not success:
+        raise RuntimeError(message)
+
+
+@benchmark('customer_resync')
+def bench_customer_resync(recorder, args, workdir):
+    from website.app import refresh_customers
+    with web_app(workdir):
+        refresh_customers()
+        with recorder.timed():
+            for _ in range(RESYNC_ROUNDS):
+                with recorder.op(args.customers):
+                    success, message = refresh_customers()
+                if not success:
+                    raise RuntimeError(message)
+
+
+@benchmark('customer_upsert')
+def bench_customer_upsert(recorder, args, workdir):
+    from website.sync import upsert_customers
+    customers = StandInData(args.customers, args.contracts, args.seed).customers
+    with web_app(workdir), recorder.timed():
+        for round_ in range(UPSERT_ROUNDS):
+            # A new name each round, so every row is written: inserted first, then updated
+            payloads = [{**customer, 'name': f"{customer['name']} r{round_}"} for customer in customers]
+            with recorder.op(len(payloads)):
+                upsert_customers(payloads)
+
+
+@benchmark('contract_sync')
+def bench_contract_sync(recorder, args, workdir):
+    from website.app import refresh_contracts
+    from website.sync import upsert_customers
+    with web_app(workdir):
+        upsert_customers(StandInData(args.customers, args.contracts, args.seed).customers)
+        started = False
+
+        def progress(fraction=None, message=None):
+            # Called before each customer, so the laps are the per-customer times
+            nonlocal started
+            if started:
+                recorder.lap()
+            started = True
+
+        with recorder.timed():
+            success, message = refresh_contracts(progress=progress)
+            recorder.lap()
+    if not success:
+        raise RuntimeError(message)
+
+
+@benchmark('customers_render')
+def bench_customers_render(recorder, args, workdir):
+    from website.app import refresh_customers
+    from website.models import Customer
+    with web_app(workdir) as app:
+        refresh_customers()
+        client = app.test_client()
+        # The second page, by keyset cursor
+        cursor = Customer.query.order_by(Customer.created_at.desc(), Customer.id.desc()).offset(19).first().id
+        with recorder.timed():
+            for _ in range(RENDER_ROUNDS):
+                with recorder.op():
+                    response = client.get(f'/customers?cursor={cursor}')
+                if response.status_code != 200:
+                    raise RuntimeError(f"/customers returned {response.status_code}")
+
+
+@benchmark('calculate_bill')
+def bench_calculate_bill(recorder, args, workdir):
+    from metronome_billing.core.billing import BillingManager
+    from metronome_billing.core.usage import usage_metric
+    manager = BillingManager()
+    for event in usage_events(args):
+        metric = usage_metric(event)
+        if metric:
+            timestamp = datetime.fromisoformat(event['timestamp'])
+            manager.record_usage(event['customer_id'], metric[0], metric[1], timestamp)
+    start = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    with recorder.timed():
+        for customer_id in sorted(manager.usage_data):
+            with recorder.op():
+                manager.calculate_bill(customer_id, start, USAGE_END)
+
+
+def run_child(args):
+    """Run one benchmark in this process and print its result as JSON."""
+    recorder = Recorder()
+    BENCHMARKS[args.child](recorder, args, args.workdir)
+    samples = sorted(recorder.samples)
+    result = {
+        'operations': len(samples),
+        'items': recorder.items,
+        'seconds': round(recorder.seconds, 4),
+        'throughput': round(recorder.items / recorder.seconds, 2) if recorder.seconds else None,
+        'peak_rss_bytes': peak_rss_bytes(),
+    }
+    for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+        value = percentile(samples, fraction)
+        result[f"{name}_ms"] = round(value * 1000, 3) if value is not None else None
+    result['max_ms'] = round(samples[-1] * 1000, 3) if samples else None
+    print(json.dumps(result))
+
+
+SCALE = ('customers', 'contracts', 'events_per_day', 'days', 'seed', 'workers')
+
+
+def run_benchmark(name, args, stand_in, workdir):
+    command = [sys.executable, __file__, '--child', name, '--workdir', workdir]
+    for option in SCALE:
+        command += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+    env = dict(os.environ, METRONOME_BASE_URL=stand_in.base_url, METRONOME_API_KEY='bench',
+               METRONOME_USAGE_SPOOL=str(Path(workdir) / 'spool'))
+    completed = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+    if completed.returncode:
+        raise RuntimeError(f"{name} failed:\n{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def regressions(name, result, baseline, tolerance):
+    """Ways ``result`` is worse than ``baseline`` by more than ``tolerance``."""
+    found = []
+    if result['throughput'] and baseline.get('throughput') and \
+            result['throughput'] < baseline['throughput'] * (1 - tolerance):
+        found.append(f"throughput {result['throughput']:,.0f}/s vs {baseline['throughput']:,.0f}/s")
+    for key, label in (('p95_ms', 'p95'), ('peak_rss_bytes', 'peak RSS')):
+        if result.get(key) and baseline.get(key) and result[key] > baseline[key] * (1 + tolerance):
+            found.append(f"{label} {result[key]:,} vs {baseline[key]:,}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--customers', type=int, default=100)
+    parser.add_argument('--contracts', type=int, default=2, help='contracts per customer')
+    parser.add_argument('--events-per-day', type=int, default=100, help='usage events per customer and day')
+    parser.add_argument('--days', type=int, default=7, help='days of usage')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=8, help='concurrent API calls for ingest')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='run only these benchmarks')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='baseline results to compare with')
+    compare = parser.add_mutually_exclusive_group()
+    compare.add_argument('--save-baseline', action='store_true', help='store these results as the baseline')
+    compare.add_argument('--no-compare', action='store_true', help='only print the results, without a baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown before failing (default 0.2)')
+    parser.add_argument('--child', choices=sorted(BENCHMARKS), help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    scale = {option: getattr(args, option) for option in SCALE}
+    baseline = None
+    baseline_path = Path(args.baseline)
+    if not (args.save_baseline or args.no_compare):
+        if not baseline_path.exists():
+            sys.exit(f"No baseline at {baseline_path}: record one with --save-baseline, or pass --no-compare")
+        baseline = json.loads(baseline_path.read_text())
+        if baseline.get('scale') != scale:
+            sys.exit(f"Baseline {baseline_path} was recorded at scale {baseline.get('scale')}, not {scale}: "
+                     f"record one at this scale with --save-baseline --baseline FILE, or pass --no-compare")
+
+    results = {}
+    failed = False
+    data = StandInData(args.customers, args.contracts, args.seed)
+    with MetronomeStandIn(data) as stand_in:
+        for name in args.only or BENCHMARKS:
+            with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as workdir:
+                result = results[name] = run_benchmark(name, args, stand_in, workdir)
+            previous = (baseline or {}).get('benchmarks', {}).get(name)
+            worse = regressions(name, result, previous, args.tolerance) if previous else []
+            failed |= bool(worse)
+            status = 'FAIL' if worse else 'ok'
+            rss = f"{result['peak_rss_bytes'] / 2 ** 20:.0f} MB" if result['peak_rss_bytes'] else '-'
+            print(f"{status:4} {name:18} {result['throughput'] or 0:>12,.0f}/s  p50 {result['p50_ms']:>9} ms  "
+                  f"p95 {result['p95_ms']:>9} ms  p99 {result['p99_ms']:>9} ms  rss {rss:>7}"
+                  + (f"  ({'; '.join(worse)})" if worse else ''))
+
+    report = {
+        'scale': scale,
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'processor': platform.machine(), 'cpus': os.cpu_count()},
+        'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'benchmarks': results,
+    }
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(report, indent=2))
+        print(f"Saved baseline to {baseline_path}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
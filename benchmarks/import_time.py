@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Import-time regression check for the web app and CLI entry points.
+
+Each target is imported in a fresh interpreter several times. The check fails
+if the median import time exceeds the target's budget, or if importing it
+pulls in a dependency that must only load lazily (pandas, numpy, stripe, ...).
+
+    python benchmarks/import_time.py [--runs 5] [--json results.json]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# module -> (budget in seconds, modules that must not be imported eagerly)
+TARGETS = {
+    'website.app': (0.8, ('pandas', 'numpy', 'stripe', 'requests')),
+    'metronome_billing.core.metronome_api': (0.2, ('pandas', 'numpy', 'stripe', 'requests')),
+    'metronome_billing.core.rate_schedule': (0.2, ('pandas', 'numpy', 'requests')),
+    'scripts.get_rate_card': (0.3, ('pandas', 'numpy', 'requests')),
+}
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure(module, runs):
+    samples = []
+    loaded = set()
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE.format(module=module)],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        samples.append(result['seconds'])
+        loaded = set(result['modules'])
+    return statistics.median(samples), loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    results = {}
+    failed = False
+    for module, (budget, forbidden) in TARGETS.items():
+        seconds, loaded = measure(module, args.runs)
+        eager = [name for name in forbidden if name in loaded]
+        ok = seconds <= budget and not eager
+        failed |= not ok
+        results[module] = {'median_seconds': round(seconds, 4), 'budget_seconds': budget, 'eager_imports': eager}
+        status = 'ok' if ok else 'FAIL'
+        extra = f" (eagerly imports {', '.join(eager)})" if eager else ''
+        print(f"{status:4} {module:45} {seconds * 1000:7.1f} ms / {budget * 1000:.0f} ms{extra}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
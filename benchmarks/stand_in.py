@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""Local Metronome stand-in for benchmarks and offline runs.
+
+Serves the subset of the Metronome v1 API this project calls (customer
+listing and lookup, /ingest, contracts, products, rate cards and their
+rates, billable metrics and balances) from data generated with a fixed
+seed, so every run sees the same customers and contracts. Point the app,
+the CLI or ``MetronomeAPI`` at it with ``METRONOME_BASE_URL``:
+
+    python benchmarks/stand_in.py --customers 1000 --port 8765
+    METRONOME_BASE_URL=http://127.0.0.1:8765/v1 python -m metronome_billing sync
+"""
+import argparse
+import json
+import random
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PAGE_LIMIT = 100
+PRODUCTS = 5
+RATE_CARDS = 2
+
+
+def _uuid(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _timestamp(moment):
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class StandInData:
+    """Customers, contracts, products and rate cards generated from one seed."""
+
+    def __init__(self, customers=100, contracts_per_customer=1, seed=1):
+        rng = random.Random(seed)
+        epoch = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.products = [{'id': _uuid(rng), 'name': f"Product {i}", 'type': 'USAGE'} for i in range(PRODUCTS)]
+        self.rate_cards = [{'id': _uuid(rng), 'name': f"Rate card {i}"} for i in range(RATE_CARDS)]
+        self.billable_metrics = [{'id': _uuid(rng), 'name': f"Metric {i}", 'aggregation_type': 'SUM'}
+                                 for i in range(PRODUCTS)]
+        self.customers = []
+        self.contracts = {}
+        for i in range(customers):
+            created = epoch + timedelta(minutes=rng.randrange(525600))
+            customer = {
+                'id': _uuid(rng),
+                'name': f"Customer {i:06d}",
+                'external_id': f"ext-{i:06d}",
+                'ingest_aliases': [f"ext-{i:06d}"],
+                'custom_fields': {},
+                'customer_config': {'salesforce_account_id': None},
+                'created_at': _timestamp(created),
+                'updated_at': _timestamp(created),
+            }
+            self.customers.append(customer)
+            self.contracts[customer['id']] = [{
+                'id': _uuid(rng),
+                'customer_id': customer['id'],
+                'status': 'active',
+                'initial': {
+                    'name': f"Contract {i:06d}-{j}",
+                    'starting_at': _timestamp(created.replace(hour=0, minute=0)),
+                    'rate_card_id': rng.choice(self.rate_cards)['id'],
+                    'product_id': rng.choice(self.products)['id'],
+                },
+            } for j in range(contracts_per_customer)]
+        self.rates = {card['id']: [{
+            'product_id': product['id'],
+            'product_name': product['name'],
+            'starting_at': _timestamp(epoch),
+            'entitled': True,
+            'pricing_group_values': {},
+            'rate': {'rate_type': 'FLAT', 'price': (c + 1) * (p + 1) / 100},
+        } for p, product in enumerate(self.products)] for c, card in enumerate(self.rate_cards)}
+        self.customers_by_id = {customer['id']: customer for customer in self.customers}
+        self.by_id = {record['id']: record for record in self.products + self.rate_cards}
+
+
+class MetronomeStandIn:
+    """Threaded HTTP server answering like Metronome, on 127.0.0.1 and a free port by default.
+
+    ``latency`` adds a fixed delay (seconds) to every response to model the
+    network. ``page_size`` caps every list page; like Metronome, list
+    endpoints read ``next_page`` and ``limit`` from the query string, for
+    POST lists too. Counts of requests per endpoint and of ingested events are kept
+    for the caller. Use as a context manager or call ``start()`` / ``stop()``.
+    """
+
+    def __init__(self, data=None, host='127.0.0.1', port=0, latency=0.0, page_size=PAGE_LIMIT):
+        self.data = data or StandInData()
+        self.latency = latency
+        self.page_size = page_size
+        self.requests = {}
+        self.ingested = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metronome-stand-in', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, endpoint, events=0):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.ingested += events
+
+    def _handler(self):
+        stand_in = self
+        data = self.data
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are separate writes; without this, keep-alive responses wait on delayed ACKs
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=None):
+                encoded = json.dumps(body).encode() if body is not None else b''
+                if stand_in.latency:
+                    threading.Event().wait(stand_in.latency)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def _page(self, records, query):
+                start = int((query.get('next_page') or ['0'])[0] or 0)
+                limit = min(int((query.get('limit') or [stand_in.page_size])[0]), stand_in.page_size)
+                end = start + limit
+                self._send(200, {'data': records[start:end], 'next_page': str(end) if end < len(records) else None})
+
+            def _found(self, record):
+                if record is None:
+                    self._send(404, {'message': 'Not found'})
+                else:
+                    self._send(200, {'data': record})
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path == '/v1/customers':
+                    stand_in._count('GET /customers')
+                    self._page(data.customers, query)
+                elif url.path == '/v1/billable-metrics':
+                    stand_in._count('GET /billable-metrics')
+                    self._send(200, {'data': data.billable_metrics, 'next_page': None})
+                elif url.path.startswith('/v1/customers/'):
+                    stand_in._count('GET /customers/{id}')
+                    self._found(data.customers_by_id.get(url.path.rsplit('/', 1)[1]))
+                else:
+                    self._send(404, {'message': 'Not found'})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else {}
+                url = urlparse(self.path)
+                path, query = url.path[len('/v1'):], parse_qs(url.query)
+                if path == '/ingest':
+                    stand_in._count('POST /ingest', events=len(body))
+                    self._send(200)
+                    return
+                stand_in._count(f"POST {path}")
+                if path == '/contracts/list':
+                    self._send(200, {'data': data.contracts.get(body.get('customer_id'), [])})
+                elif path in ('/contract-pricing/rate-cards/get', '/contract-pricing/products/get'):
+                    self._found(data.by_id.get(body.get('id')))
+                elif path == '/contract-pricing/products/list':
+                    self._page(data.products, query)
+                elif path == '/contract-pricing/rate-cards/getRates':
+                    self._page(data.rates.get(body.get('rate_card_id'), []), query)
+                elif path == '/contract-pricing/rate-cards/list':
+                    self._page(data.rate_cards, query)
+                elif path == '/contracts/customerBalances/list':
+                    self._page([], query)
+                elif path in ('/customers', '/contracts/create', '/contracts'):
+                    self._send(200, {'data': {'id': str(uuid.uuid4()), **body}})
+                elif path == '/setCustomerBillingProviderConfigurations':
+                    self._send(200, {'data': []})
+                else:
+                    self._send(404, {'message': 'Not found'})
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--customers', type=int, default=1000)
+    parser.add_argument('--contracts', type=int, default=1, help='contracts per customer')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--page-size', type=int, default=PAGE_LIMIT, help='records per list page')
+    args = parser.parse_args()
+
+    data = StandInData(args.customers, args.contracts, args.seed)
+    stand_in = MetronomeStandIn(data, port=args.port, latency=args.latency, page_size=args.page_size)
+    print(f"Serving {args.customers} customers at {stand_in.base_url} (Ctrl-C to stop)")
+    try:
+        stand_in._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stand_in._server.server_close()
+
+
+if __name__ == '__main__':
+    main()
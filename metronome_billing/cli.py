@@ -0,0 +1,605 @@
+"""Command line interface: ``python -m metronome_billing <command>``.
+
+Every command shares one pooled ``MetronomeAPI`` client, runs remote calls
+on a bounded thread pool (``--workers``), streams its input and output
+instead of loading whole files, and reports progress on stderr so stdout
+can be piped. API keys come from ``--api-key`` / ``--stripe-key``, falling
+back to ``METRONOME_API_KEY`` / ``STRIPE_API_KEY`` and then the config ini.
+"""
+import argparse
+import csv
+import logging
+import os
+import sys
+import uuid
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+from .core.export import COMPRESSION, CUSTOMER_FIELDS, FORMATS, customer_row
+from .core.rate_schedule import DEFAULT_RATE_CARD_ID
+from .utils.concurrency import batched, bounded_map, in_submission_order
+from .utils.spool import Spool
+from .utils.streams import STDIO, atomic_write, open_text, read_csv_rows, read_ndjson, write_ndjson
+from .utils.tracing import configure, environment_endpoint, flush, trace, traced
+
+ONBOARD_FIELDS = CUSTOMER_FIELDS + ['stripe_customer_id', 'contract_id']
+INGEST_BATCH_SIZE = 100  # Metronome's per-request limit for /ingest
+
+logger = logging.getLogger(__name__)
+
+
+def make_api(args, fresh=False):
+    from .core.metronome_api import MetronomeAPI
+    return MetronomeAPI(api_key=args.api_key, pool_size=args.workers, fresh=fresh)
+
+
+def make_stripe(args):
+    import stripe
+    from .utils.config import Config
+    from .utils.metrics import instrument_stripe
+    stripe.api_key = args.stripe_key or Config().stripe_api_key
+    # Stripe calls then show up in --trace output
+    instrument_stripe(stripe)
+    return stripe
+
+
+def console():
+    from rich.console import Console
+    return Console(stderr=True)
+
+
+@contextmanager
+def progress_bar(args, description, total=None):
+    """Yield an ``advance(n=1)`` callback driving a progress bar on stderr."""
+    if args.quiet:
+        yield lambda n=1: None
+        return
+    from rich.progress import Progress
+    with Progress(console=console()) as progress:
+        task = progress.add_task(description, total=total)
+        yield lambda n=1: progress.update(task, advance=n)
+
+
+def fraction_progress(advance):
+    """Adapt a ``progress_bar(total=100)`` callback to the ``progress(fraction, message)`` steps report."""
+    done = 0.0
+
+    def progress(fraction=None, message=None):
+        nonlocal done
+        if fraction is not None:
+            advance((fraction - done) * 100)
+            done = fraction
+    return progress
+
+
+def contract_start(now=None):
+    """Contracts start at midnight UTC of the current day."""
+    return (now or datetime.now(timezone.utc)).strftime("%Y-%m-%dT00:00:00.000Z")
+
+
+def billing_provider_entry(customer_id, stripe_customer_id):
+    return {
+        "customer_id": customer_id,
+        "billing_provider": "stripe",
+        "configuration": {
+            "stripe_customer_id": stripe_customer_id,
+            "stripe_collection_method": "charge_automatically"
+        },
+        "delivery_method": "direct_to_billing_provider"
+    }
+
+
+def parse_time(value):
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+# Commands. Each takes the parsed arguments and returns the process exit code.
+
+def cmd_sync(args):
+    """Pull rates, products, customers and contracts from Metronome into the web app's database."""
+    import website.app
+    from website.app import create_app, refresh_contracts, refresh_customers, refresh_products, refresh_rates
+
+    if args.api_key:
+        # The refresh steps read the web app's module-level key
+        website.app.metronome_api_key = args.api_key
+    steps = {'rates': refresh_rates, 'products': refresh_products, 'customers': refresh_customers,
+             'contracts': refresh_contracts}
+    selected = [name for name in steps if getattr(args, name)] or list(steps)
+    out = console()
+    failed = False
+    with create_app().app_context():
+        for name in selected:
+            with progress_bar(args, f"[cyan]Syncing {name}...", total=100) as advance:
+                success, message = steps[name](progress=fraction_progress(advance))
+            out.print(f"{'✓' if success else '✗'} {message}", style="green" if success else "red")
+            failed = failed or not success
+    return 1 if failed else 0
+
+
+def cmd_rollup(args):
+    """Apply spooled usage events to the web app's usage analytics rollups."""
+    from website.app import create_app
+    from website.usage_rollup import drain_spool
+
+    with create_app().app_context(), progress_bar(args, "[cyan]Rolling up usage...", total=100) as advance:
+        segments, events = drain_spool(Spool(args.spool), progress=fraction_progress(advance))
+    console().print(f"✓ Added {events} events from {segments} spool segments", style="bold green")
+    return 0
+
+
+def cmd_forecast(args):
+    """Project each customer's month-end spend from the usage rollups and flag budget overruns."""
+    from website.app import create_app
+    from website.forecast import run_forecast
+    from website.models import SpendProjection
+
+    api = None if args.skip_balances else make_api(args)
+    with create_app().app_context():
+        with progress_bar(args, "[cyan]Forecasting...", total=100) as advance:
+            summary = run_forecast(api, progress=fraction_progress(advance))
+        if args.output:
+            with open_text(args.output, 'w') as handle:
+                writer = csv.writer(handle)
+                writer.writerow(['customer_id', 'spend_to_date', 'projected', 'projected_high', 'balance', 'exhausted_at'])
+                for projection in SpendProjection.query.order_by(SpendProjection.projected.desc()).yield_per(1000):
+                    writer.writerow([projection.customer_id, projection.spend_to_date, projection.projected,
+                                     projection.projected_high, projection.balance, projection.exhausted_at or ''])
+
+    out = console()
+    for alert in summary['alerts']:
+        out.print(f"  {alert['customer_id']}: ${alert['projected_remaining']:,.2f} projected vs "
+                  f"${alert['balance']:,.2f} left, runs out {alert['exhausted_at']:%Y-%m-%d %H:00}", style="yellow")
+    out.print(f"✓ Forecast {summary['customers']} customers in {summary['seconds']:.1f}s, "
+              f"{len(summary['alerts'])} budget alerts", style="bold green")
+    return 0
+
+
+def cmd_reconcile(args):
+    """Diff Metronome customers against Stripe, contracts and the local database."""
+    from website.app import create_app
+    from website.reconcile import RECONCILE_DIR, reconcile_customers
+
+    api = make_api(args, fresh=True)
+    stripe = None if args.skip_stripe else make_stripe(args)
+    with create_app().app_context(), progress_bar(args, "[cyan]Reconciling...", total=100) as advance:
+        summary = reconcile_customers(api, stripe=stripe, workdir=args.workdir or RECONCILE_DIR,
+                                      progress=fraction_progress(advance))
+    out = console()
+    out.print(f"Records: {summary['records']}; re-checked {summary['buckets_rechecked']}/{summary['buckets_total']} buckets")
+    for issue, count in sorted(summary['issues'].items()):
+        out.print(f"  {issue}: {count}", style="yellow")
+    out.print(f"✓ Drift report: {summary['report']}", style="bold green")
+    return 0
+
+
+def cmd_export(args):
+    """Stream every Metronome customer to CSV, NDJSON or Parquet as pages arrive."""
+    from .core.export import default_compression, export_rows, file_suffix, snapshot_rows
+
+    api = make_api(args)
+    compression = default_compression(args.format) if args.compression == 'default' else args.compression
+    if compression == 'none':
+        compression = None
+    with progress_bar(args, "[cyan]Exporting customers...") as advance:
+        rows = (customer_row(customer) for customer in api.iter_customers())
+        if args.snapshot:
+            result = snapshot_rows(rows, args.snapshot, fmt=args.format, compression=compression, on_row=advance)
+        else:
+            output = args.output or f"current_customers{file_suffix(args.format, compression)}"
+            result = export_rows(rows, output, fmt=args.format, compression=compression, on_row=advance)
+    if result['written']:
+        console().print(f"✓ Exported {result['rows']} customers to {result['path']}", style="bold green")
+    else:
+        console().print(f"✓ {result['rows']} customers unchanged since snapshot {result['path']}", style="bold green")
+    return 0
+
+
+def cmd_onboard(args):
+    """Create customers end to end: Metronome customer, Stripe customer, billing link, contract."""
+    api = make_api(args, fresh=True)
+    stripe = None if args.skip_stripe else make_stripe(args)
+
+    @traced('onboard_customer')
+    def onboard(_):
+        customer = api._make_request("POST", "/customers", json={
+            "name": f"Sample Company Inc. - {uuid.uuid4()}",
+            "external_id": str(uuid.uuid4()),
+            "customer_config": {"salesforce_account_id": str(uuid.uuid4())}
+        })['data']
+        row = {**customer_row(customer), 'stripe_customer_id': '', 'contract_id': ''}
+        if stripe:
+            stripe_customer = stripe.Customer.create(name=customer['name'], metadata={
+                'metronome_customer_id': customer['id'],
+                'metronome_external_id': customer.get('external_id', '')
+            })
+            api._make_request("POST", "/setCustomerBillingProviderConfigurations",
+                              json={"data": [billing_provider_entry(customer['id'], stripe_customer.id)]})
+            row['stripe_customer_id'] = stripe_customer.id
+        contract = api._make_request("POST", "/contracts/create", json={
+            "customer_id": customer['id'],
+            "rate_card_id": args.rate_card,
+            "starting_at": contract_start()
+        })
+        row['contract_id'] = contract.get('data', {}).get('id', '')
+        return row
+
+    return _write_results(args, onboard, range(args.count), ONBOARD_FIELDS,
+                          "[green]Onboarding customers...", args.count, "onboarded")
+
+
+def cmd_contracts(args):
+    """Create a contract for every customer in a CSV that does not have one yet."""
+    api = make_api(args)
+
+    def create(row):
+        if row.get('contract_id') and not args.force:
+            return row
+        response = api._make_request("POST", "/contracts/create", json={
+            "customer_id": row['customer_id'],
+            "rate_card_id": args.rate_card,
+            "starting_at": contract_start()
+        })
+        return {**row, 'contract_id': response.get('data', {}).get('id', '')}
+
+    with open_text(args.input) as handle:
+        fieldnames = next(csv.reader(handle), [])
+    if 'contract_id' not in fieldnames:
+        fieldnames.append('contract_id')
+    return _write_results(args, create, read_csv_rows(args.input), fieldnames,
+                          "[green]Creating contracts...", None, "processed",
+                          output=args.output or args.input)
+
+
+def _write_results(args, fn, items, fieldnames, description, total, verb, output=None):
+    """Run ``fn`` over ``items`` concurrently and stream the returned rows to CSV in completion order."""
+    out = console()
+    succeeded = failed = 0
+    with atomic_write(output or args.output) as handle, progress_bar(args, description, total) as advance:
+        writer = csv.DictWriter(handle, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        for item, row, error in bounded_map(fn, items, workers=args.workers):
+            if error:
+                failed += 1
+                out.print(f"✗ {item if not isinstance(item, dict) else item.get('name', item)}: {error}", style="red")
+                if isinstance(item, dict):
+                    writer.writerow(item)
+            else:
+                succeeded += 1
+                writer.writerow(row)
+            advance()
+    out.print(f"✓ {succeeded} {verb}, {failed} failed", style="bold green" if not failed else "bold yellow")
+    return 1 if failed else 0
+
+
+def cmd_link(args):
+    """Link Metronome customers to their Stripe customers, many per request."""
+    api = make_api(args)
+    rows = (row for row in read_csv_rows(args.input) if row.get('customer_id') and row.get('stripe_customer_id'))
+    batches = batched(rows, args.batch_size)
+
+    def link(batch):
+        api._make_request("POST", "/setCustomerBillingProviderConfigurations", json={
+            "data": [billing_provider_entry(row['customer_id'], row['stripe_customer_id']) for row in batch]
+        })
+        return len(batch)
+
+    out = console()
+    linked = failed = 0
+    with progress_bar(args, "[green]Linking customers...") as advance:
+        for batch, count, error in bounded_map(link, batches, workers=args.workers):
+            if error:
+                failed += len(batch)
+                out.print(f"✗ Failed to link {len(batch)} customers starting with {batch[0]['customer_id']}: {error}", style="red")
+            else:
+                linked += count
+            advance(len(batch))
+    out.print(f"✓ Linked {linked} customers, {failed} failed", style="bold green" if not failed else "bold yellow")
+    return 1 if failed else 0
+
+
+def cmd_generate(args):
+    """Write synthetic usage events as NDJSON, ready for ``ingest`` and ``bill``."""
+    from .core.usage import generate_usage_events
+
+    def customer_ids():
+        yield from args.customer_id or []
+        if args.customers:
+            for row in read_csv_rows(args.customers):
+                if row.get('customer_id'):
+                    yield row['customer_id']
+
+    events = generate_usage_events(customer_ids(), days=args.days, events_per_day=args.events_per_day,
+                                   event_types=args.event_types, seed=args.seed)
+    with open_text(args.output, 'w') as handle, progress_bar(args, "[cyan]Generating events...") as advance:
+        count = write_ndjson(_counting(events, advance), handle)
+    console().print(f"✓ Generated {count} events to {args.output}", style="bold green")
+    return 0
+
+
+def _counting(records, advance, every=1000):
+    """Pass records through, advancing the progress bar every ``every`` records."""
+    count = 0
+    for record in records:
+        yield record
+        count += 1
+        if count % every == 0:
+            advance(every)
+    advance(count % every)
+
+
+def cmd_ingest(args):
+    """Send NDJSON usage events to Metronome in concurrent batches."""
+    from .core.anomaly import AnomalyDetector, describe
+
+    api = make_api(args)
+    out = console()
+    sent = failed = 0
+    failed_handle = open(args.failed, 'w', encoding='utf-8') if args.failed else None
+    anomalies_handle = open(args.anomalies, 'w', encoding='utf-8') if args.anomalies else None
+
+    def report(anomaly):
+        logger.warning(describe(anomaly))
+        if anomalies_handle:
+            write_ndjson([anomaly], anomalies_handle)
+
+    # Sent events are watched for usage spikes and drops unless --no-detect
+    detector = None if args.no_detect else AnomalyDetector(on_anomaly=report)
+    # Sent events are spooled for the web app's usage analytics unless --no-spool
+    spool = nullcontext(lambda events: None) if args.no_spool else Spool().writer()
+    try:
+        with progress_bar(args, "[green]Ingesting events...") as advance, spool as write_spool:
+            batches = enumerate(batched(read_ndjson(args.input), min(args.batch_size, INGEST_BATCH_SIZE)))
+            # Batches are handled in file order, so the detector sees each customer's usage in time order
+            results = bounded_map(lambda item: api.ingest(item[1]), batches, workers=args.workers)
+            for (_, batch), _, error in in_submission_order(results):
+                if error:
+                    failed += len(batch)
+                    logger.warning(f"Failed to ingest batch of {len(batch)} events: {error}")
+                    if failed_handle:
+                        write_ndjson(batch, failed_handle)
+                else:
+                    sent += len(batch)
+                    write_spool(batch)
+                    if detector is not None:
+                        detector.observe(batch)
+                advance(len(batch))
+        if detector is not None:
+            detector.flush()
+    finally:
+        for handle in (failed_handle, anomalies_handle):
+            if handle:
+                handle.close()
+    anomalies = f", {detector.anomaly_count} usage anomalies" if detector is not None else ""
+    if detector is not None and detector.invalid_events:
+        anomalies += f" ({detector.invalid_events} events with unreadable timestamps not checked)"
+    out.print(f"✓ Ingested {sent} events, {failed} failed{anomalies}", style="bold green" if not failed else "bold yellow")
+    return 1 if failed else 0
+
+
+def cmd_bill(args):
+    """Estimate each customer's bill for a period from NDJSON usage events."""
+    from .core.billing import BillingManager
+    from .core.rate_schedule import default_rate_schedule
+    from .core.usage import usage_metric
+
+    start = parse_time(args.start) if args.start else datetime.min.replace(tzinfo=timezone.utc)
+    end = parse_time(args.end) if args.end else datetime.max.replace(tzinfo=timezone.utc)
+    # Priced at the stored rate card rates of each hour; `sync --rates` refreshes them
+    manager = BillingManager(rates=default_rate_schedule(), rate_card_id=DEFAULT_RATE_CARD_ID)
+    with progress_bar(args, "[cyan]Reading usage...") as advance:
+        for event in _counting(read_ndjson(args.input), advance):
+            metric = usage_metric(event)
+            if metric and event.get('customer_id'):
+                manager.record_usage(event['customer_id'], metric[0], metric[1], parse_time(event['timestamp']))
+
+    grand_total = 0.0
+    with open_text(args.output, 'w') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(['customer_id', 'metric', 'quantity', 'amount'])
+        for customer_id in sorted(manager.usage_data):
+            bill = manager.calculate_bill(customer_id, start, end)
+            for metric, line in sorted(bill['usage_breakdown'].items()):
+                writer.writerow([customer_id, metric, round(line['quantity'], 6), round(line['amount'], 6)])
+            grand_total += bill['total_amount']
+    console().print(f"✓ Billed {len(manager.usage_data)} customers, total ${grand_total:,.2f}", style="bold green")
+    return 0
+
+
+def cmd_traces(args):
+    """Show the slowest steps and sequential spans of traces written with --trace."""
+    from .utils.tracing import format_trace, group_traces, load_spans, serial_runs
+
+    with open_text(args.input) as handle:
+        roots = group_traces(load_spans(handle))
+    if args.name:
+        roots = [root for root in roots if args.name in root['name']]
+    if not roots:
+        console().print("No traces found", style="yellow")
+        return 1
+    for root in roots[-args.last:]:
+        started = datetime.fromtimestamp(root['start'], timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        print(f"{root['name']}  {(root['end'] - root['start']) * 1000:.1f} ms  {started} UTC  trace {root['trace_id']}")
+        for line in format_trace(root, max_depth=args.depth):
+            print(line)
+        for run in serial_runs(root)[:5]:
+            names = ', '.join(f"{count} x {name}" for name, count in run['names'])
+            print(f"  sequential under {run['parent']}: {run['count']} spans ({names}) took {run['total']:.3f} s; "
+                  f"the longest took {run['longest']:.3f} s")
+        print()
+    return 0
+
+
+def cmd_cache(args):
+    """Show the Metronome response cache's hit rates per endpoint, or clear it."""
+    from .core.response_cache import DEFAULT_CACHE_PATH, ResponseCache, default_response_cache
+
+    if default_response_cache() is None and not DEFAULT_CACHE_PATH.exists():
+        console().print("The response cache is off; enable it with --cache or METRONOME_RESPONSE_CACHE=1",
+                        style="yellow")
+        return 0
+    cache = default_response_cache() or ResponseCache()
+    if args.clear:
+        cache.clear()
+        console().print(f"✓ Cleared {cache.path}", style="bold green")
+        return 0
+    stats = cache.stats()
+    state = 'enabled' if default_response_cache() else 'disabled; enable with --cache or METRONOME_RESPONSE_CACHE=1'
+    print(f"{cache.path} ({state})")
+    print(f"{'endpoint':<42} {'hits':>7} {'stale':>7} {'misses':>7} {'hit rate':>8} {'entries':>7} {'size':>9}")
+    for endpoint, row in sorted(stats.items()):
+        rate = f"{row['hit_rate']:.0%}" if row['hit_rate'] is not None else '-'
+        print(f"{endpoint:<42} {row['hit']:>7} {row['stale']:>7} {row['miss']:>7} {rate:>8} "
+              f"{row['entries']:>7} {row['bytes'] / 1024:>7.1f}KB")
+    lookups = sum(row['hit'] + row['stale'] + row['miss'] for row in stats.values())
+    served = sum(row['hit'] + row['stale'] for row in stats.values())
+    evicted = sum(row['evict'] for row in stats.values())
+    print(f"{served}/{lookups} reads served from the cache{f' ({served / lookups:.0%})' if lookups else ''}, "
+          f"{evicted} entries evicted")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m metronome_billing', description=__doc__.splitlines()[0])
+    parser.add_argument('--api-key', help='Metronome API key (default: METRONOME_API_KEY or config ini)')
+    parser.add_argument('--stripe-key', help='Stripe API key (default: STRIPE_API_KEY or config ini)')
+    parser.add_argument('-w', '--workers', type=int, default=8, help='concurrent API calls (default: 8)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='hide progress bars')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log every API request')
+    parser.add_argument('--profile', action='store_true',
+                        help='write a flame graph profile, phase timings and peak memory to .cache/profiles')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='append a trace of the command to FILE as OTLP JSON (default: $METRONOME_TRACE_FILE)')
+    parser.add_argument('--cache', action='store_true',
+                        help='serve Metronome reads from .cache/metronome_responses.sqlite3 '
+                             '(default: $METRONOME_RESPONSE_CACHE)')
+    commands = parser.add_subparsers(dest='command', required=True, metavar='command')
+
+    sync = commands.add_parser('sync', help=cmd_sync.__doc__)
+    for name in ('rates', 'products', 'customers', 'contracts'):
+        sync.add_argument(f'--{name}', action='store_true', help=f'sync {name} (default: everything)')
+    sync.set_defaults(func=cmd_sync)
+
+    rollup = commands.add_parser('rollup', help=cmd_rollup.__doc__)
+    rollup.add_argument('--spool', help='spool directory (default: $METRONOME_USAGE_SPOOL or .cache/usage_spool)')
+    rollup.set_defaults(func=cmd_rollup)
+
+    forecast = commands.add_parser('forecast', help=cmd_forecast.__doc__)
+    forecast.add_argument('--skip-balances', action='store_true', help='do not read commit and credit balances')
+    forecast.add_argument('-o', '--output', help="also write every projection to this CSV, '-' for stdout")
+    forecast.set_defaults(func=cmd_forecast)
+
+    reconcile = commands.add_parser('reconcile', help=cmd_reconcile.__doc__)
+    reconcile.add_argument('--skip-stripe', action='store_true', help='do not read Stripe customers')
+    reconcile.add_argument('--workdir', help='state and report directory (default: .cache/reconcile)')
+    reconcile.set_defaults(func=cmd_reconcile)
+
+    export = commands.add_parser('export', help=cmd_export.__doc__)
+    export.add_argument('-f', '--format', choices=list(FORMATS), default='csv')
+    export.add_argument('--compression', default='default',
+                        choices=['default', 'none'] + sorted({c for codecs in COMPRESSION.values() for c in codecs if c}),
+                        help='gzip for csv/ndjson; zstd (default), snappy or gzip for parquet')
+    export_target = export.add_mutually_exclusive_group()
+    export_target.add_argument('-o', '--output', help="output path, '-' for stdout (default: current_customers.<ext>)")
+    export_target.add_argument('--snapshot', metavar='DIR',
+                               help='write a content-addressed snapshot into DIR, skipping identical exports')
+    export.set_defaults(func=cmd_export)
+
+    onboard = commands.add_parser('onboard', help=cmd_onboard.__doc__)
+    onboard.add_argument('-n', '--count', type=int, default=1, help='customers to create (default: 1)')
+    onboard.add_argument('--rate-card', default=DEFAULT_RATE_CARD_ID, help='rate card for the contracts')
+    onboard.add_argument('--skip-stripe', action='store_true', help='do not create or link Stripe customers')
+    onboard.add_argument('-o', '--output', default=STDIO, help="CSV of the created customers, '-' for stdout")
+    onboard.set_defaults(func=cmd_onboard)
+
+    link = commands.add_parser('link', help=cmd_link.__doc__)
+    link.add_argument('input', help='CSV with customer_id and stripe_customer_id columns')
+    link.add_argument('--batch-size', type=int, default=100, help='customers per request (default: 100)')
+    link.set_defaults(func=cmd_link)
+
+    contracts = commands.add_parser('contracts', help=cmd_contracts.__doc__)
+    contracts.add_argument('input', help='CSV with a customer_id column')
+    contracts.add_argument('--rate-card', default=DEFAULT_RATE_CARD_ID, help='rate card for the contracts')
+    contracts.add_argument('-o', '--output', help='CSV with contract_id filled in (default: rewrite input)')
+    contracts.add_argument('--force', action='store_true', help='also create contracts for rows that have one')
+    contracts.set_defaults(func=cmd_contracts)
+
+    generate = commands.add_parser('generate', help=cmd_generate.__doc__)
+    generate.add_argument('--customer-id', action='append', help='customer to generate for (repeatable)')
+    generate.add_argument('--customers', help='CSV with a customer_id column')
+    generate.add_argument('--days', type=int, default=7)
+    generate.add_argument('--events-per-day', type=int, default=20)
+    generate.add_argument('--event-types', nargs='+', default=['token_usage', 'gpu_usage'],
+                          choices=['token_usage', 'gpu_usage'])
+    generate.add_argument('--seed', type=int, help='random seed for reproducible output')
+    generate.add_argument('-o', '--output', default=STDIO, help="NDJSON path, '-' for stdout")
+    generate.set_defaults(func=cmd_generate)
+
+    ingest = commands.add_parser('ingest', help=cmd_ingest.__doc__)
+    ingest.add_argument('input', nargs='?', default=STDIO, help="NDJSON events, '-' for stdin")
+    ingest.add_argument('--batch-size', type=int, default=INGEST_BATCH_SIZE, help='events per request (max 100)')
+    ingest.add_argument('--failed', help='write events from failed batches to this NDJSON file')
+    ingest.add_argument('--no-spool', action='store_true', help='do not spool sent events for usage analytics')
+    ingest.add_argument('--no-detect', action='store_true', help='do not watch sent events for usage anomalies')
+    ingest.add_argument('--anomalies', help='also write detected usage anomalies to this NDJSON file')
+    ingest.set_defaults(func=cmd_ingest)
+
+    bill = commands.add_parser('bill', help=cmd_bill.__doc__)
+    bill.add_argument('input', nargs='?', default=STDIO, help="NDJSON events, '-' for stdin")
+    bill.add_argument('--start', help='period start (ISO 8601, inclusive)')
+    bill.add_argument('--end', help='period end (ISO 8601, exclusive)')
+    bill.add_argument('-o', '--output', default=STDIO, help="CSV of bill lines, '-' for stdout")
+    bill.set_defaults(func=cmd_bill)
+
+    traces = commands.add_parser('traces', help=cmd_traces.__doc__)
+    traces.add_argument('input', nargs='?', default=os.environ.get('METRONOME_TRACE_FILE') or STDIO,
+                        help="OTLP JSON lines (default: $METRONOME_TRACE_FILE), '-' for stdin")
+    traces.add_argument('--last', type=int, default=5, help='how many of the newest traces to show (default: 5)')
+    traces.add_argument('--name', help='only traces whose root name contains this')
+    traces.add_argument('--depth', type=int, default=6, help='span levels to show (default: 6)')
+    traces.set_defaults(func=cmd_traces)
+
+    cache = commands.add_parser('cache', help=cmd_cache.__doc__)
+    cache.add_argument('--clear', action='store_true', help='drop every cached response and the statistics')
+    cache.set_defaults(func=cmd_cache)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING,
+                        format='%(levelname)s %(name)s: %(message)s')
+    if args.trace:
+        configure(path=args.trace, endpoint=environment_endpoint())
+    if args.cache:
+        from .core.response_cache import default_response_cache, use_response_cache
+        default_response_cache() or use_response_cache()
+    traced_command = nullcontext() if args.command == 'traces' else trace(f"cli {args.command}")
+    try:
+        if not args.profile:
+            with traced_command:
+                return args.func(args)
+        from .utils.profiling import Profile
+        profile = Profile(f"cli {args.command}")
+        with profile, traced_command:
+            code = args.func(args)
+        if profile.path:
+            console().print(f"Profile written to {profile.path}", style="dim")
+        return code
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:
+        # Stdout was closed early (e.g. piped into head); silence the flush at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    except Exception as e:
+        console().print(f"Error: {e}", style="bold red")
+        logger.debug("Full traceback:", exc_info=True)
+        return 1
+    finally:
+        flush()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,270 @@
+import math
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .usage import usage_metric
+
+DEFAULT_BUCKET_SECONDS = 3600
+DEFAULT_ALPHA = 0.1
+DEFAULT_THRESHOLD = 4.0
+MIN_IDLE_PROBABILITY = 0.02
+
+
+class _SeriesState:
+    """Running statistics of one (customer, metric) series: a few numbers, however long it runs."""
+
+    __slots__ = ('bucket', 'total', 'events', 'previous_total', 'previous_events', 'sweep', 'mean', 'daily', 'var', 'count', 'density', 'activity',
+                 'daily_activity', 'buckets', 'idle', 'flagged')
+
+    def __init__(self, bucket, slots):
+        self.bucket = bucket  # the newest open bucket; the one before it is still open for late events
+        self.total = 0.0
+        self.events = 0
+        self.previous_total = 0.0
+        self.previous_events = None  # None until the series has a previous bucket
+        self.sweep = 0        # the detector's sweep count at the last event
+        self.reset(slots)
+
+    def reset(self, slots):
+        self.mean = 0.0       # EW mean of log(quantity) over buckets with usage
+        self.daily = [None] * slots  # EW mean of the same per time of day, once seen
+        self.var = 0.0        # EW variance of log(quantity) around the time-of-day means
+        self.count = 0        # buckets with usage seen
+        self.density = 0.0    # EW mean of events per bucket with usage
+        self.activity = 0.0   # EW share of buckets with usage
+        self.daily_activity = [None] * slots  # the same per time of day, once seen
+        self.buckets = 0      # buckets seen
+        self.idle = 0.0       # log-probability of the current run of buckets without usage
+        self.flagged = None
+
+
+def _epoch(timestamp) -> Optional[int]:
+    """Seconds since the epoch, or None for a timestamp that is neither a number nor ISO 8601."""
+    if isinstance(timestamp, (int, float)):
+        return int(timestamp)
+    try:
+        parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+class AnomalyDetector:
+    """Flags usage spikes and drops per customer and usage kind as events stream past.
+
+    Events are summed per customer and kind (``tokens`` across models,
+    ``gpu`` hours across types) into fixed event-time buckets, hourly by
+    default. When a series moves on to a later bucket, the finished bucket
+    is scored and folded into the series' statistics; skipped buckets count
+    as idle. The bucket before the newest stays open, so events arriving
+    slightly out of order still count. Series that fall silent are moved
+    along with the newest bucket of any series, so a stop is noticed
+    without waiting for their next event. Each series keeps a fixed handful
+    of numbers (two per time of day) and an event costs a dictionary lookup
+    and an addition, so the detector can sit in the ingest path.
+
+    Usage is intermittent and follows the time of day, so a series is
+    tracked in two parts: the log(quantity) of buckets with usage, as an
+    exponentially weighted mean per time of day and a weighted variance
+    around it, and the weighted share of buckets with usage per time of
+    day. A bucket is a spike when it is ``threshold`` standard deviations
+    and ``spike_ratio`` times above the usual quantity for its time of day,
+    and a drop when it is ``threshold`` deviations below and at most
+    ``drop_ratio`` of it in a series averaging ``min_events`` events a
+    bucket, or when the current run of idle buckets has a probability
+    below ``stop_probability``. Nothing is flagged during the first
+    ``warmup`` buckets of a series, and a series is flagged again only once
+    it has changed state. ``on_anomaly`` receives each anomaly as a dict.
+    """
+
+    def __init__(self, on_anomaly: Optional[Callable[[Dict], None]] = None,
+                 bucket_seconds: int = DEFAULT_BUCKET_SECONDS, alpha: float = DEFAULT_ALPHA,
+                 threshold: float = DEFAULT_THRESHOLD, spike_ratio: float = 2.0, drop_ratio: float = 0.2,
+                 stop_probability: float = 1e-6, min_events: int = 10, daily_alpha: float = 0.3,
+                 warmup: int = 24, max_gap: int = 168):
+        self.on_anomaly = on_anomaly
+        self.bucket_seconds = bucket_seconds
+        self.alpha = alpha
+        self.threshold = threshold
+        self.spike_ratio = spike_ratio
+        self.drop_ratio = drop_ratio
+        self.stop_probability = stop_probability
+        self.min_events = min_events
+        self.daily_alpha = daily_alpha
+        # Buckets per day, each with its own baseline
+        self._slots = max(1, 86400 // bucket_seconds)
+        self.warmup = warmup
+        self.max_gap = max_gap
+        self.events = 0
+        self.late_events = 0
+        # Events skipped because their timestamp could not be parsed
+        self.invalid_events = 0
+        self.anomaly_count = 0
+        self._series: Dict[tuple, _SeriesState] = {}
+        # The newest bucket any series has reached
+        self._watermark = 0
+        self._sweeps = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._series)
+
+    def observe(self, events: Iterable[Dict]) -> List[Dict]:
+        """Feed usage events in arrival order; returns the anomalies they revealed."""
+        found = []
+        bucket_seconds = self.bucket_seconds
+        series = self._series
+        with self._lock:
+            watermark = self._watermark
+            for event in events:
+                customer_id = event.get('customer_id')
+                timestamp = event.get('timestamp')
+                metric = usage_metric(event)
+                if not customer_id or timestamp is None or metric is None:
+                    continue
+                epoch = _epoch(timestamp)
+                if epoch is None:
+                    self.invalid_events += 1
+                    continue
+                self.events += 1
+                bucket = epoch - epoch % bucket_seconds
+                key = (customer_id, metric[0].split(':', 1)[0])
+                state = series.get(key)
+                if state is None:
+                    state = series[key] = _SeriesState(bucket, self._slots)
+                state.sweep = self._sweeps
+                if bucket == state.bucket:
+                    state.total += metric[1]
+                    state.events += 1
+                elif bucket > state.bucket:
+                    self._advance(key, state, bucket, found)
+                    state.total = metric[1]
+                    state.events = 1
+                    if bucket > watermark:
+                        watermark = bucket
+                elif bucket == state.bucket - bucket_seconds and state.previous_events is not None:
+                    state.previous_total += metric[1]
+                    state.previous_events += 1
+                else:
+                    # The bucket has already been scored
+                    self.late_events += 1
+            if watermark > self._watermark:
+                self._watermark = watermark
+                # Series without events since the last sweep are moved up to the newest bucket, so a
+                # stop is noticed without waiting for their next event. Series still receiving
+                # (possibly older) events are left alone
+                for key, state in series.items():
+                    if state.sweep < self._sweeps and state.bucket < watermark:
+                        self._advance(key, state, watermark, found)
+                self._sweeps += 1
+        self._report(found)
+        return found
+
+    def flush(self) -> List[Dict]:
+        """Score every series' open buckets, e.g. at the end of a finite stream."""
+        found = []
+        with self._lock:
+            for key, state in self._series.items():
+                if state.events or state.previous_events:
+                    self._advance(key, state, state.bucket + 2 * self.bucket_seconds, found)
+        self._report(found)
+        return found
+
+    def _report(self, found):
+        self.anomaly_count += len(found)
+        if self.on_anomaly:
+            for anomaly in found:
+                self.on_anomaly(anomaly)
+
+    def _advance(self, key, state, bucket, found):
+        """Make ``bucket`` the newest open bucket, scoring the buckets that close."""
+        bucket_seconds = self.bucket_seconds
+        steps = (bucket - state.bucket) // bucket_seconds
+        if state.previous_events is not None:
+            self._score(key, state, state.bucket - bucket_seconds, state.previous_total, state.previous_events, found)
+        if steps == 1:
+            state.previous_total, state.previous_events = state.total, state.events
+        else:
+            self._score(key, state, state.bucket, state.total, state.events, found)
+            if steps - 2 > self.max_gap:
+                # Idle for too long to compare with the old baseline; start afresh
+                state.reset(self._slots)
+                state.previous_total, state.previous_events = 0.0, None
+            else:
+                # The buckets in between saw no usage, and neither has the new previous one yet
+                for i in range(1, steps - 1):
+                    self._score(key, state, state.bucket + i * bucket_seconds, 0.0, 0, found)
+                state.previous_total, state.previous_events = 0.0, 0
+        state.bucket = bucket
+        state.total = 0.0
+        state.events = 0
+
+    def _score(self, key, state, bucket, value, events, found):
+        kind = None
+        z = None
+        slot = (bucket // self.bucket_seconds) % self._slots
+        baseline = state.daily[slot]
+        if baseline is None:
+            baseline = state.mean
+        activity = state.daily_activity[slot]
+        if activity is None:
+            activity = state.activity
+        expected = math.exp(baseline) if state.count else 0.0
+        warm = state.buckets >= self.warmup
+        if value > 0:
+            # Quantities are compared on a log scale, so the test does not depend on units
+            level = math.log(value)
+            deviation = level - baseline
+            if warm and state.count >= self.warmup:
+                std = math.sqrt(state.var)
+                z = deviation / std if std > 0 else math.copysign(math.inf, deviation) if deviation else 0.0
+                if z >= self.threshold and deviation >= math.log(self.spike_ratio):
+                    kind = 'spike'
+                # With only a few events per bucket a low total is chance, not a drop
+                elif z <= -self.threshold and deviation <= math.log(self.drop_ratio) and \
+                        state.density >= self.min_events:
+                    kind = 'drop'
+            alpha = max(self.alpha, 1.0 / (state.count + 1))
+            state.mean += alpha * (level - state.mean)
+            state.daily[slot] = level if state.daily[slot] is None else \
+                state.daily[slot] + self.daily_alpha * (level - state.daily[slot])
+            state.var = (1 - alpha) * state.var + alpha * deviation * deviation
+            state.density += alpha * (events - state.density)
+            state.count += 1
+            state.idle = 0.0
+        else:
+            # A run of idle buckets this unlikely, given how often the series is active at those times
+            # of day, means usage stopped. Every bucket keeps some chance of being idle, as a few days
+            # of history can't rule it out
+            state.idle += math.log(max(1 - activity, MIN_IDLE_PROBABILITY))
+            if warm and state.count and state.idle < math.log(self.stop_probability):
+                kind = 'drop'
+        active = float(value > 0)
+        state.activity += max(self.alpha, 1.0 / (state.buckets + 1)) * (active - state.activity)
+        state.daily_activity[slot] = activity + self.daily_alpha * (active - activity)
+        state.buckets += 1
+
+        if kind and kind != state.flagged:
+            found.append({
+                'customer_id': key[0],
+                'metric': key[1],
+                'kind': kind,
+                'bucket_start': datetime.fromtimestamp(bucket, timezone.utc).isoformat(),
+                'value': round(value, 4),
+                'expected': round(expected, 4),
+                'z': round(z, 2) if z is not None and math.isfinite(z) else None,
+            })
+        state.flagged = kind
+
+
+def describe(anomaly: Dict) -> str:
+    """A one-line description of an anomaly for logs."""
+    if anomaly['kind'] == 'drop' and not anomaly['value']:
+        change = f"stopped, usually {anomaly['expected']:,.4g} per bucket"
+    else:
+        change = f"{anomaly['value']:,.4g} against a usual {anomaly['expected']:,.4g}"
+    return (f"Usage {anomaly['kind']} for customer {anomaly['customer_id']} ({anomaly['metric']}) "
+            f"at {anomaly['bucket_start']}: {change}")
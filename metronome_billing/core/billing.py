@@ -1,31 +1,66 @@
-from datetime import datetime
-from typing import Dict, List, Optional
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from .pricing import metric_rate, metric_unit_price
+from .rate_schedule import RateSchedule, rate_amount
 
 class BillingManager:
-    def __init__(self):
-        self.usage_data = {}
+    """Accumulates usage per user and metric into hourly buckets.
+
+    Memory grows with users x metrics x hours rather than with the number
+    of events recorded, so usage streams of any length can be billed.
+    Billing periods are therefore resolved to whole hours.
+
+    With a ``RateSchedule``, each hour is priced at the rate card rate in
+    effect at its start (quantities under one rate are priced together, so
+    tiers apply to the period's total); hours the schedule does not cover
+    fall back to ``price``.
+    """
+
+    def __init__(self, price: Callable[[str], float] = metric_unit_price, rates: Optional[RateSchedule] = None,
+                 rate_card_id: Optional[str] = None):
+        self.price = price
+        self.rates = rates
+        self.rate_card_id = rate_card_id
+        # user_id -> metric -> hour start -> summed value
+        self.usage_data: Dict[str, Dict[str, Dict[datetime, float]]] = {}
         
     def record_usage(self, user_id: str, metric: str, value: float, timestamp: Optional[datetime] = None):
         if timestamp is None:
-            timestamp = datetime.utcnow()
-            
-        if user_id not in self.usage_data:
-            self.usage_data[user_id] = {}
-            
-        if metric not in self.usage_data[user_id]:
-            self.usage_data[user_id][metric] = []
-            
-        self.usage_data[user_id][metric].append({
-            'value': value,
-            'timestamp': timestamp
-        })
+            timestamp = datetime.now(timezone.utc)
+        hour = timestamp.replace(minute=0, second=0, microsecond=0)
+        buckets = self.usage_data.setdefault(user_id, {}).setdefault(metric, {})
+        buckets[hour] = buckets.get(hour, 0.0) + value
         
     def calculate_bill(self, user_id: str, start_date: datetime, end_date: datetime) -> Dict:
-        # Placeholder for billing calculation logic
+        """Price the usage recorded for ``user_id`` in hours starting within [start_date, end_date)."""
+        usage_breakdown = {}
+        total_amount = 0.0
+        for metric, buckets in self.usage_data.get(user_id, {}).items():
+            hours = [(hour, value) for hour, value in buckets.items() if start_date <= hour < end_date]
+            quantity = sum(value for _, value in hours)
+            if not quantity:
+                continue
+            amount = self._amount(metric, hours)
+            usage_breakdown[metric] = {'quantity': quantity, 'amount': amount}
+            total_amount += amount
         return {
             'user_id': user_id,
             'period_start': start_date,
             'period_end': end_date,
-            'total_amount': 0.0,
-            'usage_breakdown': {}
-        }
\ No newline at end of file
+            'total_amount': total_amount,
+            'usage_breakdown': usage_breakdown
+        }
+
+    def _amount(self, metric: str, hours: List[Tuple[datetime, float]]) -> float:
+        if self.rates is None:
+            return sum(value for _, value in hours) * self.price(metric)
+        by_rate: Dict[int, Tuple[Dict, float]] = {}
+        unpriced = 0.0
+        for hour, value in hours:
+            rate = metric_rate(metric, hour, self.rates, self.rate_card_id)
+            if rate is None:
+                unpriced += value
+            else:
+                by_rate[id(rate)] = (rate, by_rate.get(id(rate), (rate, 0.0))[1] + value)
+        return (sum(rate_amount(rate, quantity) for rate, quantity in by_rate.values())
+                + unpriced * self.price(metric))
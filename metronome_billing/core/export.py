@@ -0,0 +1,178 @@
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+CUSTOMER_FIELDS = ['customer_id', 'name', 'external_id', 'salesforce_account_id', 'ingest_aliases', 'custom_fields']
+FORMATS = {'csv': '.csv', 'ndjson': '.ndjson', 'parquet': '.parquet'}
+# Compression codecs per format; None writes uncompressed
+COMPRESSION = {'csv': (None, 'gzip'), 'ndjson': (None, 'gzip'), 'parquet': ('zstd', 'snappy', 'gzip', None)}
+PARQUET_ROW_GROUP_SIZE = 10000
+
+
+def customer_row(customer: Dict) -> Dict[str, str]:
+    """Flatten a Metronome customer payload into the export columns."""
+    customer_config = customer.get('customer_config') or {}
+    return {
+        'customer_id': customer.get('id', ''),
+        'name': customer.get('name', ''),
+        'external_id': customer.get('external_id', ''),
+        'salesforce_account_id': customer_config.get('salesforce_account_id', ''),
+        'ingest_aliases': ', '.join(customer.get('ingest_aliases') or []),
+        'custom_fields': str(customer.get('custom_fields') or {})
+    }
+
+
+def default_compression(fmt: str) -> Optional[str]:
+    return COMPRESSION[fmt][0]
+
+
+def file_suffix(fmt: str, compression: Optional[str] = None) -> str:
+    suffix = FORMATS[fmt]
+    return suffix + '.gz' if compression == 'gzip' and fmt != 'parquet' else suffix
+
+
+class _TextWriter:
+    """CSV or NDJSON rows onto a binary stream, optionally gzipped."""
+
+    def __init__(self, stream, fmt, fieldnames, compression):
+        self._gzip = gzip.GzipFile(fileobj=stream, mode='wb', mtime=0) if compression == 'gzip' else None
+        self._text = io.TextIOWrapper(self._gzip or stream, encoding='utf-8', newline='', write_through=False)
+        self.fieldnames = fieldnames
+        if fmt == 'csv':
+            self._csv = csv.DictWriter(self._text, fieldnames=fieldnames, extrasaction='ignore')
+            self._csv.writeheader()
+        else:
+            self._csv = None
+
+    def write(self, row):
+        if self._csv:
+            self._csv.writerow(row)
+        else:
+            self._text.write(json.dumps({name: row.get(name) for name in self.fieldnames}, separators=(',', ':')))
+            self._text.write('\n')
+
+    def close(self):
+        self._text.flush()
+        # Detach so closing the wrapper does not close the caller's stream
+        self._text.detach()
+        if self._gzip:
+            self._gzip.close()
+
+
+class _ParquetWriter:
+    """Rows buffered into row groups of ``row_group_size`` and written as string columns."""
+
+    def __init__(self, stream, fieldnames, compression, row_group_size=PARQUET_ROW_GROUP_SIZE):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)") from None
+        self._pa = pa
+        self.fieldnames = fieldnames
+        self.row_group_size = row_group_size
+        self._schema = pa.schema([(name, pa.string()) for name in fieldnames])
+        self._writer = pq.ParquetWriter(stream, self._schema, compression=compression or 'none')
+        self._columns = {name: [] for name in fieldnames}
+        self._buffered = 0
+
+    def write(self, row):
+        for name in self.fieldnames:
+            value = row.get(name)
+            self._columns[name].append(None if value is None else str(value))
+        self._buffered += 1
+        if self._buffered >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self._buffered:
+            self._writer.write_table(self._pa.table(self._columns, schema=self._schema))
+            self._columns = {name: [] for name in self.fieldnames}
+            self._buffered = 0
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+def write_rows(rows: Iterable[Dict], stream, fmt: str = 'csv', fieldnames: List[str] = CUSTOMER_FIELDS,
+               compression: Optional[str] = None, on_row: Optional[Callable[[], None]] = None) -> Dict:
+    """Stream ``rows`` to a binary ``stream`` in ``fmt``, one row at a time.
+
+    Memory stays constant in the number of rows (Parquet holds one row group).
+    Returns the row count and a SHA-256 ``digest`` of the row contents, which
+    is independent of format and compression so identical data can be
+    recognised without comparing files.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if compression not in COMPRESSION[fmt]:
+        raise ValueError(f"Unsupported compression for {fmt}: {compression}")
+    writer = _ParquetWriter(stream, fieldnames, compression) if fmt == 'parquet' \
+        else _TextWriter(stream, fmt, fieldnames, compression)
+    digest = hashlib.sha256()
+    count = 0
+    for row in rows:
+        writer.write(row)
+        digest.update(json.dumps([row.get(name) for name in fieldnames], separators=(',', ':')).encode())
+        digest.update(b'\n')
+        count += 1
+        if on_row:
+            on_row()
+    writer.close()
+    return {'rows': count, 'digest': digest.hexdigest()}
+
+
+def export_rows(rows: Iterable[Dict], path: str, fmt: str = 'csv', fieldnames: List[str] = CUSTOMER_FIELDS,
+                compression: Optional[str] = None, on_row: Optional[Callable[[], None]] = None) -> Dict:
+    """Write rows to ``path`` (``-`` for stdout). The file is replaced only once the export completes."""
+    if path == '-':
+        result = write_rows(rows, sys.stdout.buffer, fmt, fieldnames, compression, on_row)
+        sys.stdout.buffer.flush()
+        return {**result, 'path': path, 'written': True}
+
+    target = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as stream:
+            result = write_rows(rows, stream, fmt, fieldnames, compression, on_row)
+        os.replace(tmp_path, target)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return {**result, 'path': str(target), 'written': True}
+
+
+def snapshot_rows(rows: Iterable[Dict], directory: str, name: str = 'customers', fmt: str = 'csv',
+                  fieldnames: List[str] = CUSTOMER_FIELDS, compression: Optional[str] = None,
+                  on_row: Optional[Callable[[], None]] = None) -> Dict:
+    """Write a content-addressed snapshot ``<name>-<digest>.<ext>`` into ``directory``.
+
+    Rows are streamed to a temporary file while being hashed; when a
+    snapshot with the same digest already exists the temporary file is
+    discarded, so repeated exports of unchanged data add nothing.
+    ``written`` in the result says whether a new snapshot was kept.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as stream:
+            result = write_rows(rows, stream, fmt, fieldnames, compression, on_row)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    target = directory / f"{name}-{result['digest'][:16]}{file_suffix(fmt, compression)}"
+    if target.exists():
+        os.unlink(tmp_path)
+        return {**result, 'path': str(target), 'written': False}
+    os.replace(tmp_path, target)
+    return {**result, 'path': str(target), 'written': True}
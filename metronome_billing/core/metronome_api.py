@@ -1,31 +1,142 @@
-from typing import Dict, List, Optional
-import requests
-import csv
-from datetime import datetime
-from pathlib import Path
+import json
+import logging
+import os
+import re
+from typing import Dict, Iterator, List, Optional
+from ..utils.concurrency import SingleFlight
 from ..utils.config import Config
+from ..utils.metrics import METRONOME_COALESCED, METRONOME_REQUESTS, current_job, endpoint_template
+from ..utils.profiling import phase
+from ..utils.tracing import client_span
+from .response_cache import cache_key, default_response_cache
+
+logger = logging.getLogger(__name__)
+
+# POST endpoints that only read (``/contracts/list``, ``/contract-pricing/rate-cards/getRates``, ...)
+_READ_POST = re.compile(r'/(?:list|get)[A-Za-z]*$')
+
+# Identical reads in flight at once, across every client in the process, share one request
+in_flight_reads = SingleFlight()
+
+
+def read_key(method: str, url: str, authorization: str, params=None, body=None) -> Optional[tuple]:
+    """The key under which a request may share an identical one in flight, or None if it must run on its own.
+
+    GETs and read-only POSTs qualify; the credentials are part of the key,
+    so clients with different API keys never share responses. ``authorization``
+    may be the raw API key or a ``Bearer`` header; both give the same key.
+    """
+    method = method.upper()
+    if method != "GET" and not (method == "POST" and _READ_POST.search(url.split('?', 1)[0])):
+        return None
+    if authorization and authorization[:7].lower() == 'bearer ':
+        authorization = authorization[7:]
+    try:
+        return (method, url, authorization, json.dumps(params, sort_keys=True, default=str),
+                json.dumps(body, sort_keys=True, default=str))
+    except (TypeError, ValueError):
+        return None
+
 
 class MetronomeAPI:
     BASE_URL = "https://api.metronome.com/v1"
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, pool_size: int = 10,
+                 max_retries: int = 3, timeout: float = 30, base_url: Optional[str] = None,
+                 cache=None, fresh: bool = False):
+        """Client sharing one pooled session.
+
+        ``pool_size`` bounds the keep-alive connections kept open, so it should
+        be at least the number of threads using the client concurrently.
+        Connection errors, 429s and 502/503/504s are retried ``max_retries``
+        times with exponential backoff, POSTs included: most Metronome reads
+        are POSTs, and ``/ingest`` deduplicates events on ``transaction_id``.
+        ``base_url`` (or ``METRONOME_BASE_URL``) points the client at another
+        server, such as a local stand-in.
+
+        ``cache`` is a ``ResponseCache`` for reads, by default the shared one
+        when ``METRONOME_RESPONSE_CACHE`` enables it; False turns it off.
+        ``fresh`` clients always call Metronome but still store what they
+        read, for refreshes that must not serve cached data.
+        """
+        # Imported here so modules that only reference the client stay cheap to import
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
         self.config = Config()
         self.api_key = api_key or self.config.metronome_api_key
-        print(f"Using API key: {self.api_key[:8]}...")  # Print first 8 chars for verification
+        self.timeout = timeout
+        self.cache = default_response_cache() if cache is None else cache or None
+        self.fresh = fresh
+        self.BASE_URL = (base_url or os.environ.get("METRONOME_BASE_URL") or self.BASE_URL).rstrip("/")
+        logger.debug(f"Using API key: {self.api_key[:8]}...")
         self.session = requests.Session()
         self.session.headers.update({
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
             "Accept": "application/json"
         })
+        # allowed_methods=None: by default urllib3 never retries a POST
+        retry = Retry(total=max_retries, backoff_factor=0.5, status_forcelist=(429, 502, 503, 504),
+                      allowed_methods=None, respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
     def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict:
+        """Call ``endpoint`` and return the decoded JSON body.
+
+        Identical reads (GETs and list/get POSTs with the same parameters)
+        made while one is in flight wait for it and share its response, so
+        a burst of page loads or a sync racing a page costs one call. With a
+        response cache, reads of endpoints that have a TTL are served from
+        it and successful writes drop the cached reads they affect.
+        """
         url = f"{self.BASE_URL}/{endpoint.lstrip('/')}"
-        response = self.session.request(method, url, **kwargs)
-        print(f"Response status: {response.status_code}")
-        print(f"Response text: {response.text[:500]}")  # Print first 500 chars of response
+        kwargs.setdefault("timeout", self.timeout)
+        template = endpoint_template('/' + endpoint.lstrip('/'))
+        key = None
+        if set(kwargs) <= {"params", "json", "timeout"}:
+            key = read_key(method, url, self.api_key, kwargs.get("params"), kwargs.get("json"))
+        cache = self.cache if key is not None and self.cache is not None and self.cache.cacheable(template) else None
+        if cache is not None and not self.fresh:
+            cached = cache.lookup(cache_key(key), template)
+            if cached is not None:
+                if not cached.fresh:
+                    cache.revalidate(cache_key(key), lambda: self._read(method, url, template, kwargs, key, cache))
+                with phase('parse'):
+                    return json.loads(cached.body) if cached.body else {}
+        with phase('fetch'), client_span('metronome', method, template) as traced:
+            if key is None:
+                response = self._send(method, url, template, kwargs)
+                if self.cache is not None and response.ok:
+                    self.cache.invalidate(template)
+            else:
+                response, shared = self._read(method, url, template, kwargs, key, cache)
+                if shared:
+                    METRONOME_COALESCED.inc(method, template)
+                    traced.set_attribute('metronome.coalesced', True)
+            traced.set_attribute('http.response.status_code', response.status_code)
+        logger.debug(f"{method} {endpoint} -> {response.status_code}: {response.text[:500]}")
         response.raise_for_status()
-        return response.json()
+        # Some endpoints (e.g. /ingest) answer with an empty body
+        with phase('parse'):
+            return response.json() if response.content else {}
+
+    def _read(self, method: str, url: str, template: str, kwargs: Dict, key: tuple, cache):
+        response, shared = in_flight_reads.do(key, self._send, method, url, template, kwargs)
+        # Only the caller that made the request stores it
+        if cache is not None and not shared and response.ok:
+            cache.store(cache_key(key), template, response.content)
+        return response, shared
+
+    def _send(self, method: str, url: str, template: str, kwargs: Dict):
+        # The body is read before returning (no streaming), so callers sharing the response can each decode it
+        with METRONOME_REQUESTS.track(method, template, current_job.get()) as call:
+            response = self.session.request(method, url, **kwargs)
+            call.status = response.status_code
+        return response
 
     def list_customers(self, limit: int = 100, cursor: Optional[str] = None) -> Dict:
         params = {"limit": limit}
@@ -33,16 +144,48 @@ class MetronomeAPI:
             params["cursor"] = cursor
         return self._make_request("GET", "/customers", params=params)
 
+    def iter_customers(self, limit: int = 100) -> Iterator[Dict]:
+        """Yield every customer page by page, without holding the full list."""
+        params = {"limit": limit}
+        while True:
+            response = self._make_request("GET", "/customers", params=params)
+            yield from response.get("data", [])
+            next_page = response.get("next_page")
+            if not next_page:
+                break
+            params = {"limit": limit, "next_page": next_page}
+
     def get_all_customers(self) -> List[Dict]:
-        all_customers = []
-        cursor = None
+        return list(self.iter_customers())
 
-        while True:
-            response = self.list_customers(cursor=cursor)
-            customers = response.get("data", [])
-            all_customers.extend(customers)
+    def ingest(self, events: List[Dict]) -> Dict:
+        """Send a batch of usage events (Metronome accepts up to 100 per call)."""
+        return self._make_request("POST", "/ingest", json=events)
 
-            # Metronome API doesn't seem to support pagination for customers yet
-            break
+    def iter_rate_card_rates(self, rate_card_id: str, at: str) -> Iterator[Dict]:
+        """Yield every rate of a rate card effective at ``at``, following pagination."""
+        payload = {"rate_card_id": rate_card_id, "at": at}
+        params = {}
+        while True:
+            # The page cursor goes in the query string, not the body
+            response = self._make_request("POST", "/contract-pricing/rate-cards/getRates", params=params, json=payload)
+            yield from response.get("data", [])
+            next_page = response.get("next_page")
+            if not next_page:
+                break
+            params = {"next_page": next_page}
 
-        return all_customers
\ No newline at end of file
+    def iter_customer_balances(self, customer_id: str, covering_date: Optional[str] = None) -> Iterator[Dict]:
+        """Yield the customer's commits and credits with their current balances."""
+        payload = {"customer_id": customer_id, "include_balance": True}
+        if covering_date:
+            payload["covering_date"] = covering_date
+        params = {}
+        while True:
+            # The page cursor goes in the query string, not the body
+            response = self._make_request("POST", "/contracts/customerBalances/list", params=params, json=payload)
+            yield from response.get("data", [])
+            next_page = response.get("next_page")
+            if not next_page:
+                break
+            params = {"next_page": next_page}
@@ -0,0 +1,79 @@
+# List prices used for local bill estimates when no stored rate card covers the usage;
+# Metronome's rate cards remain authoritative.
+from datetime import datetime
+from typing import Dict, Optional
+
+from .rate_schedule import RateSchedule
+
+# Dollars per 1000 tokens
+TOKEN_PRICES = {
+    'gpt4-o': {'input': 0.03, 'output': 0.06},
+    'claude-3.5-sonnet': {'input': 0.02, 'output': 0.04},
+    'gemini-1.5-flash-8B': {'input': 0.01, 'output': 0.03}
+}
+DEFAULT_TOKEN_MODEL = 'claude-3.5-sonnet'
+
+# Dollars per GPU hour
+GPU_PRICES = {
+    'gpu_type_1': 0.80,  # Basic GPU
+    'gpu_type_2': 1.60,  # Advanced GPU
+    'gpu_type_3': 2.40   # Premium GPU
+}
+DEFAULT_GPU_PRICE = 0.80
+
+
+def get_token_price(model_name: str, token_type: str) -> float:
+    """Get price per 1000 tokens based on model and type"""
+    # Find matching model (partial match)
+    for model in TOKEN_PRICES:
+        if model.lower() in (model_name or '').lower():
+            return TOKEN_PRICES[model][token_type]
+    return TOKEN_PRICES[DEFAULT_TOKEN_MODEL][token_type]
+
+
+def get_gpu_price(gpu_type: str) -> float:
+    """Get price per hour for GPU usage"""
+    return GPU_PRICES.get(gpu_type, DEFAULT_GPU_PRICE)
+
+
+def metric_unit_price(metric: str) -> float:
+    """Price of one unit of a metric named by ``usage.usage_metric`` (a token or a GPU hour)."""
+    kind, _, rest = metric.partition(':')
+    if kind == 'tokens':
+        model_name, _, token_type = rest.rpartition(':')
+        return get_token_price(model_name, token_type if token_type in ('input', 'output') else 'input') / 1000
+    if kind == 'gpu':
+        return get_gpu_price(rest)
+    return 0.0
+
+
+def metric_pricing_group(metric: str) -> Optional[Dict]:
+    """Rate card pricing group values for a metric: ``model_name`` and ``type`` for tokens, ``type`` for GPUs."""
+    kind, _, rest = metric.partition(':')
+    if kind == 'tokens':
+        model_name, _, token_type = rest.rpartition(':')
+        return {'model_name': model_name, 'type': token_type}
+    if kind == 'gpu':
+        return {'type': rest}
+    return None
+
+
+def metric_rate(metric: str, at: datetime, rates: RateSchedule, rate_card_id: Optional[str] = None) -> Optional[Dict]:
+    """The stored rate card rate for a metric at ``at``, or None when the schedule does not cover it.
+
+    Rate card prices are per unit of the metric: per token, per GPU hour.
+    """
+    group = metric_pricing_group(metric)
+    return None if group is None else rates.rate_at(None, group, at, rate_card_id)
+
+
+def metric_price_at(metric: str, at: Optional[datetime], rates: Optional[RateSchedule] = None,
+                    rate_card_id: Optional[str] = None) -> float:
+    """Price of one unit of a metric at ``at``: the stored flat rate, else the list price.
+
+    Tiered rates have no single unit price, so they are priced at list too.
+    """
+    rate = metric_rate(metric, at, rates, rate_card_id) if rates is not None else None
+    if rate is not None and (rate.get('rate_type') or '').upper() != 'TIERED':
+        return float(rate.get('price') or 0)
+    return metric_unit_price(metric)
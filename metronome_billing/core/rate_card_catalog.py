@@ -0,0 +1,106 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from ..utils.concurrency import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def extract_rate_cards(response_data) -> List[Dict]:
+    """Pull the list of rate cards out of a ``rate-cards/list`` response."""
+    if isinstance(response_data, dict):
+        if 'data' in response_data and isinstance(response_data['data'], list):
+            return response_data['data']
+        return [response_data]
+    return response_data if isinstance(response_data, list) else []
+
+
+class RateCardCatalog:
+    """In-memory rate card list with a TTL and background revalidation.
+
+    Reads inside ``ttl`` are served straight from memory. Once the TTL has
+    passed the cached list is still returned, but a single background thread
+    re-fetches it; only when the data is older than ``max_stale`` (or has
+    never been loaded) does a caller wait on Metronome, and callers arriving
+    together wait on one shared fetch.
+
+    ``etag`` and ``last_modified`` only change when the fetched content does,
+    so views can answer conditional requests with 304s.
+    """
+
+    def __init__(self, api_factory: Callable, ttl: float = 300, max_stale: float = 3600):
+        self.api_factory = api_factory
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._fetches = SingleFlight()
+        self._rate_cards: Optional[List[Dict]] = None
+        self._by_id: Dict[str, Dict] = {}
+        self._fetched_at = 0.0
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[datetime] = None
+
+    def get(self) -> List[Dict]:
+        age = time.monotonic() - self._fetched_at
+        if self._rate_cards is None or age > self.max_stale:
+            self.refresh()
+        elif age > self.ttl:
+            self._revalidate_in_background()
+        return self._rate_cards or []
+
+    def find(self, rate_card_id: str) -> Optional[Dict]:
+        self.get()
+        return self._by_id.get(rate_card_id)
+
+    def invalidate(self):
+        self._fetched_at = 0.0
+        self._rate_cards = None
+
+    def refresh(self) -> List[Dict]:
+        return self._fetches.do('rate-cards', self._fetch)[0]
+
+    def _fetch(self) -> List[Dict]:
+        api = self.api_factory()
+        rate_cards = []
+        params = {}
+        while True:
+            # List endpoints take the page cursor in the query string, not the body
+            response_data = api._make_request("POST", "/contract-pricing/rate-cards/list", params=params, json={})
+            rate_cards.extend(extract_rate_cards(response_data))
+            next_page = response_data.get('next_page') if isinstance(response_data, dict) else None
+            if not next_page:
+                break
+            params = {"next_page": next_page}
+
+        etag = hashlib.sha1(json.dumps(rate_cards, sort_keys=True, default=str).encode()).hexdigest()
+        with self._lock:
+            if etag != self.etag:
+                self.etag = etag
+                self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+                logger.info(f"Rate card catalog updated: {len(rate_cards)} rate cards")
+            self._rate_cards = rate_cards
+            self._by_id = {card.get('id'): card for card in rate_cards}
+            self._fetched_at = time.monotonic()
+        return rate_cards
+
+    def _revalidate_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Background rate card refresh failed: {e}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="rate-card-catalog", daemon=True).start()
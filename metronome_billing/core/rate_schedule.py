@@ -0,0 +1,343 @@
+import json
+import os
+import tempfile
+import threading
+from bisect import bisect_right, insort
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Rates without an end date stay in effect forever.
+_OPEN_END = datetime.max.replace(tzinfo=timezone.utc)
+
+DEFAULT_SCHEDULE_PATH = Path(__file__).resolve().parents[2] / '.cache' / 'rate_schedule.json'
+# The rate card customers are put on, and local valuation prices from
+DEFAULT_RATE_CARD_ID = os.environ.get('METRONOME_RATE_CARD_ID', 'ee186f96-3e72-4f7c-a326-a88a28e4b7da')
+
+
+def parse_timestamp(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (ValueError, AttributeError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def format_timestamp(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def _group_key(pricing_group_values: Optional[Dict]) -> Tuple:
+    return tuple(sorted((pricing_group_values or {}).items()))
+
+
+def normalize_rate(rate: Dict) -> Optional[Dict]:
+    """Flatten a getRates entry into the shape stored by the schedule."""
+    product = rate.get("product") or {}
+    product_id = rate.get("product_id") or product.get("id")
+    if not product_id:
+        return None
+    details = rate.get("rate") or rate
+    return {
+        "product_id": product_id,
+        "product_name": rate.get("product_name") or product.get("name"),
+        "pricing_group_values": rate.get("pricing_group_values") or {},
+        "starting_at": rate.get("starting_at"),
+        "ending_before": rate.get("ending_before"),
+        "entitled": rate.get("entitled", False),
+        "rate_type": details.get("rate_type"),
+        "price": details.get("price"),
+        "tiers": details.get("tiers") or [],
+    }
+
+
+class _Interval:
+    """A single rate entry along with its parsed effective window."""
+
+    __slots__ = ("start", "end", "entry")
+
+    def __init__(self, entry: Dict):
+        self.start = parse_timestamp(entry.get("starting_at")) or datetime.min.replace(tzinfo=timezone.utc)
+        self.end = parse_timestamp(entry.get("ending_before")) or _OPEN_END
+        self.entry = entry
+
+    def __lt__(self, other: "_Interval") -> bool:
+        return self.start < other.start
+
+
+def _add(index: Dict[Tuple, Tuple[List[datetime], List[_Interval]]], key: Tuple, interval: _Interval):
+    """Insert ``interval`` under ``key``, replacing an interval with the same start."""
+    starts, intervals = index.setdefault(key, ([], []))
+    pos = bisect_right(starts, interval.start) - 1
+    if pos >= 0 and starts[pos] == interval.start:
+        intervals[pos] = interval
+    else:
+        insort(starts, interval.start)
+        insort(intervals, interval)
+
+
+def _merge_windows(windows: List[Tuple[datetime, datetime]]) -> List[Tuple[datetime, datetime]]:
+    merged: List[Tuple[datetime, datetime]] = []
+    for start, end in sorted(window for window in windows if window[0] < window[1]):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class RateSchedule:
+    """Local store of rate card schedules with point-in-time lookups.
+
+    Rates are indexed by ``(rate_card_id, product_id, pricing group values)``,
+    each key holding its intervals sorted by start time, so a lookup is a
+    dictionary hit plus a bisect. Each card also keeps the windows of time
+    its refreshes cover: a refresh at ``at`` is authoritative from ``at``
+    until the first fetched rate ends, and the dated rates before ``at``
+    are kept, so earlier usage is still priced at the rates of its time.
+    A rate missing from a refresh ends at the refresh instant. Lookups
+    outside every window return None instead of guessing. A refresh is
+    skipped entirely while the cached schedule still covers the requested
+    instant.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_age: timedelta = timedelta(hours=1)):
+        self.path = Path(path) if path else None
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._index: Dict[Tuple, Tuple[List[datetime], List[_Interval]]] = {}
+        # (rate_card_id, pricing group values) -> index keys, for lookups that do not name a product
+        self._groups: Dict[Tuple, List[Tuple]] = {}
+        # rate_card_id -> {"fetched_at": datetime, "windows": [(covered_from, covered_until), ...]}
+        self._coverage: Dict[str, Dict] = {}
+        if self.path and self.path.exists():
+            self._load()
+
+    def __len__(self) -> int:
+        return sum(len(intervals) for _, intervals in self._index.values())
+
+    def rate_card_ids(self) -> List[str]:
+        return list(self._coverage)
+
+    def covers(self, rate_card_id: str, at: datetime) -> bool:
+        """Whether the stored rates of the card are known at ``at``."""
+        coverage = self._coverage.get(rate_card_id)
+        return bool(coverage) and any(start <= at < end for start, end in coverage["windows"])
+
+    def is_fresh(self, rate_card_id: str, at: Optional[datetime] = None) -> bool:
+        at = at or datetime.now(timezone.utc)
+        coverage = self._coverage.get(rate_card_id)
+        if not coverage:
+            return False
+        if datetime.now(timezone.utc) - coverage["fetched_at"] > self.max_age:
+            return False
+        return self.covers(rate_card_id, at)
+
+    def refresh(self, api, rate_card_id: str, at: Optional[datetime] = None, force: bool = False) -> int:
+        """Pull the rates effective at ``at`` and merge them into the store.
+
+        Returns the number of entries that were added or changed; zero when
+        the cached schedule was still fresh and no request was made.
+        """
+        at = at or datetime.now(timezone.utc)
+        if not force and self.is_fresh(rate_card_id, at):
+            return 0
+
+        fetched = [normalize_rate(rate) for rate in api.iter_rate_card_rates(rate_card_id, format_timestamp(at))]
+        changed = self.merge(rate_card_id, [entry for entry in fetched if entry], at)
+        if self.path:
+            self.save()
+        return changed
+
+    def merge(self, rate_card_id: str, entries: List[Dict], at: datetime) -> int:
+        """Merge the card's rates effective at ``at``; returns how many rates were added, changed or ended."""
+        index: Dict[Tuple, Tuple[List[datetime], List[_Interval]]] = {}
+        # An empty fetch says nothing about later instants, so it covers none
+        covered_until = _OPEN_END if entries else at
+        for entry in entries:
+            interval = _Interval(entry)
+            covered_until = min(covered_until, interval.end)
+            _add(index, (rate_card_id, entry["product_id"], _group_key(entry["pricing_group_values"])), interval)
+        with self._lock:
+            old_keys = [key for key in self._index if key[0] == rate_card_id]
+            old = {(key, interval.start): interval.entry for key in old_keys for interval in self._index[key][1]}
+            for key in old_keys:
+                fetched_starts = list(index[key][0]) if key in index else []
+                for interval in self._index[key][1]:
+                    if interval.start in fetched_starts:
+                        continue
+                    if interval.start <= at < interval.end and not any(s > interval.start for s in fetched_starts):
+                        # In effect at ``at`` by the store, but not by Metronome: it ended by then
+                        interval = _Interval(dict(interval.entry, ending_before=format_timestamp(at)))
+                    _add(index, key, interval)
+            new = {(key, interval.start): interval.entry for key, (_, intervals) in index.items()
+                   for interval in intervals}
+            changed = sum(1 for slot, entry in new.items() if old.get(slot) != entry)
+            for key in old_keys:
+                del self._index[key]
+            self._index.update(index)
+            # What the store knew from ``at`` on is superseded by this fetch
+            previous = self._coverage.get(rate_card_id, {}).get("windows", [])
+            windows = [(start, min(end, at)) for start, end in previous] + [(at, covered_until)]
+            self._coverage[rate_card_id] = {
+                "fetched_at": datetime.now(timezone.utc),
+                "windows": _merge_windows(windows),
+            }
+            self._index_groups()
+        return changed
+
+    def rate_at(self, product_id: Optional[str], pricing_group_values: Optional[Dict] = None,
+                at: Optional[datetime] = None, rate_card_id: Optional[str] = None) -> Optional[Dict]:
+        """Return the rate in effect for a product at ``at`` without any network access.
+
+        With ``product_id`` None, any product priced by exactly these pricing
+        group values matches. None when no stored card covers ``at`` or none
+        of them has a matching rate then.
+        """
+        at = at or datetime.now(timezone.utc)
+        group = _group_key(pricing_group_values)
+        card_ids = [rate_card_id] if rate_card_id else list(self._coverage)
+        for card_id in card_ids:
+            if not self.covers(card_id, at):
+                continue
+            keys = [(card_id, product_id, group)] if product_id else self._groups.get((card_id, group), [])
+            for key in keys:
+                found = self._index.get(key)
+                if not found:
+                    continue
+                starts, intervals = found
+                pos = bisect_right(starts, at) - 1
+                if pos >= 0 and at < intervals[pos].end:
+                    return intervals[pos].entry
+        return None
+
+    def value(self, product_id: Optional[str], quantity: float, pricing_group_values: Optional[Dict] = None,
+              at: Optional[datetime] = None, rate_card_id: Optional[str] = None) -> Optional[float]:
+        """Price ``quantity`` units of a product using the locally stored rate."""
+        rate = self.rate_at(product_id, pricing_group_values, at, rate_card_id)
+        if rate is None:
+            return None
+        return rate_amount(rate, quantity)
+
+    def to_rows(self, rate_card_id: Optional[str] = None) -> List[Dict]:
+        """Flatten the store into one row per rate, as the rate card CSV export expects."""
+        rows = []
+        for (card_id, _, _), (_, intervals) in self._index.items():
+            if rate_card_id and card_id != rate_card_id:
+                continue
+            for interval in intervals:
+                entry = interval.entry
+                row = {
+                    "product_id": entry["product_id"],
+                    "product_name": entry["product_name"],
+                    "rate_type": entry["rate_type"],
+                    "entitled": entry["entitled"],
+                    "starting_at": entry["starting_at"],
+                    "ending_before": entry["ending_before"],
+                }
+                if (entry["rate_type"] or "").upper() == "TIERED":
+                    start = 0
+                    for idx, tier in enumerate(entry["tiers"]):
+                        row[f"tier_{idx+1}_start"] = tier.get("start_quantity", start)
+                        row[f"tier_{idx+1}_price"] = tier.get("unit_price", tier.get("price"))
+                        start += tier.get("size") or 0
+                else:
+                    row["price"] = entry["price"]
+                row.update(entry["pricing_group_values"])
+                rows.append(row)
+        return rows
+
+    def save(self):
+        with self._lock:
+            state = {
+                "coverage": {
+                    card_id: {
+                        "fetched_at": format_timestamp(coverage["fetched_at"]),
+                        "windows": [[format_timestamp(start), format_timestamp(end) if end != _OPEN_END else None]
+                                    for start, end in coverage["windows"]],
+                    }
+                    for card_id, coverage in self._coverage.items()
+                },
+                "rates": [
+                    {"rate_card_id": card_id, **interval.entry}
+                    for (card_id, _, _), (_, intervals) in self._index.items()
+                    for interval in intervals
+                ],
+            }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def _load(self):
+        with open(self.path) as f:
+            state = json.load(f)
+        for rate in state.get("rates", []):
+            rate = dict(rate)
+            card_id = rate.pop("rate_card_id")
+            _add(self._index, (card_id, rate["product_id"], _group_key(rate["pricing_group_values"])), _Interval(rate))
+        for card_id, coverage in state.get("coverage", {}).items():
+            if "windows" in coverage:
+                windows = coverage["windows"]
+            else:
+                # Files written before coverage windows held a single one
+                windows = [[coverage["covered_from"], coverage["covered_until"]]]
+            self._coverage[card_id] = {
+                "fetched_at": parse_timestamp(coverage["fetched_at"]),
+                "windows": [(parse_timestamp(start), parse_timestamp(end) if end else _OPEN_END)
+                            for start, end in windows],
+            }
+        self._index_groups()
+
+    def _index_groups(self):
+        groups: Dict[Tuple, List[Tuple]] = {}
+        for key in self._index:
+            groups.setdefault((key[0], key[2]), []).append(key)
+        self._groups = groups
+
+
+def rate_amount(rate: Dict, quantity: float) -> float:
+    """Price ``quantity`` units at a stored rate entry, flat or tiered."""
+    if (rate.get("rate_type") or "").upper() == "TIERED":
+        return _tiered_amount(rate.get("tiers", []), quantity)
+    return quantity * float(rate.get("price") or 0)
+
+
+def _tiered_amount(tiers: List[Dict], quantity: float) -> float:
+    total = 0.0
+    remaining = quantity
+    for tier in tiers:
+        size = tier.get("size")
+        price = float(tier.get("price", tier.get("unit_price")) or 0)
+        used = remaining if size is None else min(remaining, size)
+        total += used * price
+        remaining -= used
+        if remaining <= 0:
+            break
+    return total
+
+
+_default: Optional[RateSchedule] = None
+_default_mtime: Optional[float] = None
+_default_lock = threading.Lock()
+
+
+def default_rate_schedule() -> RateSchedule:
+    """The schedule stored at ``DEFAULT_SCHEDULE_PATH``, reloaded when another process has refreshed it.
+
+    Lookups never make requests; ``sync --rates`` (or any ``refresh()``)
+    keeps the file current.
+    """
+    global _default, _default_mtime
+    try:
+        mtime = DEFAULT_SCHEDULE_PATH.stat().st_mtime
+    except OSError:
+        mtime = None
+    with _default_lock:
+        if _default is None or mtime != _default_mtime:
+            _default = RateSchedule(DEFAULT_SCHEDULE_PATH)
+            _default_mtime = mtime
+        return _default
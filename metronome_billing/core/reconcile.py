@@ -0,0 +1,200 @@
+import hashlib
+import json
+import logging
+import shutil
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = 128
+_HASH_MODULUS = 2 ** 128
+
+# A source yields (key, fields) pairs; key is the Metronome customer ID
+Record = Tuple[str, Dict]
+
+
+def _bucket_of(key: str, buckets: int) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big') % buckets
+
+
+def record_hash(key: str, fields: Dict) -> int:
+    encoded = json.dumps([key, fields], sort_keys=True, separators=(',', ':'), default=str)
+    return int.from_bytes(hashlib.blake2b(encoded.encode(), digest_size=16).digest(), 'big')
+
+
+class Reconciler:
+    """Diffs several record streams keyed by the same ID with bounded memory.
+
+    Each source is streamed once. Every record is hash-partitioned by key
+    into one of ``buckets`` spill files under ``workdir``. At the same time
+    each (bucket, source) keeps an order-independent digest: the sum of
+    its record hashes, a multiset hash, so the order of arrival does not
+    matter. The digests of a bucket form its leaf in a two-level Merkle
+    tree. Leaves are remembered between runs in ``workdir/state.json``.
+
+    ``run()`` compares only the buckets whose leaf changed since the last
+    run, loading one bucket at a time (about N / buckets records). The
+    drift of unchanged buckets is reused from the previous report.
+    ``compare(key, records_by_source, compared)`` returns the issue codes
+    for one key; ``compared`` is the set of sources added to this run, so
+    a source that was skipped is not mistaken for one missing the key.
+    """
+
+    def __init__(self, workdir: str, compare: Callable[[str, Dict[str, Dict], FrozenSet[str]], List[str]],
+                 buckets: int = DEFAULT_BUCKETS):
+        self.workdir = Path(workdir)
+        self.compare = compare
+        self.buckets = buckets
+        self._spill_dir = self.workdir / 'spill'
+        self._drift_dir = self.workdir / 'drift'
+        self._digests: Dict[str, List[int]] = {}
+        self._counts: Dict[str, int] = {}
+
+    def _load_state(self) -> Dict:
+        try:
+            state = json.loads((self.workdir / 'state.json').read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+        return state if state.get('buckets_total') == self.buckets else {}
+
+    def add_source(self, name: str, records: Iterable[Record], progress: Optional[Callable[[int], None]] = None):
+        """Stream one source into the bucket spill files."""
+        if not self._digests:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir.mkdir(parents=True)
+        digests = self._digests.setdefault(name, [0] * self.buckets)
+        handles = {}
+        count = 0
+        try:
+            for key, fields in records:
+                bucket = _bucket_of(key, self.buckets)
+                digests[bucket] = (digests[bucket] + record_hash(key, fields)) % _HASH_MODULUS
+                handle = handles.get(bucket)
+                if handle is None:
+                    handle = handles[bucket] = open(self._spill_dir / f"{bucket:04d}.ndjson", 'a', encoding='utf-8')
+                handle.write(json.dumps([name, key, fields], separators=(',', ':'), default=str))
+                handle.write('\n')
+                count += 1
+                if progress and count % 10000 == 0:
+                    progress(count)
+        finally:
+            for handle in handles.values():
+                handle.close()
+        self._counts[name] = self._counts.get(name, 0) + count
+        logger.info(f"Reconcile source {name}: {count} records")
+
+    def _leaf(self, bucket: int) -> str:
+        parts = [f"{name}:{self._digests[name][bucket]:032x}" for name in sorted(self._digests)]
+        return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+    def _compare_bucket(self, bucket: int) -> Dict[str, int]:
+        records: Dict[str, Dict[str, Dict]] = {}
+        spill = self._spill_dir / f"{bucket:04d}.ndjson"
+        if spill.exists():
+            with open(spill, encoding='utf-8') as handle:
+                for line in handle:
+                    name, key, fields = json.loads(line)
+                    records.setdefault(key, {})[name] = fields
+        compared = frozenset(self._digests)
+        counts: Dict[str, int] = {}
+        with open(self._drift_dir / f"{bucket:04d}.ndjson", 'w', encoding='utf-8') as out:
+            for key in sorted(records):
+                for issue in self.compare(key, records[key], compared):
+                    counts[issue] = counts.get(issue, 0) + 1
+                    out.write(json.dumps({'key': key, 'issue': issue, 'sources': records[key]},
+                                         separators=(',', ':'), default=str))
+                    out.write('\n')
+        return counts
+
+    def run(self, progress: Optional[Callable[[float], None]] = None) -> Dict:
+        """Compare changed buckets and write ``workdir/drift.ndjson``; returns the summary."""
+        previous = self._load_state().get('buckets', {})
+        self._drift_dir.mkdir(parents=True, exist_ok=True)
+        bucket_state = {}
+        rechecked = 0
+        for bucket in range(self.buckets):
+            leaf = self._leaf(bucket)
+            before = previous.get(str(bucket))
+            if before and before['leaf'] == leaf and (self._drift_dir / f"{bucket:04d}.ndjson").exists():
+                counts = before['issues']
+            else:
+                counts = self._compare_bucket(bucket)
+                rechecked += 1
+            bucket_state[str(bucket)] = {'leaf': leaf, 'issues': counts}
+            if progress:
+                progress((bucket + 1) / self.buckets)
+
+        root = hashlib.sha1(''.join(bucket_state[str(b)]['leaf'] for b in range(self.buckets)).encode()).hexdigest()
+        issues: Dict[str, int] = {}
+        with open(self.workdir / 'drift.ndjson', 'w', encoding='utf-8') as report:
+            for bucket in range(self.buckets):
+                for issue, count in bucket_state[str(bucket)]['issues'].items():
+                    issues[issue] = issues.get(issue, 0) + count
+                drift_file = self._drift_dir / f"{bucket:04d}.ndjson"
+                if drift_file.exists():
+                    with open(drift_file, encoding='utf-8') as handle:
+                        shutil.copyfileobj(handle, report)
+
+        summary = {
+            'root': root,
+            'records': dict(self._counts),
+            'buckets_total': self.buckets,
+            'buckets_rechecked': rechecked,
+            'issues': issues,
+            'report': str(self.workdir / 'drift.ndjson'),
+        }
+        (self.workdir / 'state.json').write_text(json.dumps({**summary, 'buckets': bucket_state}))
+        shutil.rmtree(self._spill_dir, ignore_errors=True)
+        return summary
+
+
+def customer_drift(key: str, sources: Dict[str, Dict], compared: Optional[FrozenSet[str]] = None) -> List[str]:
+    """Issue codes for one Metronome customer ID seen across the customer sources.
+
+    Sources: ``metronome`` (customers), ``local`` (the web app's customer
+    table), ``stripe`` (Stripe customers by ``metronome_customer_id``
+    metadata) and ``contract`` (customers with at least one contract).
+    Stripe issues are only reported when ``stripe`` is among the
+    ``compared`` sources (all of them by default).
+    """
+    with_stripe = compared is None or 'stripe' in compared
+    metronome = sources.get('metronome')
+    local = sources.get('local')
+    stripe = sources.get('stripe')
+    issues = []
+    if metronome is None:
+        if local is not None:
+            issues.append('orphan_local')
+        if stripe is not None:
+            issues.append('orphan_stripe')
+        if 'contract' in sources:
+            issues.append('orphan_contract')
+        return issues
+
+    if local is None:
+        issues.append('missing_local')
+    elif (local.get('name') or '') != (metronome.get('name') or ''):
+        issues.append('name_mismatch')
+    if with_stripe:
+        if stripe is None:
+            issues.append('missing_stripe')
+        elif local is not None and local.get('stripe_id') and local['stripe_id'] != stripe.get('stripe_id'):
+            issues.append('stripe_id_mismatch')
+    if 'contract' not in sources:
+        issues.append('missing_contract')
+    return issues
+
+
+def metronome_customer_records(customers: Iterable[Dict]) -> Iterator[Record]:
+    for customer in customers:
+        if customer.get('id'):
+            yield customer['id'], {'name': customer.get('name')}
+
+
+def stripe_customer_records(customers: Iterable) -> Iterator[Record]:
+    """Stripe customers linked to Metronome through their ``metronome_customer_id`` metadata."""
+    for customer in customers:
+        metronome_id = (customer.get('metadata') or {}).get('metronome_customer_id')
+        if metronome_id:
+            yield metronome_id, {'name': customer.get('name'), 'stripe_id': customer.get('id')}
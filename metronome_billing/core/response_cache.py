@@ -0,0 +1,314 @@
+"""Opt-in on-disk cache of Metronome read responses, shared by every process on the machine.
+
+Scripts, CLI runs and web restarts re-read the same reference data (rate
+cards, products, billable metrics, the customer list). With the cache
+enabled, ``MetronomeAPI`` answers those reads from a SQLite file:
+
+- within an endpoint's TTL the stored body is returned without a call;
+- for ``stale`` seconds after that it is still returned, and one
+  background request per entry refreshes it (stale-while-revalidate);
+- older entries, endpoints without a TTL and non-2xx responses always go
+  to Metronome.
+
+The file is bounded by ``max_bytes``; the least recently read entries are
+evicted first. Lookups are counted per endpoint in the file itself, so
+hit rates cover every run. A successful write to an endpoint (creating a
+customer, say) drops the cached reads under its first path segment.
+
+Enable with ``METRONOME_RESPONSE_CACHE=1`` (``.cache/metronome_responses.sqlite3``)
+or a file path, and ``--cache`` on the CLI.
+"""
+import atexit
+import hashlib
+import logging
+import os
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from ..utils.metrics import METRONOME_CACHE
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parents[2] / '.cache' / 'metronome_responses.sqlite3'
+DEFAULT_MAX_BYTES = 64 << 20
+# Eviction frees space down to this share of max_bytes, so it does not run on every store
+EVICT_TO = 0.9
+# How long exit waits, in total, for background revalidations still in flight
+REVALIDATE_EXIT_TIMEOUT = 5
+
+# Endpoint template -> (ttl, stale) in seconds. Endpoints not listed are never cached:
+# contracts and balances move with every change and usage event.
+DEFAULT_TTLS: Dict[str, Tuple[float, float]] = {
+    '/customers': (300, 3600),
+    '/customers/{id}': (300, 3600),
+    '/billable-metrics': (3600, 86400),
+    '/contract-pricing/products/list': (3600, 86400),
+    '/contract-pricing/products/get': (3600, 86400),
+    '/contract-pricing/rate-cards/list': (3600, 86400),
+    '/contract-pricing/rate-cards/get': (3600, 86400),
+    '/contract-pricing/rate-cards/getRates': (3600, 86400),
+}
+
+RESULTS = ('hit', 'stale', 'miss', 'store', 'evict')
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    read_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_read_at ON responses (read_at);
+CREATE INDEX IF NOT EXISTS responses_endpoint ON responses (endpoint);
+CREATE TABLE IF NOT EXISTS stats (
+    endpoint TEXT NOT NULL,
+    result TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (endpoint, result)
+);
+"""
+
+
+class Cached(NamedTuple):
+    body: bytes
+    fresh: bool
+
+
+def cache_key(request_key: tuple) -> str:
+    """A digest of ``metronome_api.read_key()``, so API keys and request bodies are not stored in clear."""
+    return hashlib.sha256(repr(request_key).encode()).hexdigest()
+
+
+class ResponseCache:
+    """Metronome read responses in a SQLite file, safe to share between threads and processes."""
+
+    def __init__(self, path=None, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttls: Optional[Dict[str, Tuple[float, float]]] = None):
+        import sqlite3
+
+        self.path = Path(path) if path else DEFAULT_CACHE_PATH
+        self.max_bytes = max_bytes
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        # First path segments with something to invalidate
+        self._segments = {_first_segment(endpoint) for endpoint, (ttl, _) in self.ttls.items() if ttl > 0}
+        self._errors = sqlite3.Error
+        self._lock = threading.Lock()
+        self._revalidating = set()
+        self._threads = set()
+        self._warned = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), timeout=5, check_same_thread=False, isolation_level=None)
+        # WAL lets readers in other processes proceed during a write; NORMAL skips the fsync per commit
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(_SCHEMA)
+        _caches.add(self)
+
+    def ttl(self, endpoint: str) -> Tuple[float, float]:
+        return self.ttls.get(endpoint, (0, 0))
+
+    def cacheable(self, endpoint: str) -> bool:
+        return self.ttl(endpoint)[0] > 0
+
+    def invalidates(self, endpoint: str) -> bool:
+        """Whether a write to ``endpoint`` can stale any cached read (never true for ``/ingest``)."""
+        return _first_segment(endpoint) in self._segments
+
+    def lookup(self, key: str, endpoint: str) -> Optional[Cached]:
+        """The stored body if it is fresh or within its stale window, else None (a miss)."""
+        ttl, stale = self.ttl(endpoint)
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._db.execute('SELECT body, fetched_at FROM responses WHERE key = ?', (key,)).fetchone()
+                age = now - row[1] if row else None
+                result = 'miss' if age is None or age > ttl + stale else 'hit' if age <= ttl else 'stale'
+                with self._transaction():
+                    if result != 'miss':
+                        self._db.execute('UPDATE responses SET read_at = ? WHERE key = ?', (now, key))
+                    self._count(endpoint, result)
+        except self._errors as e:
+            self._warn(e)
+            return None
+        METRONOME_CACHE.inc(endpoint, result)
+        return None if result == 'miss' else Cached(row[0], result == 'hit')
+
+    def store(self, key: str, endpoint: str, body: bytes):
+        now = time.time()
+        try:
+            with self._lock:
+                with self._transaction():
+                    self._db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                                     (key, endpoint, body, len(body), now, now))
+                    self._count(endpoint, 'store')
+                    evicted = self._evict()
+        except self._errors as e:
+            self._warn(e)
+            return
+        METRONOME_CACHE.inc(endpoint, 'store')
+        for evicted_endpoint, count in evicted.items():
+            METRONOME_CACHE.inc(evicted_endpoint, 'evict', amount=count)
+
+    def revalidate(self, key: str, fetch: Callable[[], None]):
+        """Run ``fetch`` (which stores a new response) on a background thread, once per entry at a time.
+
+        The thread is a daemon, so a hung Metronome call cannot keep the
+        process alive; at exit, revalidations still running get up to
+        ``REVALIDATE_EXIT_TIMEOUT`` seconds to store their entry.
+        """
+        with self._lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+
+        def run():
+            try:
+                fetch()
+            except Exception as e:
+                logger.warning(f"Background revalidation of a cached Metronome response failed: {e}")
+            finally:
+                with self._lock:
+                    self._revalidating.discard(key)
+                    self._threads.discard(thread)
+
+        thread = threading.Thread(target=run, name='metronome-cache-revalidate', daemon=True)
+        with self._lock:
+            self._threads.add(thread)
+        thread.start()
+
+    def wait(self, timeout: Optional[float] = None):
+        """Wait up to ``timeout`` seconds in total for background revalidations to finish."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            threads = list(self._threads)
+        for thread in threads:
+            thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+
+    def invalidate(self, endpoint: str):
+        """Drop cached reads under ``endpoint``'s first path segment (``/customers/{id}`` -> ``/customers...``).
+
+        Writes elsewhere (usage sent to ``/ingest``, say) return without touching the file.
+        """
+        if not self.invalidates(endpoint):
+            return
+        segment = _first_segment(endpoint)
+        try:
+            with self._lock, self._transaction():
+                self._db.execute('DELETE FROM responses WHERE endpoint = ? OR endpoint LIKE ?',
+                                 (segment, segment + '/%'))
+        except self._errors as e:
+            self._warn(e)
+
+    def clear(self):
+        with self._lock, self._transaction():
+            self._db.execute('DELETE FROM responses')
+            self._db.execute('DELETE FROM stats')
+        self._db.execute('VACUUM')
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per endpoint: counts of each result, ``hit_rate`` (hits and stale hits over lookups), entries and bytes."""
+        with self._lock:
+            counts = self._db.execute('SELECT endpoint, result, count FROM stats').fetchall()
+            stored = self._db.execute('SELECT endpoint, COUNT(*), SUM(size) FROM responses GROUP BY endpoint').fetchall()
+        summary = {}
+        for endpoint, result, count in counts:
+            summary.setdefault(endpoint, dict.fromkeys(RESULTS, 0))[result] = count
+        for endpoint, entries, size in stored:
+            row = summary.setdefault(endpoint, dict.fromkeys(RESULTS, 0))
+            row['entries'], row['bytes'] = entries, size
+        for row in summary.values():
+            row.setdefault('entries', 0)
+            row.setdefault('bytes', 0)
+            lookups = row['hit'] + row['stale'] + row['miss']
+            row['hit_rate'] = (row['hit'] + row['stale']) / lookups if lookups else None
+        return summary
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _transaction(self):
+        # sqlite3 connections are context managers that commit or roll back, but in autocommit mode need a BEGIN
+        self._db.execute('BEGIN IMMEDIATE')
+        return self._db
+
+    def _count(self, endpoint: str, result: str, amount: int = 1):
+        self._db.execute('INSERT INTO stats VALUES (?, ?, ?) '
+                         'ON CONFLICT (endpoint, result) DO UPDATE SET count = count + excluded.count',
+                         (endpoint, result, amount))
+
+    def _evict(self) -> Dict[str, int]:
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return {}
+        excess = total - self.max_bytes * EVICT_TO
+        evicted = {}
+        for key, endpoint, size in self._db.execute('SELECT key, endpoint, size FROM responses ORDER BY read_at')\
+                .fetchall():
+            if excess <= 0:
+                break
+            self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+            evicted[endpoint] = evicted.get(endpoint, 0) + 1
+            excess -= size
+        for endpoint, count in evicted.items():
+            self._count(endpoint, 'evict', count)
+        return evicted
+
+    def _warn(self, error):
+        if not self._warned:
+            logger.warning(f"Metronome response cache at {self.path} is unavailable: {error}")
+            self._warned = True
+
+
+def _first_segment(endpoint: str) -> str:
+    return '/' + endpoint.strip('/').split('/', 1)[0]
+
+
+_default: Optional[ResponseCache] = None
+_default_loaded = False
+_default_lock = threading.Lock()
+_caches = weakref.WeakSet()
+
+
+@atexit.register
+def _finish_revalidations():
+    deadline = time.monotonic() + REVALIDATE_EXIT_TIMEOUT
+    for cache in list(_caches):
+        cache.wait(max(0, deadline - time.monotonic()))
+
+
+def use_response_cache(path=None, max_bytes: Optional[int] = None) -> ResponseCache:
+    """Turn the shared cache on for this process (as ``METRONOME_RESPONSE_CACHE`` does) and return it."""
+    global _default, _default_loaded
+    with _default_lock:
+        _default = ResponseCache(path, max_bytes or _max_bytes_from_environment())
+        _default_loaded = True
+    return _default
+
+
+def default_response_cache() -> Optional[ResponseCache]:
+    """The process-wide cache ``MetronomeAPI`` clients use, or None when it is not enabled."""
+    global _default, _default_loaded
+    if _default_loaded:
+        return _default
+    with _default_lock:
+        if not _default_loaded:
+            setting = os.environ.get('METRONOME_RESPONSE_CACHE', '').strip()
+            if setting and setting.lower() not in ('0', 'false', 'no', 'off'):
+                path = None if setting.lower() in ('1', 'true', 'yes', 'on') else setting
+                try:
+                    _default = ResponseCache(path, _max_bytes_from_environment())
+                except Exception as e:
+                    logger.warning(f"Metronome response cache disabled: {e}")
+            _default_loaded = True
+    return _default
+
+
+def _max_bytes_from_environment() -> int:
+    megabytes = os.environ.get('METRONOME_RESPONSE_CACHE_MB')
+    return int(float(megabytes) * (1 << 20)) if megabytes else DEFAULT_MAX_BYTES
@@ -0,0 +1,92 @@
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+DEFAULT_MODELS = ['gpt-3.5-turbo', 'gpt-4', 'claude-2', 'claude-instant']
+EVENT_TYPES = ('token_usage', 'gpu_usage')
+GPU_TYPES = ('gpu_type_1', 'gpu_type_2', 'gpu_type_3')
+
+
+def generate_usage_events(customer_ids: Iterable[str], days: int = 7, events_per_day: int = 20,
+                          event_types: Sequence[str] = EVENT_TYPES, models: Sequence[str] = DEFAULT_MODELS,
+                          gpu_probability: float = 0.2, seed: Optional[int] = None,
+                          end: Optional[datetime] = None) -> Iterator[Dict]:
+    """Yield synthetic usage events hour by hour for each customer.
+
+    Business hours (8am-6pm UTC) get three times the off-hours volume. Each
+    token request produces an input and an output ``token_usage`` event and,
+    with ``gpu_probability``, a ``gpu_usage`` event. Events are generated
+    lazily so any number can be streamed to a file or to ``/ingest``; a fixed
+    ``seed`` reproduces the same events for the same ``end``.
+    """
+    rng = random.Random(seed)
+    end = end or datetime.now(timezone.utc)
+    start = end - timedelta(days=days)
+
+    for customer_id in customer_ids:
+        current = start
+        while current < end:
+            is_business_hours = 8 <= current.hour <= 18
+            hourly_events = int(events_per_day * (1.5 if is_business_hours else 0.5) / 24)
+
+            for _ in range(hourly_events):
+                timestamp = (current + timedelta(minutes=rng.randrange(60))).isoformat()
+
+                if 'token_usage' in event_types:
+                    model = rng.choice(models)
+                    input_tokens = rng.randrange(100, 2000)
+                    output_tokens = rng.randrange(50, input_tokens)
+                    for token_type, count in (('input', input_tokens), ('output', output_tokens)):
+                        yield {
+                            'transaction_id': f"{timestamp}_{customer_id}_{model}_{token_type}",
+                            'customer_id': customer_id,
+                            'event_type': 'token_usage',
+                            'timestamp': timestamp,
+                            'properties': {
+                                'type': token_type,
+                                'model_name': model,
+                                'token_count': count
+                            }
+                        }
+
+                if 'gpu_usage' in event_types and rng.random() < gpu_probability:
+                    gpu_type = rng.choice(GPU_TYPES)
+                    yield {
+                        'transaction_id': f"{timestamp}_{customer_id}_{gpu_type}",
+                        'customer_id': customer_id,
+                        'event_type': 'gpu_usage',
+                        'timestamp': timestamp,
+                        'properties': {
+                            'type': gpu_type,
+                            'hours': round(rng.uniform(0.1, 2.0), 3)
+                        }
+                    }
+
+            current += timedelta(hours=1)
+
+
+def usage_metric(event: Dict) -> Optional[Tuple[str, float]]:
+    """Map a usage event to ``(metric, quantity)``, or None for events that are not billed.
+
+    Understands both event shapes the generators produce: ``token_usage``
+    with ``token_count`` / ``tokens`` with ``count_tokens``, and
+    ``gpu_usage`` with ``hours`` / ``gpu`` with ``count_seconds``. Token
+    metrics are ``tokens:<model>:<input|output>`` counted in tokens, GPU
+    metrics are ``gpu:<type>`` counted in hours.
+    """
+    properties = event.get('properties') or {}
+    event_type = event.get('event_type')
+    if event_type in ('token_usage', 'tokens'):
+        count = properties.get('token_count', properties.get('count_tokens'))
+        if count is None:
+            return None
+        return f"tokens:{properties.get('model_name')}:{properties.get('type')}", float(count)
+    if event_type in ('gpu_usage', 'gpu'):
+        if 'hours' in properties:
+            hours = float(properties['hours'])
+        elif 'count_seconds' in properties:
+            hours = float(properties['count_seconds']) / 3600
+        else:
+            return None
+        return f"gpu:{properties.get('type')}", hours
+    return None
@@ -0,0 +1,113 @@
+import contextvars
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Hashable, Iterable, Iterator, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def bounded_map(fn: Callable[[T], R], items: Iterable[T], workers: int = 8,
+                max_in_flight: Optional[int] = None) -> Iterator[Tuple[T, Optional[R], Optional[Exception]]]:
+    """Run ``fn`` over ``items`` on a thread pool, yielding ``(item, result, error)`` as calls finish.
+
+    At most ``max_in_flight`` calls (default ``2 * workers``) are pending at
+    once, so ``items`` is consumed lazily and a stream of any length runs in
+    bounded memory. Results arrive in completion order. A failing call
+    yields its exception instead of stopping the others. Each call runs in
+    a copy of the caller's context variables (e.g. the job label of
+    recorded metrics).
+    """
+    max_in_flight = max_in_flight or 2 * workers
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < max_in_flight:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[executor.submit(contextvars.copy_context().run, fn, item)] = item
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                error = future.exception()
+                yield item, None if error else future.result(), error
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[list]:
+    """Group an iterable into lists of ``size`` items (the last may be shorter)."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def in_submission_order(results: Iterable[Tuple[Tuple[int, T], Optional[R], Optional[Exception]]]
+                        ) -> Iterator[Tuple[Tuple[int, T], Optional[R], Optional[Exception]]]:
+    """Re-sequence ``bounded_map`` results over ``enumerate``-d items into submission order.
+
+    A result is held back until every earlier item has finished, so only the
+    calls still in flight are ever buffered behind a slow one.
+    """
+    waiting = {}
+    expected = 0
+    for (index, item), result, error in results:
+        waiting[index] = ((index, item), result, error)
+        while expected in waiting:
+            yield waiting.pop(expected)
+            expected += 1
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one.
+
+    The first caller for a key runs the function; callers arriving while it
+    runs wait for it and share its result or its exception. Nothing is
+    kept once the call returns, so a later caller runs it again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key: Hashable, fn: Callable[..., R], *args, **kwargs) -> Tuple[R, bool]:
+        """Return ``(result, shared)``, ``shared`` being True for callers that waited on another's call."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+        try:
+            flight.result = fn(*args, **kwargs)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
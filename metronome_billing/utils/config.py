@@ -19,10 +19,12 @@ class Config:
         else:
             raise FileNotFoundError("No configuration file found")
 
+    # Environment variables take precedence over the ini files so keys
+    # never have to be written into scripts or committed config.
     @property
     def metronome_api_key(self) -> str:
-        return self.config.get('metronome', 'api_key')
+        return os.environ.get('METRONOME_API_KEY') or self.config.get('metronome', 'api_key')
 
     @property
     def stripe_api_key(self) -> str:
-        return self.config.get('stripe', 'api_key')
\ No newline at end of file
+        return os.environ.get('STRIPE_API_KEY') or self.config.get('stripe', 'api_key')
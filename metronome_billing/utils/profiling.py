@@ -0,0 +1,323 @@
+"""On-demand profiling for web requests, background jobs, CLI commands and scripts.
+
+A ``Profile`` samples call stacks on a background thread (wall clock,
+every 5 ms by default), adds up per-phase wall and CPU time reported
+through ``phase()`` / ``record_phase()`` (fetch, parse, upsert, commit) and
+follows memory with ``tracemalloc``, snapshotting allocation sites as the
+traced size reaches new highs. On exit it writes two files to the profile
+directory (``.cache/profiles``, or ``$METRONOME_PROFILE_DIR``):
+
+- ``<id>.collapsed``: one ``thread;frame;...;frame count`` line per stack,
+  the input of ``flamegraph.pl``, speedscope and most flame graph tools;
+- ``<id>.json``: timings, phases, the hottest functions and the top
+  allocation sites at peak memory.
+
+Only the newest ``$METRONOME_PROFILE_KEEP`` profiles (200 by default) are
+kept; older ones are deleted as new ones are written.
+
+Only one profile runs at a time. tracemalloc makes allocation-heavy code
+several times slower, so compare timings between profiles rather than
+with unprofiled runs, or set ``METRONOME_PROFILE_MEMORY=0`` for profiles
+without memory tracing. With no profile active, ``phase()`` costs a
+context variable lookup.
+"""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+DEFAULT_PROFILE_DIR = Path(__file__).resolve().parents[2] / '.cache' / 'profiles'
+DEFAULT_INTERVAL = 0.005
+TOP_FUNCTIONS = 15
+TOP_ALLOCATIONS = 15
+# A new memory snapshot is taken when the traced size doubles, so snapshots cost at most about twice the last one
+SNAPSHOT_GROWTH = 2.0
+SNAPSHOT_MIN_BYTES = 4 << 20
+DEFAULT_KEEP = 200
+
+logger = logging.getLogger(__name__)
+
+# The profile the current code reports phases to, if any
+active_profile: ContextVar[Optional['Profile']] = ContextVar('active_profile', default=None)
+
+# Held while a profile runs: tracemalloc and the sampler are process-wide
+_running = threading.Lock()
+
+
+def profile_dir() -> Path:
+    return Path(os.environ.get('METRONOME_PROFILE_DIR') or DEFAULT_PROFILE_DIR)
+
+
+def _keep() -> int:
+    return int(os.environ.get('METRONOME_PROFILE_KEEP') or DEFAULT_KEEP)
+
+
+def _trace_memory_default() -> bool:
+    return os.environ.get('METRONOME_PROFILE_MEMORY', '1') != '0'
+
+
+@contextmanager
+def phase(name: str):
+    """Add the block's wall and CPU time to phase ``name`` of the active profile."""
+    profile = active_profile.get()
+    if profile is None:
+        yield
+        return
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        profile.add_phase(name, time.perf_counter() - wall, time.thread_time() - cpu)
+
+
+def record_phase(name: str, wall: float, cpu: float):
+    """Report time measured elsewhere (e.g. by a SQLAlchemy event) to the active profile."""
+    profile = active_profile.get()
+    if profile is not None:
+        profile.add_phase(name, wall, cpu)
+
+
+# Code object -> flame graph frame label
+_labels = {}
+_STDLIB = os.path.dirname(os.__file__) + os.sep
+
+
+def _frame_label(code):
+    label = _labels.get(code)
+    if label is None:
+        filename = code.co_filename
+        marker = filename.rfind('site-packages' + os.sep)
+        if marker >= 0:
+            filename = filename[marker + len('site-packages') + 1:]
+        elif filename.startswith(_STDLIB):
+            filename = filename[len(_STDLIB):]
+        elif filename.startswith(os.getcwd()):
+            filename = os.path.relpath(filename)
+        label = _labels[code] = f"{getattr(code, 'co_qualname', code.co_name)} ({filename}:{code.co_firstlineno})"
+    return label
+
+
+def _is_idle_worker(frame):
+    # A thread pool worker blocked on its (C) work queue has its own loop as the innermost Python frame
+    code = frame.f_code
+    return code.co_name == '_worker' and code.co_filename.endswith(os.path.join('concurrent', 'futures', 'thread.py'))
+
+
+class Profile:
+    """Profile a block of code: ``with Profile('refresh_customers'): ...``.
+
+    By default the thread that entered the block is sampled along with
+    threads started while it runs (the thread pools doing its work), each
+    stack rooted at its thread's name; ``threads='current'`` samples only
+    the entering thread (a web request among others). ``trace_memory``
+    defaults to ``$METRONOME_PROFILE_MEMORY`` (on). If another profile is
+    running, the block runs unprofiled and ``path`` stays None; ``path``
+    is the summary's path once the block has finished.
+    """
+
+    def __init__(self, name: str, directory=None, interval: float = DEFAULT_INTERVAL, threads: str = 'spawned',
+                 trace_memory: Optional[bool] = None):
+        self.name = name
+        self.directory = Path(directory) if directory else profile_dir()
+        self.interval = interval
+        self.threads = threads
+        self.trace_memory = _trace_memory_default() if trace_memory is None else trace_memory
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', name).strip('_')[:60] or 'profile'
+        self.id = f"{stamp}-{slug}-{uuid.uuid4().hex[:6]}"
+        self.path = None
+        self.active = False
+        self.phases: Dict[str, List[float]] = {}
+        self._stacks = Counter()
+        self._samples = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._owns_tracemalloc = False
+        self._snapshot = None
+        self._snapshot_size = 0
+        self._token = None
+
+    def add_phase(self, name: str, wall: float, cpu: float):
+        with self._lock:
+            totals = self.phases.setdefault(name, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += wall
+            totals[2] += cpu
+
+    def __enter__(self):
+        if not _running.acquire(blocking=False):
+            logger.warning(f"Not profiling {self.name}: another profile is running")
+            return self
+        self.active = True
+        self._owns_tracemalloc = self.trace_memory and not tracemalloc.is_tracing()
+        if self._owns_tracemalloc:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        self._entered = threading.get_ident()
+        self._target = self._entered if self.threads == 'current' else None
+        # Threads that were already running (idle pools, the server's listener) are not this block's work
+        self._excluded = set(sys._current_frames()) - {self._entered}
+        self._started_at = datetime.now(timezone.utc)
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time() if self._target else time.process_time()
+        self._token = active_profile.set(self)
+        self._sampler = threading.Thread(target=self._sample_loop, name='profiler', daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc):
+        if not self.active:
+            return False
+        try:
+            wall = time.perf_counter() - self._wall
+            cpu = (time.thread_time() if self._target else time.process_time()) - self._cpu
+            self._stop.set()
+            self._sampler.join()
+            try:
+                active_profile.reset(self._token)
+            except ValueError:
+                # Exited from another context than the one that entered, e.g. a request teardown
+                active_profile.set(None)
+            current, peak = tracemalloc.get_traced_memory() if self.trace_memory else (0, None)
+            if self.trace_memory:
+                self._take_snapshot(current)
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+            self._write(wall, cpu, peak)
+        finally:
+            self.active = False
+            _running.release()
+        return False
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                self._samples += 1
+                for ident, frame in frames.items():
+                    if ident == own or ident in self._excluded or (self._target is not None and ident != self._target) \
+                            or _is_idle_worker(frame):
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frame_label(frame.f_code))
+                        frame = frame.f_back
+                    if self._target is None:
+                        if ident not in names:
+                            names = {thread.ident: thread.name for thread in threading.enumerate()}
+                        stack.append(names.get(ident, str(ident)))
+                    self._stacks[tuple(reversed(stack))] += 1
+            if self.trace_memory:
+                current = tracemalloc.get_traced_memory()[0]
+                if current >= max(SNAPSHOT_MIN_BYTES, self._snapshot_size * SNAPSHOT_GROWTH):
+                    self._take_snapshot(current)
+
+    def _take_snapshot(self, size):
+        if size >= self._snapshot_size:
+            self._snapshot = tracemalloc.take_snapshot()
+            self._snapshot_size = size
+
+    def _write(self, wall, cpu, peak):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / f"{self.id}.collapsed", 'w') as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+
+        self_samples = Counter()
+        for stack, count in self._stacks.items():
+            self_samples[stack[-1]] += count
+        total = sum(self._stacks.values()) or 1
+        allocations = []
+        if self._snapshot is not None:
+            snapshot = self._snapshot.filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+            ))
+            for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+                frame = stat.traceback[0]
+                allocations.append({'location': f"{frame.filename}:{frame.lineno}",
+                                    'size_bytes': stat.size, 'count': stat.count})
+        summary = {
+            'id': self.id,
+            'name': self.name,
+            'started_at': self._started_at.isoformat(),
+            'wall_seconds': round(wall, 4),
+            'cpu_seconds': round(cpu, 4),
+            'cpu_scope': 'thread' if self._target else 'process',
+            'interval_seconds': self.interval,
+            'samples': self._samples,
+            'phases': {name: {'calls': calls, 'wall_seconds': round(phase_wall, 4), 'cpu_seconds': round(phase_cpu, 4)}
+                       for name, (calls, phase_wall, phase_cpu)
+                       in sorted(self.phases.items(), key=lambda item: -item[1][1])},
+            'hottest': [{'function': function, 'share': round(count / total, 4)}
+                        for function, count in self_samples.most_common(TOP_FUNCTIONS)],
+            'memory': {'peak_bytes': peak, 'snapshot_bytes': self._snapshot_size, 'top': allocations}
+                      if self.trace_memory else None,
+        }
+        path = self.directory / f"{self.id}.json"
+        with open(path, 'w') as f:
+            json.dump(summary, f, indent=2)
+        self.path = path
+        logger.info(f"Profile of {self.name} written to {path}")
+        prune_profiles(self.directory, _keep())
+
+
+def prune_profiles(directory=None, keep: int = DEFAULT_KEEP) -> int:
+    """Delete all but the newest ``keep`` profiles; returns how many were deleted."""
+    directory = Path(directory) if directory else profile_dir()
+    # Oldest first; IDs only have one-second resolution, so order by when the summary was written
+    summaries = sorted(directory.glob('*.json'), key=lambda path: (path.stat().st_mtime, path.name))
+    stale = summaries[:max(len(summaries) - keep, 0)]
+    for summary in stale:
+        for path in (summary, summary.with_suffix('.collapsed')):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+    return len(stale)
+
+
+def list_profiles(directory=None, limit: int = 20) -> List[Dict]:
+    """Summaries of the newest profiles, newest first."""
+    directory = Path(directory) if directory else profile_dir()
+    if not directory.is_dir():
+        return []
+    summaries = []
+    for path in sorted(directory.glob('*.json'), reverse=True)[:limit]:
+        try:
+            with open(path) as f:
+                summaries.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return summaries
+
+
+def run_script(main, argv=None):
+    """Run a script's ``main()``, profiled when ``--profile`` is among its arguments."""
+    argv = sys.argv if argv is None else argv
+    if '--profile' not in argv:
+        return main()
+    argv.remove('--profile')
+    profile = Profile(Path(argv[0]).stem)
+    try:
+        with profile:
+            return main()
+    finally:
+        # Also when main() calls sys.exit()
+        if profile.path:
+            print(f"Profile written to {profile.path}", file=sys.stderr)
@@ -0,0 +1,69 @@
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+
+# Events successfully sent to /ingest are also appended here for local analytics
+DEFAULT_SPOOL_DIR = Path(__file__).resolve().parents[2] / '.cache' / 'usage_spool'
+SEGMENT_SUFFIX = '.ndjson'
+
+
+def default_spool_dir() -> Path:
+    return Path(os.environ.get('METRONOME_USAGE_SPOOL') or DEFAULT_SPOOL_DIR)
+
+
+class Spool:
+    """A directory of append-only NDJSON segments.
+
+    Writers stream into a hidden temporary file that is renamed into place
+    when the writer closes, so readers only ever see complete segments.
+    Segment names sort in creation order and are unique across processes,
+    which lets a consumer record the names it has applied.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory) if directory else default_spool_dir()
+
+    @contextmanager
+    def writer(self):
+        """Yield ``write(events)``; the segment is published on exit, or dropped when empty."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}{SEGMENT_SUFFIX}"
+        tmp_path = self.directory / f".{name}.tmp"
+        count = 0
+        handle = open(tmp_path, 'w', encoding='utf-8')
+
+        def write(events: Iterable[Dict]):
+            nonlocal count
+            for event in events:
+                handle.write(json.dumps(event, separators=(',', ':')))
+                handle.write('\n')
+                count += 1
+
+        try:
+            yield write
+        finally:
+            handle.close()
+            if count:
+                os.replace(tmp_path, self.directory / name)
+            else:
+                os.unlink(tmp_path)
+
+    def append(self, events: Iterable[Dict]):
+        with self.writer() as write:
+            write(events)
+
+    def segments(self) -> List[Path]:
+        if not self.directory.exists():
+            return []
+        return sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}"))
+
+    @staticmethod
+    def read(segment: Path) -> Iterator[Dict]:
+        with open(segment, encoding='utf-8') as handle:
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
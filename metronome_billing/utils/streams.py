@@ -0,0 +1,63 @@
+import csv
+import json
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator
+
+STDIO = '-'
+
+
+@contextmanager
+def open_text(path: str, mode: str = 'r'):
+    """Open ``path`` for text I/O, with ``-`` meaning stdin or stdout."""
+    if path == STDIO:
+        yield sys.stdout if 'w' in mode else sys.stdin
+        return
+    with open(path, mode, newline='', encoding='utf-8') as handle:
+        yield handle
+
+
+def read_csv_rows(path: str) -> Iterator[Dict[str, str]]:
+    """Yield CSV rows as dicts one at a time."""
+    with open_text(path) as handle:
+        yield from csv.DictReader(handle)
+
+
+def read_ndjson(path: str) -> Iterator[Dict]:
+    """Yield one JSON object per non-blank line."""
+    with open_text(path) as handle:
+        for line in handle:
+            if line.strip():
+                yield json.loads(line)
+
+
+def write_ndjson(records: Iterable[Dict], handle) -> int:
+    count = 0
+    for record in records:
+        handle.write(json.dumps(record, separators=(',', ':')))
+        handle.write('\n')
+        count += 1
+    return count
+
+
+@contextmanager
+def atomic_write(path: str):
+    """Write through a temporary file that replaces ``path`` only on success.
+
+    Lets a command stream its output to the same CSV it is reading from.
+    """
+    if path == STDIO:
+        yield sys.stdout
+        return
+    target = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent or '.', prefix=f".{target.name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as handle:
+            yield handle
+        os.replace(tmp_path, target)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
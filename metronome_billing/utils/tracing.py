@@ -0,0 +1,410 @@
+"""Lightweight tracing: nested spans exported in the OTLP JSON format.
+
+Tracing is off unless an exporter is configured, either with ``configure()``
+or from the environment:
+
+- ``METRONOME_TRACE_FILE``: append each trace to this file as one OTLP
+  ``ExportTraceServiceRequest`` JSON object per line (the layout of the
+  OpenTelemetry Collector's file exporter);
+- ``OTEL_EXPORTER_OTLP_TRACES_ENDPOINT`` or ``OTEL_EXPORTER_OTLP_ENDPOINT``
+  (``/v1/traces`` is appended): POST each trace as OTLP/HTTP JSON to a
+  collector.
+
+``trace()`` opens a root span at the start of a flow (a request, a job, a
+CLI command); ``span()`` opens a child of the current span and does
+nothing outside a trace, so library code can be instrumented freely.
+Spans follow context variables, so ``bounded_map`` workers nest under the
+caller. A finished trace is handed to a background thread for export.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Iterable, List, Optional
+
+SERVICE_NAME = os.environ.get('OTEL_SERVICE_NAME', 'metronome-billing')
+SCOPE_NAME = 'metronome_billing'
+# OTLP span kinds
+KINDS = {'internal': 1, 'server': 2, 'client': 3}
+STATUS_ERROR = 2
+
+logger = logging.getLogger(__name__)
+
+current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+
+class _Trace:
+    __slots__ = ('id', 'spans', 'exported', 'lock')
+
+    def __init__(self):
+        self.id = os.urandom(16).hex()
+        self.spans = []
+        self.exported = False
+        self.lock = threading.Lock()
+
+
+class Span:
+    """One timed operation of a trace. End it with ``end()``, or use ``span()``."""
+
+    __slots__ = ('name', 'kind', 'trace', 'span_id', 'parent_id', 'start_ns', 'end_ns', 'attributes',
+                 'error', '_token')
+
+    def __init__(self, name: str, kind: str, trace: _Trace, parent: Optional['Span'], attributes: Dict):
+        self.name = name
+        self.kind = kind
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else ''
+        self.attributes = attributes
+        self.error = None
+        self.end_ns = None
+        self.start_ns = time.time_ns()
+        self._token = current_span.set(self)
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def record_error(self, error):
+        self.error = f"{type(error).__name__}: {error}" if isinstance(error, BaseException) else str(error)
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        try:
+            current_span.reset(self._token)
+        except ValueError:
+            # Ended from another context than the one that started it, e.g. a request teardown
+            current_span.set(None)
+        trace = self.trace
+        with trace.lock:
+            if trace.exported:
+                # Outlived its root span; exported on its own
+                batch = [self]
+            else:
+                trace.spans.append(self)
+                batch = trace.spans if not self.parent_id else None
+                trace.exported = batch is not None
+        if batch:
+            _exporter.export(batch)
+
+
+class _NoopSpan:
+    """Stands in for a span when nothing is traced, so callers need no checks."""
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_error(self, error):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def start_span(name: str, attributes: Optional[Dict] = None, kind: str = 'internal'):
+    """Start a child of the current span and make it current; a no-op span outside a trace."""
+    parent = current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(name, kind, parent.trace, parent, dict(attributes or {}))
+
+
+def start_trace(name: str, attributes: Optional[Dict] = None, kind: str = 'internal'):
+    """Start a root span, or a child span when already inside a trace. A no-op when tracing is off."""
+    parent = current_span.get()
+    if parent is not None:
+        return Span(name, kind, parent.trace, parent, dict(attributes or {}))
+    if not _exporter.enabled:
+        return NOOP_SPAN
+    return Span(name, kind, _Trace(), None, dict(attributes or {}))
+
+
+@contextmanager
+def _spanning(started):
+    try:
+        yield started
+    except BaseException as e:
+        started.record_error(e)
+        raise
+    finally:
+        started.end()
+
+
+def span(name: str, attributes: Optional[Dict] = None, kind: str = 'internal'):
+    """``with span('stripe.customer.create'): ...`` records the block as a child of the current span."""
+    return _spanning(start_span(name, attributes, kind))
+
+
+def trace(name: str, attributes: Optional[Dict] = None, kind: str = 'internal'):
+    """``with trace('job refresh_database'): ...`` records the block as a new trace."""
+    return _spanning(start_trace(name, attributes, kind))
+
+
+def client_span(service: str, method: str, path: str):
+    """A span for an outbound HTTP call; the caller adds ``http.response.status_code``."""
+    return span(f"{method} {path}", {'peer.service': service, 'http.request.method': method, 'url.path': path},
+                kind='client')
+
+
+def traced(name: Optional[str] = None):
+    """Decorator recording each call of a function as a span."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name or fn.__name__):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _attribute_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def otlp_payload(spans: Iterable[Span], service_name: str = SERVICE_NAME) -> Dict:
+    """An OTLP ``ExportTraceServiceRequest`` (JSON encoding) holding ``spans``."""
+    encoded = []
+    for s in spans:
+        record = {
+            'traceId': s.trace.id,
+            'spanId': s.span_id,
+            'parentSpanId': s.parent_id,
+            'name': s.name,
+            'kind': KINDS.get(s.kind, 1),
+            'startTimeUnixNano': str(s.start_ns),
+            'endTimeUnixNano': str(s.end_ns),
+            'attributes': [{'key': key, 'value': _attribute_value(value)}
+                           for key, value in s.attributes.items() if value is not None],
+        }
+        if s.error:
+            record['status'] = {'code': STATUS_ERROR, 'message': s.error}
+        encoded.append(record)
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': service_name}}]},
+        'scopeSpans': [{'scope': {'name': SCOPE_NAME}, 'spans': encoded}],
+    }]}
+
+
+class _Exporter:
+    """Writes finished traces to a file and/or a collector from a background thread."""
+
+    def __init__(self):
+        self.path = None
+        self.endpoint = None
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._warned = False
+
+    @property
+    def enabled(self):
+        return bool(self.path or self.endpoint)
+
+    def configure(self, path=None, endpoint=None):
+        self.path = path
+        self.endpoint = endpoint
+
+    def export(self, spans: List[Span]):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+        self._queue.put(spans)
+
+    def flush(self):
+        """Wait until every queued trace has been written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def _run(self):
+        while True:
+            spans = self._queue.get()
+            try:
+                payload = json.dumps(otlp_payload(spans), separators=(',', ':'))
+                if self.path:
+                    with open(self.path, 'a') as f:
+                        f.write(payload + '\n')
+                if self.endpoint:
+                    self._post(payload)
+            except Exception as e:
+                if not self._warned:
+                    logger.warning(f"Could not export traces: {e}")
+                    self._warned = True
+            finally:
+                self._queue.task_done()
+
+    def _post(self, payload):
+        from urllib.request import Request, urlopen
+        request = Request(self.endpoint, data=payload.encode(), method='POST',
+                          headers={'Content-Type': 'application/json'})
+        with urlopen(request, timeout=5) as response:
+            response.read()
+
+
+def environment_endpoint():
+    """The OTLP/HTTP traces endpoint set with the standard ``OTEL_EXPORTER_OTLP_*`` variables, if any."""
+    endpoint = os.environ.get('OTEL_EXPORTER_OTLP_TRACES_ENDPOINT')
+    if endpoint:
+        return endpoint
+    base = os.environ.get('OTEL_EXPORTER_OTLP_ENDPOINT')
+    return f"{base.rstrip('/')}/v1/traces" if base else None
+
+
+_exporter = _Exporter()
+_exporter.configure(os.environ.get('METRONOME_TRACE_FILE') or None, environment_endpoint())
+
+
+def configure(path=None, endpoint=None):
+    """Export traces to ``path`` and/or the OTLP/HTTP ``endpoint`` (full URL); both None turns tracing off."""
+    _exporter.configure(path, endpoint)
+
+
+def tracing_enabled() -> bool:
+    return _exporter.enabled
+
+
+def flush():
+    _exporter.flush()
+
+
+# Reading exported traces back
+
+def load_spans(lines: Iterable[str]) -> List[Dict]:
+    """Flatten OTLP JSON lines into span dicts with ``start``/``end`` in seconds and plain attributes."""
+    spans = []
+    for line in lines:
+        if not line.strip():
+            continue
+        for resource in json.loads(line).get('resourceSpans', []):
+            for scope in resource.get('scopeSpans', []):
+                for record in scope.get('spans', []):
+                    spans.append({
+                        'trace_id': record['traceId'],
+                        'span_id': record['spanId'],
+                        'parent_id': record.get('parentSpanId') or '',
+                        'name': record['name'],
+                        'start': int(record['startTimeUnixNano']) / 1e9,
+                        'end': int(record['endTimeUnixNano']) / 1e9,
+                        'attributes': {item['key']: next(iter(item['value'].values()))
+                                       for item in record.get('attributes', [])},
+                        'error': (record.get('status') or {}).get('message'),
+                    })
+    return spans
+
+
+def group_traces(spans: Iterable[Dict]) -> List[Dict]:
+    """Roots with their spans' ``children`` filled in, oldest first."""
+    by_id = {}
+    for s in spans:
+        by_id[s['span_id']] = dict(s, children=[])
+    roots = []
+    for s in by_id.values():
+        parent = by_id.get(s['parent_id'])
+        if parent is None:
+            roots.append(s)
+        else:
+            parent['children'].append(s)
+    for s in by_id.values():
+        s['children'].sort(key=lambda child: child['start'])
+    return sorted(roots, key=lambda root: root['start'])
+
+
+def critical_path(root: Dict) -> set:
+    """Span IDs on the critical path: walking back from the end, the child that finished last before each point."""
+    path = {root['span_id']}
+    point = root['end']
+    for child in sorted(root['children'], key=lambda c: c['end'], reverse=True):
+        if child['end'] <= point + 1e-6:
+            path |= critical_path(child)
+            point = child['start']
+    return path
+
+
+def serial_runs(root: Dict, min_share: float = 0.05) -> List[Dict]:
+    """Runs of two or more sibling spans that ran one after another, largest first.
+
+    Each run's ``total`` is the time its spans took in sequence and
+    ``longest`` the time the run would take if the spans were independent
+    and ran together. Only runs costing at least ``min_share`` of the
+    trace are listed.
+    """
+    runs = []
+    threshold = (root['end'] - root['start']) * min_share
+
+    def visit(parent):
+        run = []
+        for child in parent['children']:
+            if run and child['start'] < run[-1]['end']:
+                add(parent, run)
+                run = []
+            run.append(child)
+            visit(child)
+        add(parent, run)
+
+    def add(parent, run):
+        if len(run) < 2:
+            return
+        total = sum(s['end'] - s['start'] for s in run)
+        longest = max(s['end'] - s['start'] for s in run)
+        if total - longest >= threshold:
+            runs.append({'parent': parent['name'], 'count': len(run), 'total': total, 'longest': longest,
+                         'names': Counter(s['name'] for s in run).most_common(3)})
+
+    visit(root)
+    return sorted(runs, key=lambda run: run['total'] - run['longest'], reverse=True)
+
+
+def format_trace(root: Dict, max_depth: int = 6, max_children: int = 12) -> List[str]:
+    """A text waterfall of a trace; ``*`` marks spans on the critical path."""
+    on_path = critical_path(root)
+    lines = []
+
+    def visit(s, depth):
+        offset = (s['start'] - root['start']) * 1000
+        duration = (s['end'] - s['start']) * 1000
+        marker = '*' if s['span_id'] in on_path else ' '
+        error = f"  ! {s['error']}" if s['error'] else ''
+        lines.append(f"{marker} {offset:9.1f} ms {duration:9.1f} ms  {'  ' * depth}{s['name']}{error}")
+        if depth + 1 >= max_depth:
+            return
+        children = s['children']
+        shown = children if len(children) <= max_children else \
+            sorted(children, key=lambda c: c['end'] - c['start'], reverse=True)[:max_children]
+        for child in sorted(shown, key=lambda c: c['start']):
+            visit(child, depth + 1)
+        if len(shown) < len(children):
+            hidden = [c for c in children if c not in shown]
+            spent = sum(c['end'] - c['start'] for c in hidden) * 1000
+            lines.append(f"  {'':>9}    {spent:9.1f} ms  {'  ' * (depth + 1)}... {len(hidden)} shorter spans")
+
+    visit(root, 0)
+    return lines
+
+
+def summarize_names(spans: Iterable[Dict]) -> Dict[str, Dict]:
+    """Count and total seconds per span name."""
+    totals = defaultdict(lambda: {'count': 0, 'seconds': 0.0})
+    for s in spans:
+        totals[s['name']]['count'] += 1
+        totals[s['name']]['seconds'] += s['end'] - s['start']
+    return dict(totals)
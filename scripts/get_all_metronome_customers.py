@@ -1,63 +1,50 @@
 #!/usr/bin/env python3
 import sys
 from pathlib import Path
-import json
-from datetime import datetime
 from rich.console import Console
 from rich.table import Table
 sys.path.append(str(Path(__file__).parent.parent))
+from metronome_billing.core.export import CUSTOMER_FIELDS, customer_row, export_rows, snapshot_rows
 from metronome_billing.core.metronome_api import MetronomeAPI
+from metronome_billing.utils.streams import read_csv_rows
+from metronome_billing.utils.profiling import run_script
 
-def get_all_customers(api):
-    """Get all customers from Metronome with pagination"""
-    all_customers = []
-    cursor = None
-    page = 1
-    
-    console = Console()
-    console.print("[cyan]Fetching customers from Metronome...")
-    
-    while True:
-        try:
-            # Make request with cursor if available
-            params = {"limit": 100}  # API limit is 100 per page
-            if cursor:
-                params["cursor"] = cursor
-            
-            response = api._make_request("GET", "/customers", params=params)
-            console.print(f"Response: {response}", style="yellow")
-            
-            # Check if we got any customers
-            customers = response.get('data', [])
-            if not customers:
-                break
-                
-            all_customers.extend(customers)
-            console.print(f"✓ Retrieved page {page} with {len(customers)} customers (Total: {len(all_customers)})", style="green")
-            
-            # Get cursor for next page
-            cursor = response.get('next_page')
-            if not cursor:
-                break
-                
-            page += 1
-            
-        except Exception as e:
-            console.print(f"Error fetching page {page}: {str(e)}", style="red")
-            if hasattr(e, 'response'):
-                console.print(f"Response: {e.response.text}", style="red")
-            break
-    
-    return all_customers
+ALL_CUSTOMER_FIELDS = CUSTOMER_FIELDS + ['stripe_customer_id', 'contract_id']
+SNAPSHOT_DIR = Path(__file__).parent.parent / 'snapshots'
+
+class CustomerSummary:
+    """Counts gathered while customers stream past, so nothing is buffered for the summary"""
+
+    def __init__(self):
+        self.total = 0
+        self.with_external_ids = 0
+        self.with_custom_fields = 0
+        self.with_ingest_aliases = 0
+        self.name_patterns = {}
+
+    def add(self, customer):
+        self.total += 1
+        self.with_external_ids += bool(customer.get('external_id'))
+        self.with_custom_fields += bool(customer.get('custom_fields'))
+        self.with_ingest_aliases += bool(customer.get('ingest_aliases'))
+        name = customer.get('name', '')
+        if name.startswith('Sample Company Inc.'):
+            pattern = 'Sample Company Inc.'
+        elif name.startswith('Test Customer'):
+            pattern = 'Test Customer'
+        else:
+            pattern = 'Other'
+        self.name_patterns[pattern] = self.name_patterns.get(pattern, 0) + 1
 
-def save_customers_to_json(customers, output_file):
-    """Save customers to a JSON file with pretty formatting"""
-    with open(output_file, 'w') as f:
-        json.dump(customers, f, indent=2)
+def summarized_rows(customers, summary):
+    for customer in customers:
+        summary.add(customer)
+        yield {**customer_row(customer), 'stripe_customer_id': '', 'contract_id': ''}
 
-def display_customer_summary(customers):
+def display_customer_summary(summary):
     """Display a summary of the customers in a table"""
     console = Console()
+    total = summary.total
     
     # Create main statistics table
     table = Table(show_header=True, header_style="bold magenta")
@@ -66,18 +53,12 @@ def display_customer_summary(customers):
     table.add_column("With Custom Fields", justify="center")
     table.add_column("With Ingest Aliases", justify="center")
     
-    # Calculate statistics
-    total = len(customers)
-    with_external_ids = sum(1 for c in customers if c.get('external_id'))
-    with_custom_fields = sum(1 for c in customers if c.get('custom_fields'))
-    with_ingest_aliases = sum(1 for c in customers if c.get('ingest_aliases'))
-    
     # Add row to table
     table.add_row(
         str(total),
-        f"{with_external_ids} ({with_external_ids/total*100:.1f}%)",
-        f"{with_custom_fields} ({with_custom_fields/total*100:.1f}%)",
-        f"{with_ingest_aliases} ({with_ingest_aliases/total*100:.1f}%)"
+        f"{summary.with_external_ids} ({summary.with_external_ids/total*100:.1f}%)",
+        f"{summary.with_custom_fields} ({summary.with_custom_fields/total*100:.1f}%)",
+        f"{summary.with_ingest_aliases} ({summary.with_ingest_aliases/total*100:.1f}%)"
     )
     
     # Create name pattern table
@@ -85,20 +66,8 @@ def display_customer_summary(customers):
     name_table.add_column("Name Pattern", justify="left")
     name_table.add_column("Count", justify="right")
     
-    # Analyze name patterns
-    name_patterns = {}
-    for c in customers:
-        name = c.get('name', '')
-        if name.startswith('Sample Company Inc.'):
-            pattern = 'Sample Company Inc.'
-        elif name.startswith('Test Customer'):
-            pattern = 'Test Customer'
-        else:
-            pattern = 'Other'
-        name_patterns[pattern] = name_patterns.get(pattern, 0) + 1
-    
     # Add rows to name pattern table
-    for pattern, count in sorted(name_patterns.items(), key=lambda x: x[1], reverse=True):
+    for pattern, count in sorted(summary.name_patterns.items(), key=lambda x: x[1], reverse=True):
         name_table.add_row(pattern, f"{count} ({count/total*100:.1f}%)")
     
     console.print("\n[bold]Customer Summary:[/bold]")
@@ -107,41 +76,31 @@ def display_customer_summary(customers):
     console.print(name_table)
 
 def main():
-    # Initialize API
-    api_key = "48b0453c99607fb5dfb4dc717ab2d9a2b6cc0dabec7885228871bc8c42748ccf"
-    api = MetronomeAPI(api_key=api_key)
-    
-    # Get all customers
-    customers = get_all_customers(api)
-    
-    if not customers:
+    api = MetronomeAPI()
+    console = Console()
+    console.print("[cyan]Fetching customers from Metronome...")
+
+    # Stream customers straight into all_customers.csv for use with other scripts
+    summary = CustomerSummary()
+    csv_file = Path(__file__).parent.parent / 'all_customers.csv'
+    rows = summarized_rows(api.iter_customers(), summary)
+    export_rows(rows, str(csv_file), fieldnames=ALL_CUSTOMER_FIELDS)
+
+    if not summary.total:
         print("No customers found")
         return
-    
-    # Save to JSON file
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file = f'../metronome_customers_{timestamp}.json'
-    save_customers_to_json(customers, output_file)
-    print(f"\nSaved {len(customers)} customers to {output_file}")
+    print(f"\nSaved {summary.total} customers to {csv_file}")
+
+    # Keep a compressed snapshot only when the customer list actually changed
+    snapshot = snapshot_rows(read_csv_rows(str(csv_file)), str(SNAPSHOT_DIR), fmt='ndjson',
+                             fieldnames=ALL_CUSTOMER_FIELDS, compression='gzip')
+    if snapshot['written']:
+        print(f"Saved snapshot {snapshot['path']}")
+    else:
+        print(f"Customers unchanged since snapshot {snapshot['path']}")
     
     # Display summary
-    display_customer_summary(customers)
-    
-    # Save to CSV
-    csv_file = '../all_customers.csv'
-    import pandas as pd
-    df = pd.DataFrame([{
-        'customer_id': c.get('id'),
-        'name': c.get('name'),
-        'external_id': c.get('external_id'),
-        'salesforce_account_id': '',
-        'ingest_aliases': c.get('ingest_aliases', []),
-        'custom_fields': c.get('custom_fields', {}),
-        'stripe_customer_id': '',
-        'contract_id': ''
-    } for c in customers])
-    df.to_csv(csv_file, index=False)
-    print(f"\nSaved customer data to {csv_file} for use with other scripts")
+    display_customer_summary(summary)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run_script(main)
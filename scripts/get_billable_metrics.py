@@ -1,23 +1,27 @@
-import requests
+import sys
+from pathlib import Path
 import csv
+sys.path.append(str(Path(__file__).parent.parent))
+from metronome_billing.core.metronome_api import MetronomeAPI
+from metronome_billing.utils.profiling import run_script
 
-api_key = "76d6d17428784bf44e1971074ca1ac9a4079bb4d81a508cd47e0a650567f471d"
-api_url = "https://api.metronome.com/v1/billable-metrics"
+def main():
+    # Through MetronomeAPI, so repeated runs can be answered by the response cache (METRONOME_RESPONSE_CACHE=1).
+    # The key comes from METRONOME_API_KEY or the config ini.
+    try:
+        response = MetronomeAPI()._make_request("GET", "/billable-metrics")
+    except Exception as e:
+        status = getattr(getattr(e, 'response', None), 'status_code', None)
+        print(f"Failed to retrieve billable metrics. Status code: {status or e}")
+        return
 
-headers = {
-    "Authorization": f"Bearer {api_key}",
-    "Content-Type": "application/json"
-}
-
-response = requests.get(api_url, headers=headers)
-
-if response.status_code == 200:
-    print(response.json())
+    print(response)
     with open('current_billable_metrics.csv', 'w', newline='') as csvfile:
         fieldnames = ['id', 'name', 'custom_fields', 'group_keys', 'event_type_filter', 'property_filters', 'aggregation_type', 'aggregation_key']
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
         writer.writeheader()
-        for metric in response.json()['data']:
+        for metric in response['data']:
             writer.writerow(metric)
-else:
-    print(f"Failed to retrieve billable metrics. Status code: {response.status_code}")
\ No newline at end of file
+
+if __name__ == "__main__":
+    run_script(main)
@@ -1,61 +1,31 @@
-import requests
-import pandas as pd
-import json
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from metronome_billing.core.metronome_api import MetronomeAPI
+from metronome_billing.core.rate_schedule import DEFAULT_RATE_CARD_ID, default_rate_schedule
+from metronome_billing.utils.profiling import run_script
 
-def get_rate_card_rates(api_key, rate_card_id):
+
+def get_rate_card_rates(api_key, rate_card_id, schedule=None):
     """
-    Fetch rates for a rate card and return them as a pandas DataFrame
+    Fetch rates for a rate card and return them as a pandas DataFrame.
+
+    Rates are served from the local rate schedule; Metronome is only asked
+    for ``getRates`` when the stored schedule no longer covers the current time.
     """
-    url = "https://api.metronome.com/v1/contract-pricing/rate-cards/getRates"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
-    # Get current timestamp to fetch current rates
-    from datetime import datetime, timezone
-    current_time = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
-    
-    payload = {
-        "rate_card_id": rate_card_id,
-        "at": current_time
-    }
-    
-    response = requests.post(url, headers=headers, json=payload)
-    response.raise_for_status()
-    
-    data = response.json()
-    
-    # Convert the rates data to a DataFrame
-    rates = []
-    for rate in data.get("data", []):
-        rate_info = {
-            "product_id": rate.get("product", {}).get("id"),
-            "product_name": rate.get("product", {}).get("name"),
-            "rate_type": rate.get("rate_type"),
-            "entitled": rate.get("entitled", False)
-        }
-        
-        # Add pricing details based on rate type
-        if rate.get("rate_type") == "FLAT":
-            rate_info["price"] = rate.get("price")
-        elif rate.get("rate_type") == "TIERED":
-            for idx, tier in enumerate(rate.get("tiers", [])):
-                rate_info[f"tier_{idx+1}_start"] = tier.get("start_quantity")
-                rate_info[f"tier_{idx+1}_price"] = tier.get("unit_price")
-        
-        # Add pricing group values if present
-        if rate.get("pricing_group_values"):
-            rate_info.update(rate.get("pricing_group_values"))
-            
-        rates.append(rate_info)
-    
-    return pd.DataFrame(rates)
+    import pandas as pd
 
-if __name__ == "__main__":
-    # API key and rate card ID
-    API_KEY = "e940e56fd5d98819bd3870adee8f163fa0e3c6429e9bb19290e65d9888b492df"
-    RATE_CARD_ID = "ee186f96-3e72-4f7c-a326-a88a28e4b7da"
+    if schedule is None:
+        # The same store bills and usage costs are priced from
+        schedule = default_rate_schedule()
+    if not schedule.is_fresh(rate_card_id):
+        schedule.refresh(MetronomeAPI(api_key=api_key), rate_card_id)
+    return pd.DataFrame(schedule.to_rows(rate_card_id))
+
+def main():
+    # The API key comes from METRONOME_API_KEY or the config ini
+    API_KEY = None
+    RATE_CARD_ID = DEFAULT_RATE_CARD_ID
     
     try:
         # Get rates and save to CSV
@@ -70,4 +40,7 @@ if __name__ == "__main__":
         print(f"Error: {str(e)}")
         if hasattr(e, 'response'):
             print(f"Response status code: {e.response.status_code}")
-            print(f"Response text: {e.response.text}")
\ No newline at end of file
+            print(f"Response text: {e.response.text}")
+
+if __name__ == "__main__":
+    run_script(main)
@@ -5,132 +5,170 @@ sys.path.append(str(Path(__file__).parent.parent))
 
 from website import db
 from website.models import Customer, Contract
+from website.sync import DeltaTracker
 from metronome_billing.core.metronome_api import MetronomeAPI
+from metronome_billing.utils.concurrency import bounded_map
+from metronome_billing.utils.profiling import run_script
 from datetime import datetime, timezone
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def import_contracts():
-    """Import all contracts from Metronome API for each customer"""
+# Concurrent Metronome calls: contract lists per customer, then rate card and product names
+CONTRACT_FETCH_WORKERS = 8
+
+def fetch_names(api, path, ids, names, errors, default):
+    """Look up the ``initial.name`` of every ID not seen yet this run, concurrently.
+
+    Found names are memoized in ``names``; failed lookups go to ``errors``
+    so the contracts that need them are counted as failed.
+    """
+    def fetch(item_id):
+        response = api._make_request("POST", path, json={"id": item_id})
+        if isinstance(response, dict) and 'data' in response:
+            return response['data'].get('initial', {}).get('name', default)
+        return default
+
+    missing = {item_id for item_id in ids if item_id and item_id not in names and item_id not in errors}
+    for item_id, name, error in bounded_map(fetch, missing, workers=CONTRACT_FETCH_WORKERS):
+        if error:
+            errors[item_id] = error
+        else:
+            names[item_id] = name
+
+def import_contracts(progress=None, api_key=None):
+    """Import all contracts from Metronome API for each customer
+
+    ``progress(fraction, message)`` is called after each customer when given.
+    ``api_key`` defaults to ``METRONOME_API_KEY`` or the config ini.
+    """
     try:
-        # Initialize API
-        api = MetronomeAPI()
-        
+        # Sync reads must not come from the response cache. Contract lists and name lookups run at once,
+        # so the pool has room for both
+        api = MetronomeAPI(api_key=api_key, fresh=True, pool_size=2 * CONTRACT_FETCH_WORKERS)
+
         # Get all customers from database
-        customers = Customer.query.all()
-        logger.info(f"Found {len(customers)} customers in database")
+        customer_ids = [metronome_id for (metronome_id,) in db.session.query(Customer.metronome_id) if metronome_id]
+        logger.info(f"Found {len(customer_ids)} customers in database")
         
         updated_count = 0
         created_count = 0
-        
-        for customer in customers:
-            if not customer.metronome_id:
+
+        # Contracts whose payload is unchanged are skipped before any rate card or product lookups
+        stored_hashes = dict(db.session.query(Contract.id, Contract.content_hash))
+        tracker = DeltaTracker('contract', stored_hashes)
+        # Rate card and product names by ID, each looked up once per run
+        rate_card_names, product_names, lookup_errors = {}, {}, {}
+
+        def list_contracts(customer_id):
+            logger.info(f"Fetching contracts for customer {customer_id}")
+            return api._make_request("POST", "/contracts/list", json={"customer_id": customer_id})
+
+        results = bounded_map(list_contracts, customer_ids, workers=CONTRACT_FETCH_WORKERS)
+        for index, (customer_id, response, error) in enumerate(results):
+            if progress:
+                progress(index / len(customer_ids), f"Contracts for customer {index + 1}/{len(customer_ids)}")
+            if error:
+                logger.error(f"Error fetching contracts for customer {customer_id}: {str(error)}")
+                # Its contracts were not seen, so any of them may be older than the new mark yet changed
+                tracker.failed()
                 continue
-                
-            try:
-                logger.info(f"Fetching contracts for customer {customer.metronome_id}")
-                response = api._make_request("POST", "/contracts/list", json={
-                    "customer_id": customer.metronome_id
-                })
-                
-                if isinstance(response, dict) and 'data' in response:
-                    contracts_data = response['data']
-                    if not isinstance(contracts_data, list):
-                        contracts_data = [contracts_data]
-                    
-                    for contract_data in contracts_data:
-                        try:
-                            contract_id = contract_data.get('id')
-                            if not contract_id:
-                                continue
-
-                            # Get initial contract data
-                            initial = contract_data.get('initial', {})
-                            
-                            # Parse dates
-                            starting_at = None
-                            ending_before = None
-                            try:
-                                if initial.get('starting_at'):
-                                    starting_at = datetime.fromisoformat(initial['starting_at'].replace('Z', '+00:00'))
-                                if initial.get('ending_before'):
-                                    ending_before = datetime.fromisoformat(initial['ending_before'].replace('Z', '+00:00'))
-                            except ValueError as e:
-                                logger.error(f"Error parsing dates for contract {contract_id}: {str(e)}")
-
-                            # Get rate card details
-                            rate_card_id = initial.get('rate_card_id')
-                            rate_card_name = 'Unknown Rate Card'
-                            if rate_card_id:
-                                rate_card_response = api._make_request("POST", "/contract-pricing/rate-cards/get", json={
-                                    "id": rate_card_id
-                                })
-                                if isinstance(rate_card_response, dict) and 'data' in rate_card_response:
-                                    rate_card_data = rate_card_response['data']
-                                    rate_card_initial = rate_card_data.get('initial', {})
-                                    rate_card_name = rate_card_initial.get('name', 'Unknown Rate Card')
-
-                            # Get product details
-                            product_id = initial.get('product_id')
-                            product_name = 'Unknown Product'
-                            if product_id:
-                                product_response = api._make_request("POST", "/contract-pricing/products/get", json={
-                                    "id": product_id
-                                })
-                                if isinstance(product_response, dict) and 'data' in product_response:
-                                    product_data = product_response['data']
-                                    product_initial = product_data.get('initial', {})
-                                    product_name = product_initial.get('name', 'Unknown Product')
-
-                            # Find or create contract
-                            contract = Contract.query.filter_by(id=contract_id).first()
-                            if contract:
-                                contract.name = initial.get('name') if initial else contract_data.get('name', 'Unnamed Contract')
-                                contract.product_name = product_name
-                                contract.rate_card_name = rate_card_name
-                                contract.status = contract_data.get('status', 'active')
-                                contract.starting_at = starting_at
-                                contract.ending_before = ending_before
-                                contract.last_synced = datetime.now(timezone.utc)
-                                updated_count += 1
-                                logger.info(f"Updated contract {contract_id}")
-                            else:
-                                contract = Contract(
-                                    id=contract_id,
-                                    customer_id=customer.metronome_id,
-                                    name=initial.get('name') if initial else contract_data.get('name', 'Unnamed Contract'),
-                                    product_name=product_name,
-                                    rate_card_name=rate_card_name,
-                                    status=contract_data.get('status', 'active'),
-                                    starting_at=starting_at,
-                                    ending_before=ending_before,
-                                    created_at=datetime.now(timezone.utc),
-                                    last_synced=datetime.now(timezone.utc)
-                                )
-                                db.session.add(contract)
-                                created_count += 1
-                                logger.info(f"Created contract {contract_id}")
-
-                            # Commit every 100 contracts to avoid memory issues
-                            if (updated_count + created_count) % 100 == 0:
-                                db.session.commit()
-                                logger.info(f"Committed batch of 100 contracts (Updated: {updated_count}, Created: {created_count})")
-
-                        except Exception as e:
-                            logger.error(f"Error processing contract {contract_data.get('id')}: {str(e)}")
-                            continue
-                else:
-                    logger.warning(f"No contracts data found for customer {customer.metronome_id}")
-            except Exception as e:
-                logger.error(f"Error fetching contracts for customer {customer.metronome_id}: {str(e)}")
+            if not (isinstance(response, dict) and 'data' in response):
+                logger.warning(f"No contracts data found for customer {customer_id}")
                 continue
 
+            contracts_data = response['data']
+            if not isinstance(contracts_data, list):
+                contracts_data = [contracts_data]
+            changed = []
+            for contract_data in contracts_data:
+                contract_id = contract_data.get('id')
+                if not contract_id:
+                    continue
+                digest = tracker.changed(contract_id, contract_data)
+                if digest is not None:
+                    changed.append((contract_data, digest))
+
+            fetch_names(api, "/contract-pricing/rate-cards/get",
+                        [(c.get('initial') or {}).get('rate_card_id') for c, _ in changed],
+                        rate_card_names, lookup_errors, 'Unknown Rate Card')
+            fetch_names(api, "/contract-pricing/products/get",
+                        [(c.get('initial') or {}).get('product_id') for c, _ in changed],
+                        product_names, lookup_errors, 'Unknown Product')
+
+            for contract_data, digest in changed:
+                contract_id = contract_data['id']
+                try:
+                    # Get initial contract data
+                    initial = contract_data.get('initial', {})
+
+                    # Parse dates
+                    starting_at = None
+                    ending_before = None
+                    try:
+                        if initial.get('starting_at'):
+                            starting_at = datetime.fromisoformat(initial['starting_at'].replace('Z', '+00:00'))
+                        if initial.get('ending_before'):
+                            ending_before = datetime.fromisoformat(initial['ending_before'].replace('Z', '+00:00'))
+                    except ValueError as e:
+                        logger.error(f"Error parsing dates for contract {contract_id}: {str(e)}")
+
+                    rate_card_id = initial.get('rate_card_id')
+                    product_id = initial.get('product_id')
+                    for lookup_id in (rate_card_id, product_id):
+                        if lookup_id in lookup_errors:
+                            raise lookup_errors[lookup_id]
+                    rate_card_name = rate_card_names.get(rate_card_id, 'Unknown Rate Card')
+                    product_name = product_names.get(product_id, 'Unknown Product')
+
+                    # Find or create contract
+                    contract = db.session.get(Contract, contract_id) if contract_id in stored_hashes else None
+                    if contract:
+                        contract.name = initial.get('name') if initial else contract_data.get('name', 'Unnamed Contract')
+                        contract.product_name = product_name
+                        contract.rate_card_name = rate_card_name
+                        contract.status = contract_data.get('status', 'active')
+                        contract.starting_at = starting_at
+                        contract.ending_before = ending_before
+                        contract.last_synced = datetime.now(timezone.utc)
+                        contract.content_hash = digest
+                        updated_count += 1
+                        logger.info(f"Updated contract {contract_id}")
+                    else:
+                        contract = Contract(
+                            id=contract_id,
+                            customer_id=customer_id,
+                            name=initial.get('name') if initial else contract_data.get('name', 'Unnamed Contract'),
+                            product_name=product_name,
+                            rate_card_name=rate_card_name,
+                            status=contract_data.get('status', 'active'),
+                            starting_at=starting_at,
+                            ending_before=ending_before,
+                            created_at=datetime.now(timezone.utc),
+                            last_synced=datetime.now(timezone.utc),
+                            content_hash=digest
+                        )
+                        db.session.add(contract)
+                        created_count += 1
+                        logger.info(f"Created contract {contract_id}")
+
+                    # Commit every 100 contracts to avoid memory issues
+                    if (updated_count + created_count) % 100 == 0:
+                        db.session.commit()
+                        logger.info(f"Committed batch of 100 contracts (Updated: {updated_count}, Created: {created_count})")
+
+                except Exception as e:
+                    logger.error(f"Error processing contract {contract_id}: {str(e)}")
+                    tracker.failed()
+                    continue
+
         # Final commit for remaining contracts
         db.session.commit()
-        logger.info(f"Successfully imported contracts. Updated {updated_count} and created {created_count} contracts.")
-        return True, f"Successfully imported contracts. Updated {updated_count} and created {created_count} contracts."
+        tracker.save()
+        message = (f"Successfully imported contracts. Updated {updated_count} and created {created_count} contracts"
+                   f" ({tracker.unchanged_count} unchanged).")
+        logger.info(message)
+        return True, message
 
     except Exception as e:
         error_msg = f"Error importing contracts: {str(e)}"
@@ -138,7 +176,13 @@ def import_contracts():
         logger.exception("Full traceback:")
         return False, error_msg
 
-if __name__ == '__main__':
-    success, message = import_contracts()
+def main():
+    from website.app import create_app
+
+    with create_app().app_context():
+        success, message = import_contracts()
     if not success:
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+
+if __name__ == '__main__':
+    run_script(main)
\ No newline at end of file
@@ -0,0 +1,195 @@
+"""Read-only JSON API under ``/api/v1``.
+
+List endpoints page by keyset on the table's primary key with an opaque
+``cursor``, accept ``fields=a,b`` to select columns and simple equality
+filters, and answer ``If-None-Match`` with 304. Rows are read as Core tuples
+and encoded directly, without building ORM objects.
+"""
+import base64
+import hashlib
+import json
+from datetime import date, datetime
+from flask import Blueprint, Response, request
+from website import db
+from website.models import Contract, Customer, Product
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder produces the same output, just slower
+    orjson = None
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+class Resource:
+    """How one table is exposed: public fields, lookup key, keyset column and filters."""
+
+    def __init__(self, name, key, lookup, fields, filters=()):
+        self.name = name
+        self.key = key          # column ordering the pages; must be unique
+        self.lookup = lookup    # column matched by /<name>/<id>
+        self.fields = fields    # public name -> column
+        self.filters = filters  # public names usable as ?name=value
+
+
+RESOURCES = {
+    'customers': Resource(
+        'customers', key=Customer.id, lookup=Customer.metronome_id,
+        fields={
+            'id': Customer.metronome_id,
+            'name': Customer.name,
+            'salesforce_id': Customer.salesforce_id,
+            'rate_card_id': Customer.rate_card_id,
+            'stripe_id': Customer.stripe_id,
+            'status': Customer.status,
+            'created_at': Customer.created_at,
+            'last_synced': Customer.last_synced,
+        },
+        filters=('status', 'rate_card_id', 'salesforce_id', 'stripe_id'),
+    ),
+    'contracts': Resource(
+        'contracts', key=Contract.id, lookup=Contract.id,
+        fields={
+            'id': Contract.id,
+            'customer_id': Contract.customer_id,
+            'name': Contract.name,
+            'product_name': Contract.product_name,
+            'rate_card_name': Contract.rate_card_name,
+            'status': Contract.status,
+            'starting_at': Contract.starting_at,
+            'ending_before': Contract.ending_before,
+            'created_at': Contract.created_at,
+            'last_synced': Contract.last_synced,
+        },
+        filters=('customer_id', 'status'),
+    ),
+    'products': Resource(
+        'products', key=Product.id, lookup=Product.product_id,
+        fields={
+            'id': Product.product_id,
+            'name': Product.name,
+            'description': Product.description,
+            'archived': Product.archived,
+            'credit_types': Product.credit_types,
+            'created_at': Product.created_at,
+            'last_synced': Product.last_synced,
+        },
+        filters=('archived',),
+    ),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def dumps(payload):
+    if orjson:
+        return orjson.dumps(payload, default=_default)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode()
+
+
+def json_response(payload, status=200):
+    """Encode ``payload`` and answer a matching ``If-None-Match`` with 304."""
+    body = dumps(payload)
+    response = Response(body, status=status, mimetype='application/json')
+    if status == 200:
+        response.set_etag(hashlib.sha1(body).hexdigest())
+        response.headers['Cache-Control'] = 'no-cache'
+        response.make_conditional(request)
+    return response
+
+
+@api.errorhandler(ApiError)
+def handle_api_error(error):
+    return json_response({'error': str(error)}, status=error.status)
+
+
+def encode_cursor(value):
+    return base64.urlsafe_b64encode(dumps([value])).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor):
+    """The key value ``encode_cursor`` wrapped: a string or an integer, else ``ApiError``."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        wrapped = json.loads(base64.urlsafe_b64decode(padded))
+        value, = wrapped if isinstance(wrapped, list) else ()
+    except (ValueError, TypeError, IndexError, KeyError):
+        raise ApiError("Invalid cursor") from None
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        raise ApiError("Invalid cursor")
+    return value
+
+
+def selected_fields(resource):
+    """Public field names requested with ``?fields=``, or all of them."""
+    requested = request.args.get('fields', '').strip()
+    if not requested:
+        return list(resource.fields)
+    names = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in names if name not in resource.fields]
+    if unknown:
+        raise ApiError(f"Unknown fields for {resource.name}: {', '.join(unknown)}")
+    return names
+
+
+def filter_value(column, value):
+    # Booleans arrive as text in the query string
+    if isinstance(column.type, db.Boolean):
+        return value.lower() in ('1', 'true', 'yes')
+    return value
+
+
+def get_resource(name):
+    resource = RESOURCES.get(name)
+    if resource is None:
+        raise ApiError(f"Unknown resource: {name}", status=404)
+    return resource
+
+
+@api.route('/<name>')
+def list_resource(name):
+    resource = get_resource(name)
+    fields = selected_fields(resource)
+    limit = min(max(request.args.get('limit', DEFAULT_LIMIT, type=int), 1), MAX_LIMIT)
+
+    # The keyset column is always selected last, after the requested fields
+    stmt = db.select(*(resource.fields[field] for field in fields), resource.key)
+    for field in resource.filters:
+        if field in request.args:
+            column = resource.fields[field]
+            stmt = stmt.where(column == filter_value(column, request.args[field]))
+    cursor = request.args.get('cursor')
+    if cursor:
+        stmt = stmt.where(resource.key > decode_cursor(cursor))
+    rows = db.session.execute(stmt.order_by(resource.key).limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][-1])
+    data = [dict(zip(fields, row)) for row in rows]
+    return json_response({'data': data, 'next_cursor': next_cursor})
+
+
+@api.route('/<name>/<item_id>')
+def get_item(name, item_id):
+    resource = get_resource(name)
+    fields = selected_fields(resource)
+    stmt = db.select(*(resource.fields[field] for field in fields)).where(resource.lookup == item_id)
+    row = db.session.execute(stmt).first()
+    if row is None:
+        raise ApiError(f"{resource.name} {item_id} not found", status=404)
+    return json_response({'data': dict(zip(fields, row))})
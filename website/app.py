@@ -1,52 +1,187 @@
 #!/usr/bin/env python3
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, Flask, current_app, render_template, request, redirect, url_for, flash, jsonify, make_response, session, Response, send_file, send_from_directory, stream_with_context
+from werkzeug.http import is_resource_modified
 from pathlib import Path
 import sys
 import uuid
-import stripe
-import requests
 from datetime import datetime, timezone, timedelta
 import json
 import logging
 import os
-import numpy as np
 import time
-from website.models import db, LogEntry, Customer, Product, Contract
+from website.models import db, LogEntry, Customer, Product, Contract, Job, SpendProjection
+from website.jobs import ACTIVE_STATUSES, JobQueue, job_handler, job_to_dict
+from website.upsert import bulk_upsert
+from website.sync import DeltaTracker, upsert_customers
+from website.database import configure_sqlite
+from website.migrations import run_migrations
+from website.api import api
+from website.search import customer_search_condition
+from website.streaming import csv_chunks, download, ndjson_chunks, stream_rows
 
 sys.path.append(str(Path(__file__).parent.parent))
-from metronome_billing.core.metronome_api import MetronomeAPI
+from metronome_billing.core.metronome_api import MetronomeAPI, in_flight_reads, read_key
+from metronome_billing.core.response_cache import default_response_cache
+from metronome_billing.core.rate_card_catalog import RateCardCatalog
+from metronome_billing.core.rate_schedule import DEFAULT_RATE_CARD_ID, default_rate_schedule
+from metronome_billing.core.anomaly import AnomalyDetector, describe
+from website.reconcile import RECONCILE_DIR, last_summary, reconcile_customers
+from website.usage_rollup import KINDS, customer_series, drain_spool, top_customers
+from metronome_billing.utils.spool import Spool
+from metronome_billing.utils.metrics import (DB_COMMITS, HTTP_REQUESTS, METRONOME_COALESCED, METRONOME_REQUESTS, REGISTRY,
+                                             current_job, endpoint_template)
+from metronome_billing.utils.profiling import Profile, list_profiles, phase, profile_dir, record_phase
+from metronome_billing.utils.tracing import client_span, span, start_span, start_trace, traced, tracing_enabled
 
-app = Flask(__name__)
-app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'dev')
+# Heavy dependencies (stripe, requests, numpy) are imported inside the views that
+# use them, so importing this module and creating the app stay fast.
 
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///metronome.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+bp = Blueprint('main', __name__)
+
+def create_app(config=None, serve=False):
+    """Create the web application.
+
+    Importing this module does no I/O; the database connection, schema
+    migrations and job workers are set up here. ``serve=True`` is for the
+    process that serves the site: it also sends logs to the database and
+    marks jobs left active by a previous server as failed. The CLI and
+    scripts use the app for its database only, so they leave the running
+    server's jobs and their own logging alone.
+    """
+    app = Flask(__name__)
+    app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'dev')
+
+    # Database configuration
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///metronome.db'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Off by default, as any visitor could otherwise profile requests and fill the disk with profiles.
+    # With METRONOME_REQUEST_PROFILING=1, requests sent with ?profile=1 or "X-Profile: 1" are profiled.
+    app.config['REQUEST_PROFILING'] = os.getenv('METRONOME_REQUEST_PROFILING', '0') == '1'
+    app.config.update(config or {})
+    db.init_app(app)
 
-def init_db():
-    """Initialize the database and handle migrations"""
     with app.app_context():
-        # Check if we need to recreate tables
-        try:
-            # Try to query the new columns
-            Customer.query.order_by(Customer.last_synced).first()
-            Product.query.order_by(Product.last_synced).first()
-            Contract.query.order_by(Contract.last_synced).first()
-        except Exception as e:
-            logging.info("Detected schema change, recreating database tables")
-            # Drop all tables
-            db.drop_all()
-            # Create all tables with new schema
-            db.create_all()
-            logging.info("Database tables recreated successfully")
+        configure_sqlite(db.engine)
+        # Bring the schema up to date; a single version check when it already is
+        run_migrations()
+
+    if serve:
+        configure_logging()
+    app.register_blueprint(bp)
+    app.register_blueprint(api)
+
+    # Admin refreshes run on background workers; the routes only enqueue them
+    jobs = JobQueue(app)
+    if serve:
+        with app.app_context():
+            jobs.recover()
+    app.extensions['jobs'] = jobs
+    # One detector per process watches everything sent from the usage page; anomalies go to the logs
+    app.extensions['anomalies'] = AnomalyDetector(on_anomaly=lambda anomaly: logging.warning(describe(anomaly)))
+    instrument_app(app)
+    if app.config['REQUEST_PROFILING']:
+        profile_requests(app)
+    if tracing_enabled():
+        trace_requests(app)
+    return app
+
+def instrument_app(app):
+    """Time every request by route and every database commit, for ``/metrics``."""
+    from sqlalchemy import event
+
+    @app.before_request
+    def start_request_timer():
+        request.environ['metrics.start'] = time.perf_counter()
+        request.environ['metrics.labels'] = (request.method, request.url_rule.rule if request.url_rule else 'unmatched')
+        HTTP_REQUESTS.in_flight.inc(*request.environ['metrics.labels'])
+
+    @app.after_request
+    def record_status(response):
+        request.environ['metrics.status'] = response.status_code
+        return response
+
+    @app.teardown_request
+    def record_request(error):
+        labels = request.environ.pop('metrics.labels', None)
+        if labels is None:
+            return
+        HTTP_REQUESTS.in_flight.dec(*labels)
+        # Unhandled errors never reach after_request
+        status = request.environ.get('metrics.status', 500)
+        HTTP_REQUESTS.record(time.perf_counter() - request.environ['metrics.start'], labels, status)
+
+    # Streamed responses commit after their request has finished, so commits are timed on their own.
+    # db.session is shared by every app, so the listeners go on once
+    if not event.contains(db.session, 'before_commit', start_commit_timer):
+        event.listen(db.session, 'before_commit', start_commit_timer)
+        event.listen(db.session, 'after_commit', record_commit)
+        event.listen(db.session, 'after_rollback', record_rollback)
+
+def profile_requests(app):
+    """Profile single requests on demand; the profile's ID is returned in ``X-Profile-Id``."""
+    @app.before_request
+    def start_profile():
+        if request.args.get('profile') == '1' or request.headers.get('X-Profile') == '1':
+            route = request.url_rule.rule if request.url_rule else request.path
+            request.environ['profile'] = Profile(f"{request.method} {route}", threads='current').__enter__()
+
+    @app.after_request
+    def add_profile_id(response):
+        profile = request.environ.get('profile')
+        if profile is not None and profile.active:
+            response.headers['X-Profile-Id'] = profile.id
+        return response
+
+    @app.teardown_request
+    def finish_profile(error):
+        profile = request.environ.pop('profile', None)
+        if profile is not None:
+            profile.__exit__(None, None, None)
 
-# Initialize database
-init_db()
+def trace_requests(app):
+    """Start a trace for every page and API request (not ``/metrics`` scrapes or static files)."""
+    @app.before_request
+    def start_request_trace():
+        if request.endpoint in ('static', 'main.metrics'):
+            return
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request.environ['trace.span'] = start_trace(f"{request.method} {route}", {
+            'http.request.method': request.method, 'http.route': route, 'url.path': request.path,
+        }, kind='server')
 
-# Create database tables
-with app.app_context():
-    db.create_all()
+    @app.after_request
+    def record_trace_status(response):
+        current = request.environ.get('trace.span')
+        if current is not None:
+            current.set_attribute('http.response.status_code', response.status_code)
+        return response
+
+    @app.teardown_request
+    def end_request_trace(error):
+        current = request.environ.pop('trace.span', None)
+        if current is not None:
+            if error is not None:
+                current.record_error(error)
+            current.end()
+
+# Start times and trace spans of commits in progress, by session; each thread has its own session
+commit_starts = {}
+
+def start_commit_timer(session):
+    commit_starts[id(session)] = (time.perf_counter(), time.thread_time(), start_span('db.commit'))
+
+def record_commit(session, status='ok'):
+    start = commit_starts.pop(id(session), None)
+    if start is not None:
+        wall = time.perf_counter() - start[0]
+        DB_COMMITS.record(wall, (current_job.get(),), status, status != 'ok')
+        record_phase('commit', wall, time.thread_time() - start[1])
+        if status != 'ok':
+            start[2].record_error(status)
+        start[2].end()
+
+def record_rollback(session):
+    record_commit(session, 'rollback')
 
 # Configure logging
 class DatabaseHandler(logging.Handler):
@@ -64,27 +199,73 @@ class DatabaseHandler(logging.Handler):
             # Print to console if database logging fails
             print(f"[{record.levelname}] {self.format(record)}")
 
-# Remove existing handlers
-root_logger = logging.getLogger()
-for handler in root_logger.handlers[:]:
-    root_logger.removeHandler(handler)
+def configure_logging():
+    # Remove existing handlers
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
 
-# Configure root logger
-formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
-db_handler = DatabaseHandler()
-db_handler.setFormatter(formatter)
+    # Configure root logger
+    formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
+    db_handler = DatabaseHandler()
+    db_handler.setFormatter(formatter)
 
-# Also add a stream handler for console output
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(formatter)
+    # Also add a stream handler for console output
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
 
-root_logger.addHandler(db_handler)
-root_logger.addHandler(console_handler)
-root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(db_handler)
+    root_logger.addHandler(console_handler)
+    root_logger.setLevel(logging.INFO)
 
 # Load API keys from environment or use defaults
 metronome_api_key = os.getenv('METRONOME_API_KEY', "48b0453c99607fb5dfb4dc717ab2d9a2b6cc0dabec7885228871bc8c42748ccf")
-stripe.api_key = os.getenv('STRIPE_API_KEY', "sk_test_51QaIZkIXaJVb8AWbz26erRPAJeaBQ90Nef7RFZzz3zDEtLxO0rROaLkvXsb7eyL9v4X2eL6L8l2HWMX459Q2KNbk003E64rxiX")
+# Same override as MetronomeAPI, so every call can be pointed at a local stand-in
+metronome_base_url = (os.getenv('METRONOME_BASE_URL') or MetronomeAPI.BASE_URL).rstrip('/')
+stripe_api_key = os.getenv('STRIPE_API_KEY', "sk_test_51QaIZkIXaJVb8AWbz26erRPAJeaBQ90Nef7RFZzz3zDEtLxO0rROaLkvXsb7eyL9v4X2eL6L8l2HWMX459Q2KNbk003E64rxiX")
+
+def get_stripe():
+    """Import the Stripe SDK on first use and apply the configured key."""
+    import stripe
+    from metronome_billing.utils.metrics import instrument_stripe
+    stripe.api_key = stripe_api_key
+    instrument_stripe(stripe)
+    return stripe
+
+def metronome_http(method, url, headers=None, **kwargs):
+    """A direct ``requests`` call to Metronome, timed, traced and coalesced like the calls ``MetronomeAPI`` makes.
+
+    Callers sharing a coalesced read get the same response object, so they must only read it.
+    """
+    endpoint = endpoint_template(url[len(metronome_base_url):] if url.startswith(metronome_base_url) else url)
+    key = None
+    if set(kwargs) <= {'params', 'json'}:
+        key = read_key(method, url, (headers or {}).get('Authorization', ''), kwargs.get('params'), kwargs.get('json'))
+    with phase('fetch'), client_span('metronome', method, endpoint) as traced:
+        if key is None:
+            response = _send_metronome(method, url, endpoint, headers, kwargs)
+            # Reads cached by MetronomeAPI clients (in this or another process) no longer hold
+            cache = default_response_cache()
+            if cache is not None and response.ok:
+                cache.invalidate(endpoint)
+        else:
+            response, shared = in_flight_reads.do(key, _send_metronome, method, url, endpoint, headers, kwargs)
+            if shared:
+                METRONOME_COALESCED.inc(method, endpoint)
+                traced.set_attribute('metronome.coalesced', True)
+        traced.set_attribute('http.response.status_code', response.status_code)
+    return response
+
+def _send_metronome(method, url, endpoint, headers, kwargs):
+    import requests
+    with METRONOME_REQUESTS.track(method, endpoint, current_job.get()) as call:
+        response = requests.request(method, url, headers=headers, **kwargs)
+        call.status = response.status_code
+    return response
+
+# Rate cards change rarely, so pages read them from memory and revalidate in the background;
+# revalidation must see Metronome itself, not the shared response cache
+rate_card_catalog = RateCardCatalog(lambda: MetronomeAPI(api_key=metronome_api_key, fresh=True))
 
 # Industry list
 INDUSTRIES = [
@@ -115,21 +296,43 @@ def create_contract(api, customer_id, rate_card_id):
         "rate_card_id": rate_card_id,
         "starting_at": formatted_date
     }
-    url = f"{api.BASE_URL}/contracts"
+    url = f"{api.BASE_URL}/contracts/create"
     response = api.session.post(url, json=payload)
     if response.status_code not in [200, 201]:
         raise Exception(f"Failed to create contract. Status code: {response.status_code}. Response: {response.text}")
     return response.json()
 
-@app.route('/')
+def rate_card_page(template, **context):
+    """Render a page built from the rate card catalog, answering conditional GETs with 304s."""
+    # Flashed messages are part of the page, so those renders must not be cached
+    if request.method != 'GET' or session.get('_flashes') or not rate_card_catalog.etag:
+        return render_template(template, **context)
+
+    etag, last_modified = rate_card_catalog.etag, rate_card_catalog.last_modified
+    response = make_response()
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response.status_code = 304
+        return response
+    response.set_data(render_template(template, **context))
+    return response
+
+@bp.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/create', methods=['GET', 'POST'])
+@bp.route('/create', methods=['GET', 'POST'])
 def create_customer():
     response_data = {}
+    rate_cards = []
     try:
+        with span('rate_cards.load'):
+            rate_cards = rate_card_catalog.get()
         if request.method == 'POST':
+            stripe = get_stripe()
+
             # Get form data
             name = request.form.get('name')
             rate_card_id = request.form.get('rate_card_id')
@@ -143,12 +346,13 @@ def create_customer():
             
             # Create customer in Stripe first
             try:
-                stripe_customer = stripe.Customer.create(
-                    name=name,
-                    metadata={
-                        'salesforce_id': salesforce_id
-                    }
-                )
+                with span('stripe.customer.create'):
+                    stripe_customer = stripe.Customer.create(
+                        name=name,
+                        metadata={
+                            'salesforce_id': salesforce_id
+                        }
+                    )
                 response_data['stripe'] = {
                     'success': True,
                     'customer_id': stripe_customer.id,
@@ -161,7 +365,7 @@ def create_customer():
                     'error': str(e)
                 }
                 flash(f"Failed to create Stripe customer: {str(e)}", "danger")
-                return render_template('create.html', rate_cards=[], response_data=response_data)
+                return render_template('create.html', rate_cards=rate_cards, response_data=response_data)
             
             # Prepare request data for Metronome
             json_data = {
@@ -179,14 +383,15 @@ def create_customer():
             response_data['metronome_request'] = json_data
             
             # Create customer in Metronome
-            url = "https://api.metronome.com/v1/customers"
+            url = f"{metronome_base_url}/customers"
             headers = {
                 "Authorization": f"Bearer {metronome_api_key}",
                 "Content-Type": "application/json"
             }
             
             logging.info(f"Creating Metronome customer with data: {json_data}")
-            response = requests.post(url, headers=headers, json=json_data)
+            with span('metronome.customer.create'):
+                response = metronome_http('POST', url, headers=headers, json=json_data)
             logging.info(f"Metronome response status: {response.status_code}")
             logging.info(f"Metronome response: {response.text}")
             
@@ -210,8 +415,9 @@ def create_customer():
                     created_at=datetime.now(timezone.utc),
                     last_synced=datetime.now(timezone.utc)
                 )
-                db.session.add(customer)
-                db.session.commit()
+                with span('db.customer.insert'):
+                    db.session.add(customer)
+                    db.session.commit()
                 
                 response_data['database'] = {
                     'success': True,
@@ -230,12 +436,13 @@ def create_customer():
                         "delivery_method": "direct_to_billing_provider"
                     }]
                 }
-                link_url = "https://api.metronome.com/v1/setCustomerBillingProviderConfigurations"
-                link_response = requests.post(
-                    link_url,
-                    headers={"Authorization": f"Bearer {metronome_api_key}"},
-                    json=link_payload
-                )
+                link_url = f"{metronome_base_url}/setCustomerBillingProviderConfigurations"
+                with span('metronome.billing_provider.link'):
+                    link_response = metronome_http(
+                        'POST', link_url,
+                        headers={"Authorization": f"Bearer {metronome_api_key}"},
+                        json=link_payload
+                    )
                 if link_response.status_code != 200:
                     error_msg = f"Failed to link customer to Stripe: {link_response.text}"
                     logging.error(error_msg)
@@ -247,44 +454,30 @@ def create_customer():
                     current_date = datetime.now(timezone.utc)
                     formatted_date = current_date.strftime("%Y-%m-%dT00:00:00.000Z")
                     # Get rate card details to get product_id
-                    rate_card_url = "https://api.metronome.com/v1/rate-cards/list"
-                    rate_card_response = requests.post(
-                        rate_card_url,
-                        headers={"Authorization": f"Bearer {metronome_api_key}"},
-                        json={}
-                    )
-                    if rate_card_response.status_code == 200:
-                        rate_cards_data = rate_card_response.json()
-                        rate_card = next(
-                            (card for card in rate_cards_data.get('data', []) if card.get('id') == rate_card_id),
-                            None
-                        )
-                        if rate_card and rate_card.get('product_id'):
-                            contract_payload = {
-                                "customer_id": metronome_customer.get('id'),
-                                "rate_card_id": rate_card_id,
-                                "product_id": rate_card['product_id'],
-                                "starting_at": formatted_date,
-                                "status": "active"
-                            }
-                            logging.info(f"Creating contract with payload: {json.dumps(contract_payload, indent=2)}")
-                        else:
-                            error_msg = "Rate card does not have a product ID"
-                            logging.error(error_msg)
-                            flash(error_msg, "danger")
-                            return render_template('create.html', rate_cards=rate_cards, response_data=response_data)
+                    with span('rate_card.lookup', {'rate_card.id': rate_card_id}):
+                        rate_card = rate_card_catalog.find(rate_card_id)
+                    if rate_card and rate_card.get('product_id'):
+                        contract_payload = {
+                            "customer_id": metronome_customer.get('id'),
+                            "rate_card_id": rate_card_id,
+                            "product_id": rate_card['product_id'],
+                            "starting_at": formatted_date,
+                            "status": "active"
+                        }
+                        logging.info(f"Creating contract with payload: {contract_payload}")
                     else:
-                        error_msg = f"Failed to fetch rate card: {rate_card_response.text}"
+                        error_msg = "Rate card does not have a product ID"
                         logging.error(error_msg)
                         flash(error_msg, "danger")
                         return render_template('create.html', rate_cards=rate_cards, response_data=response_data)
-                    contract_url = "https://api.metronome.com/v1/contracts"
-                    contract_response = requests.post(
-                        contract_url,
-                        headers={"Authorization": f"Bearer {metronome_api_key}"},
-                        json=contract_payload
-                    )
-                    logging.info(f"Contract response: {json.dumps(contract_response.json() if contract_response.status_code in [200, 201] else {}, indent=2)}")
+                    contract_url = f"{metronome_base_url}/contracts/create"
+                    with span('metronome.contract.create'):
+                        contract_response = metronome_http(
+                            'POST', contract_url,
+                            headers={"Authorization": f"Bearer {metronome_api_key}"},
+                            json=contract_payload
+                        )
+                    logging.info(f"Contract response status: {contract_response.status_code}")
                     if contract_response.status_code not in [200, 201]:
                         error_msg = f"Failed to create contract: {contract_response.text}"
                         logging.error(error_msg)
@@ -295,7 +488,8 @@ def create_customer():
             else:
                 # If Metronome creation fails, delete the Stripe customer
                 try:
-                    stripe.Customer.delete(stripe_customer.id)
+                    with span('stripe.customer.delete'):
+                        stripe.Customer.delete(stripe_customer.id)
                     response_data['stripe_cleanup'] = {
                         'success': True,
                         'message': 'Stripe customer deleted due to Metronome failure'
@@ -310,31 +504,10 @@ def create_customer():
                 logging.error(error_msg)
                 flash(error_msg, "danger")
         
-        # Get rate cards for the form
-        api = MetronomeAPI(api_key=metronome_api_key)
-        print("Fetching rate cards...")
-        response_data = api._make_request("POST", "/contract-pricing/rate-cards/list", json={})
-        print(f"Rate cards response data: {json.dumps(response_data, indent=2)}")
-        logging.info(f"Rate cards response data: {json.dumps(response_data, indent=2)}")
-        
-        # Extract rate cards from response
-        if isinstance(response_data, dict):
-            if 'data' in response_data and isinstance(response_data['data'], list):
-                rate_cards = response_data['data']
-            else:
-                rate_cards = [response_data]
-        else:
-            rate_cards = response_data if isinstance(response_data, list) else []
-        
-        print(f"Found {len(rate_cards)} rate cards")
-        print(f"Rate cards: {json.dumps(rate_cards, indent=2)}")
-        logging.info(f"Found {len(rate_cards)} rate cards")
-        logging.info(f"Rate cards: {json.dumps(rate_cards, indent=2)}")
-        
         if not rate_cards:
             flash("No rate cards found. Please create a rate card first.", "warning")
         
-        return render_template('create.html', rate_cards=rate_cards, response_data=response_data)
+        return rate_card_page('create.html', rate_cards=rate_cards, response_data=response_data)
         
     except Exception as e:
         error_msg = f"Error creating customer: {str(e)}"
@@ -342,83 +515,131 @@ def create_customer():
         logging.exception("Full traceback:")
         flash(error_msg, "danger")
         response_data['error'] = str(e)
-        return render_template('create.html', rate_cards=[], response_data=response_data)
+        return render_template('create.html', rate_cards=rate_cards, response_data=response_data)
+
+# Fields refresh_products needs; the detail endpoint is only called when the list payload lacks them
+PRODUCT_DETAIL_FIELDS = ('initial', 'created_at')
+PRODUCT_FETCH_WORKERS = 8
 
-def refresh_products():
+@traced()
+def refresh_rates(progress=None):
+    """Refresh the stored schedule of the default rate card, which prices bills and usage costs"""
+    try:
+        schedule = default_rate_schedule()
+        changed = schedule.refresh(MetronomeAPI(api_key=metronome_api_key, fresh=True), DEFAULT_RATE_CARD_ID,
+                                   force=True)
+        message = f"Successfully refreshed rates. {changed} rates added, changed or ended ({len(schedule)} stored)."
+        logging.info(message)
+        return True, message
+    except Exception as e:
+        error_msg = f"Error refreshing rates: {str(e)}"
+        logging.error(error_msg)
+        return False, error_msg
+
+@traced()
+def refresh_products(progress=None):
     """Refresh products from Metronome API and store in database"""
     try:
-        api = MetronomeAPI(api_key=metronome_api_key)
+        api = MetronomeAPI(api_key=metronome_api_key, fresh=True)
         logging.info("Fetching products from Metronome API")
-        response_data = api._make_request("POST", "/contract-pricing/products/list", json={
-            "archive_filter": "NOT_ARCHIVED"
-        })
 
-        if isinstance(response_data, dict) and 'data' in response_data:
-            products_list = response_data['data']
-            updated_count = 0
-            created_count = 0
+        products_list = []
+        payload = {"archive_filter": "NOT_ARCHIVED"}
+        params = {}
+        while True:
+            # The page cursor goes in the query string; the body keeps the filter
+            response_data = api._make_request("POST", "/contract-pricing/products/list", params=params, json=payload)
+            if not isinstance(response_data, dict) or 'data' not in response_data:
+                error_msg = "Unexpected response format from Metronome API"
+                logging.error(error_msg)
+                return False, error_msg
+            products_list.extend(p for p in response_data['data'] if p.get('id'))
+            next_page = response_data.get('next_page')
+            if not next_page:
+                break
+            params = {"next_page": next_page}
+
+        # Skip products whose list entry is unchanged since the last sync
+        stored_hashes = dict(db.session.query(Product.product_id, Product.content_hash))
+        tracker = DeltaTracker('product', stored_hashes)
+        hashes = {}
+        for product in products_list:
+            digest = tracker.changed(product['id'], product)
+            if digest is not None:
+                hashes[product['id']] = digest
+        products_list = [p for p in products_list if p['id'] in hashes]
+
+        if progress:
+            progress(0.2, f"{len(products_list)} changed products")
 
-            for product in products_list:
-                product_id = product.get('id')
-                if not product_id:
-                    continue
+        # Only fetch details for products whose list entry is incomplete, in parallel
+        incomplete = [p for p in products_list if any(field not in p for field in PRODUCT_DETAIL_FIELDS)]
+        if incomplete:
+            logging.info(f"Fetching details for {len(incomplete)} of {len(products_list)} products")
 
-                # Get detailed product information
+            def fetch_details(product):
                 product_response = api._make_request("POST", "/contract-pricing/products/get", json={
-                    "id": product_id
+                    "id": product['id']
                 })
-
                 if isinstance(product_response, dict) and 'data' in product_response:
-                    product_data = product_response.get('data', {})
-                    initial = product_data.get('initial', {})
-                    
-                    # Parse created_at if present
-                    created_at = None
-                    if 'created_at' in product_data:
-                        try:
-                            created_at = datetime.fromisoformat(product_data['created_at'].replace('Z', '+00:00'))
-                        except (ValueError, AttributeError):
-                            pass
-
-                    # Find or create product
-                    db_product = Product.query.filter_by(product_id=product_id).first()
-                    if db_product:
-                        db_product.name = initial.get('name', 'Unnamed Product')
-                        db_product.description = initial.get('description', '')
-                        db_product.archived = product_data.get('archived_at') is not None
-                        db_product.created_at = created_at
-                        db_product.last_synced = datetime.now(timezone.utc)
-                        db_product.credit_types = product_data.get('credit_types', [])
-                        updated_count += 1
-                    else:
-                        db_product = Product(
-                            product_id=product_id,
-                            name=initial.get('name', 'Unnamed Product'),
-                            description=initial.get('description', ''),
-                            archived=product_data.get('archived_at') is not None,
-                            created_at=created_at,
-                            last_synced=datetime.now(timezone.utc),
-                            credit_types=product_data.get('credit_types', [])
-                        )
-                        db.session.add(db_product)
-                        created_count += 1
+                    return {**product, **product_response['data']}
+                return product
+
+            # bounded_map carries the trace and job label onto its workers
+            from metronome_billing.utils.concurrency import bounded_map
+            details = {}
+            for product, detail, error in bounded_map(fetch_details, incomplete, workers=PRODUCT_FETCH_WORKERS):
+                if error:
+                    raise error
+                details[product['id']] = detail
+            products_list = [details.get(p['id'], p) for p in products_list]
+
+        now = datetime.now(timezone.utc)
+        rows = []
+        for product_data in products_list:
+            initial = product_data.get('initial', {})
+
+            # Parse created_at if present
+            created_at = None
+            if 'created_at' in product_data:
+                try:
+                    created_at = datetime.fromisoformat(product_data['created_at'].replace('Z', '+00:00'))
+                except (ValueError, AttributeError):
+                    pass
 
+            rows.append({
+                'product_id': product_data['id'],
+                'name': initial.get('name', 'Unnamed Product'),
+                'description': initial.get('description', ''),
+                'archived': product_data.get('archived_at') is not None,
+                'created_at': created_at,
+                'last_synced': now,
+                'credit_types': product_data.get('credit_types', []),
+                'content_hash': hashes[product_data['id']]
+            })
+
+        if progress:
+            progress(0.8, f"Writing {len(rows)} products")
+        with phase('upsert'):
+            bulk_upsert(Product, rows, index_elements=['product_id'])
             db.session.commit()
-            message = f"Successfully refreshed products. Updated {updated_count} and created {created_count} products."
-            logging.info(message)
-            return True, message
-        else:
-            error_msg = "Unexpected response format from Metronome API"
-            logging.error(error_msg)
-            return False, error_msg
+        tracker.save()
+
+        updated_count = sum(1 for row in rows if row['product_id'] in stored_hashes)
+        created_count = len(rows) - updated_count
+        message = (f"Successfully refreshed products. Updated {updated_count} and created {created_count} products"
+                   f" ({tracker.unchanged_count} unchanged).")
+        logging.info(message)
+        return True, message
 
     except Exception as e:
+        db.session.rollback()
         error_msg = f"Error refreshing products: {str(e)}"
         logging.error(error_msg)
         logging.exception("Full traceback:")
         return False, error_msg
 
-@app.route('/products')
+@bp.route('/products')
 def products():
     try:
         # Get products from database
@@ -446,26 +667,11 @@ def products():
         flash(error_msg, 'danger')
         return render_template('products.html', products=[])
 
-@app.route('/rate-cards')
+@bp.route('/rate-cards')
 def rate_cards():
     try:
-        # Make API request
-        api = MetronomeAPI(api_key=metronome_api_key)
-        logging.info("Fetching rate cards")
-        response_data = api._make_request("POST", "/contract-pricing/rate-cards/list", json={})
-        logging.info(f"Rate cards response data: {json.dumps(response_data, indent=2)}")
-        
-        # Extract rate cards from response
-        if isinstance(response_data, dict):
-            if 'data' in response_data and isinstance(response_data['data'], list):
-                rate_cards = response_data['data']
-            else:
-                rate_cards = [response_data]
-        else:
-            rate_cards = response_data if isinstance(response_data, list) else []
-        
-        logging.info(f"Found {len(rate_cards)} rate cards")
-        return render_template('rate_cards.html', rate_cards=rate_cards)
+        rate_cards = rate_card_catalog.get()
+        return rate_card_page('rate_cards.html', rate_cards=rate_cards)
             
     except Exception as e:
         error_msg = f"Error loading rate cards: {str(e)}"
@@ -474,175 +680,95 @@ def rate_cards():
         flash(error_msg, 'danger')
         return render_template('rate_cards.html', rate_cards=[])
 
-@app.route('/customers')
+# Map sort field to model attribute
+CUSTOMER_SORT_FIELDS = {
+    'metronome_id': Customer.metronome_id,
+    'name': Customer.name,
+    'status': Customer.status,
+    'rate_card_id': Customer.rate_card_id,
+    'salesforce_id': Customer.salesforce_id,
+    'created_at': Customer.created_at
+}
+
+def filter_customers(query, search_query):
+    """Apply the /customers search box to a query or select."""
+    if search_query:
+        query = query.filter(customer_search_condition(search_query))
+    return query
+
+def customer_order(sort_by, sort_order):
+    # Default to created_at if the sort field is invalid
+    sort_field = CUSTOMER_SORT_FIELDS.get(sort_by, Customer.created_at)
+    return sort_field.desc() if sort_order == 'desc' else sort_field.asc()
+
+CUSTOMERS_PER_PAGE = 20
+
+def customers_after(query, sort_field, descending, cursor_id):
+    """Keyset-filter ``query`` (ordered by ``sort_field`` then id) to the rows after customer ``cursor_id``.
+
+    SQLite sorts NULLs first ascending and last descending, so rows without a
+    value come before the rest ascending and after them descending.
+    """
+    last = db.session.get(Customer, cursor_id)
+    if last is None:
+        return query
+    value = getattr(last, sort_field.key)
+    if descending:
+        if value is None:
+            return query.filter(sort_field.is_(None), Customer.id < last.id)
+        return query.filter(db.or_(sort_field < value, db.and_(sort_field == value, Customer.id < last.id),
+                                   sort_field.is_(None)))
+    if value is None:
+        return query.filter(db.or_(db.and_(sort_field.is_(None), Customer.id > last.id), sort_field.isnot(None)))
+    return query.filter(db.or_(sort_field > value, db.and_(sort_field == value, Customer.id > last.id)))
+
+@bp.route('/customers')
 def customers():
+    """Customers from the local table, which the admin page's refresh and ``sync`` keep up to date."""
+    search_query = request.args.get('search', '').strip()
+    sort_by = request.args.get('sort_by', 'created_at')
+    sort_order = request.args.get('sort_order', 'desc')
     try:
-        # Get search and pagination parameters
-        search_query = request.args.get('search', '').strip()
-        page = request.args.get('page', 1, type=int)
-        per_page = 20
-        
-        # Fetch all customers from Metronome using pagination
-        all_customers = []
-        next_page = None
-        base_url = "https://api.metronome.com/v1/customers"
-        headers = {
-            "Authorization": f"Bearer {metronome_api_key}",
-            "Accept": "application/json"
-        }
+        # Keyset pagination on (sort field, id): the cursor is the last customer shown
+        sort_field = CUSTOMER_SORT_FIELDS.get(sort_by, Customer.created_at)
+        descending = sort_order == 'desc'
+        query = filter_customers(Customer.query, search_query)
+        cursor = request.args.get('cursor', type=int)
+        if cursor:
+            query = customers_after(query, sort_field, descending, cursor)
+        id_order = Customer.id.desc() if descending else Customer.id.asc()
+        query = query.order_by(customer_order(sort_by, sort_order), id_order)
+        customers = query.limit(CUSTOMERS_PER_PAGE + 1).all()
 
-        while True:
-            # Make API request with pagination token if available
-            params = {}
-            if next_page:
-                params["page_token"] = next_page
-                logging.info(f"Fetching next page with token: {next_page}")
-            
-            response = requests.get(base_url, headers=headers, params=params)
-            logging.info(f"Customers response status: {response.status_code}")
-            
-            if response.status_code == 200:
-                try:
-                    data = response.json()
-                    if isinstance(data, dict):
-                        # Handle customer list response
-                        if 'data' in data and isinstance(data['data'], list):
-                            current_page_customers = len(data['data'])
-                            all_customers.extend(data['data'])
-                            logging.info(f"Fetched {current_page_customers} customers (total: {len(all_customers)})")
-                        
-                        # Get next page token
-                        next_page = data.get('next_page_token')
-                        if next_page:
-                            logging.info(f"Found next page token")
-                        else:
-                            logging.info("No more pages to fetch")
-                            break
-                    else:
-                        logging.error("Unexpected response format")
-                        break
-                except json.JSONDecodeError as e:
-                    logging.error(f"Failed to parse JSON response: {e}")
-                    break
-            else:
-                error_msg = f"Failed to fetch customers: {response.text}"
-                logging.error(error_msg)
-                flash(error_msg, "danger")
-                break
+        next_cursor = None
+        if len(customers) > CUSTOMERS_PER_PAGE:
+            customers = customers[:CUSTOMERS_PER_PAGE]
+            next_cursor = customers[-1].id
+
+        return render_template('customers.html',
+                               customers=customers,
+                               search_query=search_query,
+                               sort_by=sort_by,
+                               sort_order=sort_order,
+                               cursor=cursor,
+                               next_cursor=next_cursor)
 
-            # Add a small delay between requests to avoid rate limiting
-            time.sleep(0.5)
-        
-        # Update local database with all customers
-        if all_customers:
-            
-            # Update local database with all customers
-            for customer_data in all_customers:
-                customer_id = customer_data.get('id')
-                if not customer_id:
-                    continue
-                
-                # Parse created_at if present
-                created_at = None
-                if 'created_at' in customer_data:
-                    try:
-                        created_at = datetime.fromisoformat(customer_data['created_at'].replace('Z', '+00:00'))
-                    except (ValueError, AttributeError):
-                        pass
-                
-                customer = Customer.query.filter_by(metronome_id=customer_id).first()
-                if customer:
-                    # Update existing customer
-                    customer.name = customer_data.get('name', 'Unnamed Customer')
-                    customer.salesforce_id = customer_data.get('salesforce_id')
-                    customer.rate_card_id = customer_data.get('rate_card_id')
-                    customer.created_at = created_at
-                    customer.last_synced = datetime.now(timezone.utc)
-                else:
-                    # Create new customer
-                    customer = Customer(
-                        metronome_id=customer_id,
-                        name=customer_data.get('name', 'Unnamed Customer'),
-                        salesforce_id=customer_data.get('salesforce_id'),
-                        rate_card_id=customer_data.get('rate_card_id'),
-                        created_at=created_at,
-                        last_synced=datetime.now(timezone.utc)
-                    )
-                    db.session.add(customer)
-            
-            db.session.commit()
-            logging.info(f"Updated {len(all_customers)} customers in database")
-            
-            # Get updated customers from database with search filter and pagination
-            query = Customer.query
-            if search_query:
-                search = f"%{search_query}%"
-                query = query.filter(
-                    db.or_(
-                        Customer.name.ilike(search),
-                        Customer.metronome_id.ilike(search),
-                        Customer.salesforce_id.ilike(search)
-                    )
-                )
-            
-            # Get sort parameters
-            sort_by = request.args.get('sort_by', 'created_at')
-            sort_order = request.args.get('sort_order', 'desc')
-            
-            # Map sort field to model attribute
-            sort_field_map = {
-                'metronome_id': Customer.metronome_id,
-                'name': Customer.name,
-                'status': Customer.status,
-                'rate_card_id': Customer.rate_card_id,
-                'salesforce_id': Customer.salesforce_id,
-                'created_at': Customer.created_at
-            }
-            
-            # Get sort field from map, default to created_at if invalid
-            sort_field = sort_field_map.get(sort_by, Customer.created_at)
-            
-            # Apply sort order
-            if sort_order == 'desc':
-                query = query.order_by(sort_field.desc())
-            else:
-                query = query.order_by(sort_field.asc())
-            
-            # Paginate results
-            pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-            customers = pagination.items
-            
-            return render_template('customers.html', 
-                                customers=customers, 
-                                pagination=pagination,
-                                search_query=search_query,
-                                sort_by=sort_by,
-                                sort_order=sort_order)
-        else:
-            error_msg = f"Failed to fetch customers: {response.text}"
-            logging.error(error_msg)
-            flash(error_msg, "danger")
-            return render_template('customers.html', 
-                                customers=[], 
-                                pagination=None,
-                                search_query=search_query)
-            
     except Exception as e:
         error_msg = f"Error loading customers: {str(e)}"
         logging.error(error_msg)
         logging.exception("Full traceback:")
         flash(error_msg, "danger")
-        return render_template('customers.html', 
-                            customers=[], 
-                            pagination=None,
-                            search_query=search_query)
+        return render_template('customers.html',
+                               customers=[],
+                               search_query=search_query)
 
-def refresh_contracts():
+@traced()
+def refresh_contracts(progress=None):
     """Refresh contracts from Metronome API and store in database"""
     try:
         # Import and run the import_contracts script
         from scripts.import_contracts import import_contracts
-        success, message = import_contracts()
+        success, message = import_contracts(progress=progress, api_key=metronome_api_key)
         if success:
             logging.info(message)
         else:
@@ -654,19 +780,65 @@ def refresh_contracts():
         logging.exception("Full traceback:")
         return False, error_msg
 
-@app.route('/contracts')
+CONTRACTS_PER_PAGE = 50
+
+def parse_contract_cursor(cursor):
+    """Decode a ``<starting_at ISO or empty>|<contract id>`` keyset cursor."""
+    starting_at, _, contract_id = cursor.partition('|')
+    return (datetime.fromisoformat(starting_at) if starting_at else None), contract_id
+
+def contract_filters(args):
+    return {name: args.get(name, '').strip() for name in ('status', 'customer', 'start_from', 'start_to')}
+
+def filter_contracts(query, filters):
+    """Apply the /contracts filter form to a query or select."""
+    if filters['status']:
+        query = query.filter(Contract.status == filters['status'])
+    if filters['customer']:
+        query = query.filter(Contract.customer_id == filters['customer'])
+    if filters['start_from']:
+        query = query.filter(Contract.starting_at >= datetime.fromisoformat(filters['start_from']))
+    if filters['start_to']:
+        query = query.filter(Contract.starting_at < datetime.fromisoformat(filters['start_to']) + timedelta(days=1))
+    return query
+
+@bp.route('/contracts')
 def contracts():
+    filters = contract_filters(request.args)
     try:
-        # Get contracts from database
-        contracts = Contract.query.all()
+        # Customers are joined in the same query instead of lazy-loaded per row
+        query = filter_contracts(Contract.query.options(db.joinedload(Contract.customer)), filters)
+
+        # Keyset pagination on (starting_at, id), newest first. SQLite sorts NULLs
+        # last in descending order, so contracts without a start date come last
+        cursor = request.args.get('cursor', '')
+        if cursor:
+            cursor_start, cursor_id = parse_contract_cursor(cursor)
+            if cursor_start is None:
+                query = query.filter(Contract.starting_at.is_(None), Contract.id < cursor_id)
+            else:
+                query = query.filter(db.or_(
+                    Contract.starting_at < cursor_start,
+                    db.and_(Contract.starting_at == cursor_start, Contract.id < cursor_id),
+                    Contract.starting_at.is_(None)
+                ))
+        query = query.order_by(Contract.starting_at.desc(), Contract.id.desc())
+        contracts = query.limit(CONTRACTS_PER_PAGE + 1).all()
+
+        next_cursor = None
+        if len(contracts) > CONTRACTS_PER_PAGE:
+            contracts = contracts[:CONTRACTS_PER_PAGE]
+            last = contracts[-1]
+            next_cursor = f"{last.starting_at.isoformat() if last.starting_at else ''}|{last.id}"
         
         # Convert database objects to dictionaries for template
         contracts_list = []
         for contract in contracts:
+            customer = contract.customer
             contracts_list.append({
                 'id': contract.id,
-                'customer_id': contract.customer.metronome_id if contract.customer else None,
-                'customer_name': contract.customer.name if contract.customer else 'Unknown Customer',
+                'customer_id': customer.metronome_id if customer else None,
+                'customer_name': customer.name if customer else 'Unknown Customer',
                 'name': contract.name,
                 'product_name': contract.product_name,
                 'rate_card_name': contract.rate_card_name,
@@ -675,22 +847,30 @@ def contracts():
                 'ending_before': contract.ending_before.strftime('%Y-%m-%d %H:%M:%S') if contract.ending_before else None
             })
         
-        return render_template('contracts.html', contracts=contracts_list)
+        return render_template('contracts.html', contracts=contracts_list, filters=filters,
+                               cursor=cursor, next_cursor=next_cursor)
         
     except Exception as e:
         error_msg = f"Error loading contracts: {str(e)}"
         logging.error(error_msg)
         logging.exception("Full traceback:")
         flash(error_msg, 'danger')
-        return render_template('contracts.html', contracts=[])
+        return render_template('contracts.html', contracts=[], filters=filters)
+
+# Concurrent /ingest batches when sending generated usage
+USAGE_INGEST_WORKERS = 4
 
-@app.route('/usage', methods=['GET', 'POST'])
+@bp.route('/usage', methods=['GET', 'POST'])
 def usage():
     return render_template('usage.html')
 
-@app.route('/generate_usage', methods=['POST'])
+@bp.route('/generate_usage', methods=['POST'])
 def generate_usage():
     try:
+        from itertools import islice
+        from metronome_billing.core.usage import generate_usage_events
+        from metronome_billing.utils.concurrency import batched, bounded_map, in_submission_order
+
         customer_id = request.form['customer_id']
         days = int(request.form.get('days', 7))
         events_per_day = int(request.form.get('events_per_day', 20))
@@ -698,122 +878,113 @@ def generate_usage():
         
         if not event_types:
             flash('Please select at least one event type', 'danger')
-            return redirect(url_for('usage'))
+            return redirect(url_for('main.usage'))
         
         # Initialize API
-        api = MetronomeAPI(api_key=metronome_api_key)
+        api = MetronomeAPI(api_key=metronome_api_key, pool_size=USAGE_INGEST_WORKERS)
         
         # Verify customer exists
-        url = f"{api.BASE_URL}/customers/{customer_id}"
-        headers = {
-            "Authorization": f"Bearer {metronome_api_key}",
-            "Accept": "application/json"
-        }
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
+        try:
+            api._make_request("GET", f"/customers/{customer_id}")
+        except Exception:
             flash(f'Customer not found: {customer_id}', 'danger')
-            return redirect(url_for('usage'))
-        
-        # Generate events
-        events = []
-        start_date = datetime.now(timezone.utc) - timedelta(days=days)
-        models = [
-            'gpt-3.5-turbo',
-            'gpt-4',
-            'claude-2',
-            'claude-instant'
-        ]
+            return redirect(url_for('main.usage'))
         
-        current_date = start_date
-        while current_date < datetime.now(timezone.utc):
-            # More events during business hours (8am-6pm UTC)
-            hour = current_date.hour
-            is_business_hours = 8 <= hour <= 18
-            day_multiplier = 1.5 if is_business_hours else 0.5
-            
-            # Generate events for this hour
-            hourly_events = int(events_per_day * day_multiplier / 24)
-            
-            for _ in range(hourly_events):
-                timestamp = current_date + timedelta(minutes=np.random.randint(60))
-                
-                if 'token_usage' in event_types:
-                    # Choose model
-                    model = np.random.choice(models)
-                    
-                    # Generate input and output tokens
-                    input_tokens = np.random.randint(100, 2000)
-                    output_tokens = np.random.randint(50, input_tokens)
-                    
-                    # Add input event
-                    events.append({
-                        'transaction_id': f"{timestamp.isoformat()}_{customer_id}_{model}_input",
-                        'customer_id': customer_id,
-                        'event_type': 'token_usage',
-                        'timestamp': timestamp.isoformat(),
-                        'properties': {
-                            'type': 'input',
-                            'model_name': model,
-                            'token_count': input_tokens
-                        }
-                    })
-                    
-                    # Add output event
-                    events.append({
-                        'transaction_id': f"{timestamp.isoformat()}_{customer_id}_{model}_output",
-                        'customer_id': customer_id,
-                        'event_type': 'token_usage',
-                        'timestamp': timestamp.isoformat(),
-                        'properties': {
-                            'type': 'output',
-                            'model_name': model,
-                            'token_count': output_tokens
-                        }
-                    })
-                
-                if 'gpu_usage' in event_types and np.random.random() < 0.2:  # 20% chance of GPU usage
-                    gpu_type = f"gpu_type_{np.random.randint(1, 4)}"
-                    gpu_hours = round(np.random.uniform(0.1, 2.0), 3)  # Between 6 minutes and 2 hours
-                    
-                    events.append({
-                        'transaction_id': f"{timestamp.isoformat()}_{customer_id}_{gpu_type}",
-                        'customer_id': customer_id,
-                        'event_type': 'gpu_usage',
-                        'timestamp': timestamp.isoformat(),
-                        'properties': {
-                            'type': gpu_type,
-                            'hours': gpu_hours
-                        }
-                    })
-            
-            current_date += timedelta(hours=1)
-        
-        # Send events to Metronome
-        batch_size = 100
-        url = f"{api.BASE_URL}/ingest"
-        headers = {
-            "Authorization": f"Bearer {metronome_api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        for i in range(0, len(events), batch_size):
-            batch = events[i:i + batch_size]
-            response = requests.post(url, headers=headers, json=batch)
-            if response.status_code != 200:
-                flash(f'Error sending events batch {i//batch_size + 1}: {response.text}', 'danger')
-                return redirect(url_for('usage'))
+        # Stream generated events to /ingest in batches of 100, a few batches at a time
+        events = generate_usage_events([customer_id], days=days, events_per_day=events_per_day,
+                                       event_types=event_types)
+        preview = []
+
+        def send(item):
+            api.ingest(item[1])
+            return len(item[1])
+
+        sent = 0
+        failed = None
+        # Sent batches are also spooled for the usage analytics rollups and watched for anomalies, in
+        # the order they were generated
+        with Spool().writer() as spool:
+            results = bounded_map(send, enumerate(batched(events, 100)), workers=USAGE_INGEST_WORKERS)
+            for (_, batch), count, error in in_submission_order(results):
+                if error:
+                    failed = error
+                    break
+                spool(batch)
+                current_app.extensions['anomalies'].observe(batch)
+                if len(preview) < 100:
+                    preview.extend(islice(batch, 100 - len(preview)))
+                sent += count
+        if sent:
+            current_app.extensions['jobs'].submit('rollup_usage')
+        if failed:
+            flash(f'Error sending events batch: {failed}', 'danger')
+            return redirect(url_for('main.usage'))
         
-        flash(f'Successfully generated and sent {len(events)} usage events', 'success')
-        return render_template('usage.html', events=events[:100])  # Show first 100 events
+        flash(f'Successfully generated and sent {sent} usage events', 'success')
+        return render_template('usage.html', events=preview)  # Show first 100 events
         
     except Exception as e:
         error_msg = f'Error generating usage: {str(e)}'
         logging.error(error_msg)
         logging.exception("Full traceback:")
         flash(error_msg, 'danger')
-        return redirect(url_for('usage'))
+        return redirect(url_for('main.usage'))
+
+ANALYTICS_RANGES = (7, 30, 90)
+ANALYTICS_MAX_TOP = 100
 
-@app.route('/logs')
+@bp.route('/usage/analytics')
+def usage_analytics():
+    days = request.args.get('days', 30, type=int)
+    if days not in ANALYTICS_RANGES:
+        days = 30
+    kind = request.args.get('kind', 'tokens')
+    if kind not in KINDS:
+        kind = 'tokens'
+    # Clamped like the JSON API's limit: a negative LIMIT is no limit at all in SQLite
+    limit = min(max(request.args.get('limit', 10, type=int), 1), ANALYTICS_MAX_TOP)
+    top = top_customers(kind, days, limit=limit)
+    # Without a selection, chart the heaviest user
+    customer_id = request.args.get('customer_id', '').strip() or (top[0]['customer_id'] if top else None)
+    chart = customer_series(customer_id, kind, days) if customer_id else None
+    return render_template('usage_analytics.html', days=days, kind=kind, ranges=ANALYTICS_RANGES,
+                           kinds=KINDS, top=top, customer_id=customer_id, chart=chart,
+                           pending_segments=len(Spool().segments()))
+
+@bp.route('/usage/forecast')
+def usage_forecast():
+    alerts = SpendProjection.query.filter(SpendProjection.exhausted_at.is_not(None)) \
+        .order_by(SpendProjection.exhausted_at).all()
+    top = SpendProjection.query.order_by(SpendProjection.projected.desc()).limit(25).all()
+    names = dict(db.session.execute(db.select(Customer.metronome_id, Customer.name).where(
+        Customer.metronome_id.in_({p.customer_id for p in alerts + top})
+    )).all())
+    computed_at = db.session.scalar(db.select(db.func.max(SpendProjection.computed_at)))
+    return render_template('usage_forecast.html', alerts=alerts, top=top, names=names, computed_at=computed_at)
+
+@bp.route('/usage/forecast/refresh', methods=['POST'])
+def refresh_forecast():
+    return start_job('forecast_spend')
+
+@bp.route('/usage/analytics/refresh', methods=['POST'])
+def refresh_usage_analytics():
+    return start_job('rollup_usage')
+
+def filter_logs(query, search_query, level):
+    """Apply the /logs search box and level filter to a query or select."""
+    if search_query:
+        search = f"%{search_query}%"
+        query = query.filter(LogEntry.message.ilike(search))
+    if level in ['INFO', 'WARNING', 'ERROR']:
+        query = query.filter(LogEntry.level == level)
+    return query
+
+@bp.route('/metrics')
+def metrics():
+    """Request, Metronome, Stripe and database commit timings in the Prometheus text format."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@bp.route('/logs')
 def view_logs():
     try:
         page = request.args.get('page', 1, type=int)
@@ -821,20 +992,8 @@ def view_logs():
         search_query = request.args.get('search', '').strip()
         level = request.args.get('level', '').strip().upper()
 
-        # Start with base query
-        query = LogEntry.query
-
-        # Apply search filter if provided
-        if search_query:
-            search = f"%{search_query}%"
-            query = query.filter(LogEntry.message.ilike(search))
-
-        # Apply level filter if provided
-        if level in ['INFO', 'WARNING', 'ERROR']:
-            query = query.filter(LogEntry.level == level)
-
         # Order by timestamp descending
-        query = query.order_by(LogEntry.timestamp.desc())
+        query = filter_logs(LogEntry.query, search_query, level).order_by(LogEntry.timestamp.desc())
 
         # Paginate results
         logs = query.paginate(page=page, per_page=per_page)
@@ -850,13 +1009,51 @@ def view_logs():
         flash(error_msg, 'danger')
         return render_template('logs.html', logs=None)
 
-@app.route('/preferences')
+# Bulk downloads. Rows stream from a database cursor in batches, so large
+# tables never sit in worker memory; they accept the same filters as the pages.
+
+@bp.route('/customers.csv')
+def customers_csv():
+    columns = (Customer.metronome_id, Customer.name, Customer.salesforce_id, Customer.rate_card_id,
+               Customer.stripe_id, Customer.status, Customer.created_at, Customer.last_synced)
+    stmt = filter_customers(db.select(*columns), request.args.get('search', '').strip())
+    stmt = stmt.order_by(customer_order(request.args.get('sort_by', 'created_at'),
+                                        request.args.get('sort_order', 'desc')))
+    header = [column.key for column in columns]
+    return download(csv_chunks(header, stream_rows(stmt)), 'text/csv', 'customers.csv')
+
+@bp.route('/contracts.csv')
+def contracts_csv():
+    columns = (Contract.id, Contract.customer_id, Customer.name.label('customer_name'), Contract.name,
+               Contract.product_name, Contract.rate_card_name, Contract.status,
+               Contract.starting_at, Contract.ending_before, Contract.created_at)
+    stmt = db.select(*columns).outerjoin(Customer, Contract.customer_id == Customer.metronome_id)
+    try:
+        # Dates are parsed here, before the response starts streaming
+        stmt = filter_contracts(stmt, contract_filters(request.args))
+    except ValueError as e:
+        flash(f"Invalid date filter: {e}", 'danger')
+        return redirect(url_for('main.contracts'))
+    stmt = stmt.order_by(Contract.starting_at.desc(), Contract.id.desc())
+    header = [column.key for column in columns]
+    return download(csv_chunks(header, stream_rows(stmt)), 'text/csv', 'contracts.csv')
+
+@bp.route('/logs.ndjson')
+def logs_ndjson():
+    columns = (LogEntry.id, LogEntry.timestamp, LogEntry.level, LogEntry.message)
+    stmt = filter_logs(db.select(*columns), request.args.get('search', '').strip(),
+                       request.args.get('level', '').strip().upper())
+    stmt = stmt.order_by(LogEntry.timestamp.desc())
+    fields = [column.key for column in columns]
+    return download(ndjson_chunks(fields, stream_rows(stmt)), 'application/x-ndjson', 'logs.ndjson')
+
+@bp.route('/preferences')
 def preferences():
     return render_template('preferences.html',
                          metronome_api_key=metronome_api_key,
-                         stripe_api_key=stripe.api_key)
+                         stripe_api_key=stripe_api_key)
 
-@app.route('/preferences', methods=['POST'])
+@bp.route('/preferences', methods=['POST'])
 def save_preferences():
     global metronome_api_key, stripe_api_key
     
@@ -866,184 +1063,196 @@ def save_preferences():
     if new_metronome_key:
         metronome_api_key = new_metronome_key
         os.environ['METRONOME_API_KEY'] = new_metronome_key
+        rate_card_catalog.invalidate()
     
     if new_stripe_key:
-        stripe.api_key = new_stripe_key
+        stripe_api_key = new_stripe_key
         os.environ['STRIPE_API_KEY'] = new_stripe_key
     
     flash('Preferences saved successfully!', 'success')
-    return redirect(url_for('preferences'))
+    return redirect(url_for('main.preferences'))
+
+@traced()
+def refresh_customers(progress=None):
+    """Fetch all customers from Metronome and upsert them into the database"""
+    try:
+        # Pooled, retried and paged by MetronomeAPI; fresh=True so a sync never reads the response cache
+        api = MetronomeAPI(api_key=metronome_api_key, fresh=True)
+        all_customers = []
+        for customer in api.iter_customers():
+            all_customers.append(customer)
+            if progress and len(all_customers) % 100 == 0:
+                progress(None, f"Fetched {len(all_customers)} customers")
+        logging.info(f"Fetched {len(all_customers)} customers")
+
+        if not all_customers:
+            return True, "No customers found to update."
+
+        # Update local database with all customers
+        logging.info(f"Starting database update with {len(all_customers)} customers")
+        if progress:
+            progress(None, f"Writing {len(all_customers)} customers")
+        updated_count, created_count, unchanged_count = upsert_customers(all_customers)
+        message = (f"Successfully refreshed customers. Updated {updated_count} and created {created_count} customers"
+                   f" ({unchanged_count} unchanged).")
+        logging.info(message)
+        return True, message
+
+    except Exception as e:
+        db.session.rollback()
+        error_msg = f"Error refreshing customers: {str(e)}"
+        logging.error(error_msg)
+        logging.exception("Full traceback:")
+        return False, error_msg
+
+def run_step(step, progress):
+    success, message = step(progress=progress)
+    if not success:
+        raise RuntimeError(message)
+    return message
+
+def scaled_progress(ctx, start, end):
+    """Map a step's own 0..1 progress onto its share of a multi-step job."""
+    def progress(fraction=None, message=None):
+        ctx.progress(None if fraction is None else start + fraction * (end - start), message)
+    return progress
+
+@job_handler('refresh_products')
+def refresh_products_job(ctx):
+    return run_step(refresh_products, ctx.progress)
+
+@job_handler('refresh_customers')
+def refresh_customers_job(ctx):
+    return run_step(refresh_customers, ctx.progress)
+
+@job_handler('refresh_contracts')
+def refresh_contracts_job(ctx):
+    return run_step(refresh_contracts, ctx.progress)
+
+@job_handler('refresh_database')
+def refresh_database_job(ctx):
+    messages = []
+    for start, end, step in ((0.0, 0.05, refresh_rates), (0.05, 0.1, refresh_products), (0.1, 0.4, refresh_customers),
+                             (0.4, 1.0, refresh_contracts)):
+        ctx.progress(start)
+        messages.append(run_step(step, scaled_progress(ctx, start, end)))
+    return " ".join(messages)
+
+@job_handler('reconcile_customers')
+def reconcile_customers_job(ctx):
+    summary = reconcile_customers(MetronomeAPI(api_key=metronome_api_key, fresh=True), stripe=get_stripe(),
+                                  progress=ctx.progress)
+    issues = ', '.join(f"{count} {issue}" for issue, count in sorted(summary['issues'].items())) or 'no drift'
+    return f"Reconciled ({summary['buckets_rechecked']}/{summary['buckets_total']} buckets re-checked): {issues}"
+
+@job_handler('rollup_usage')
+def rollup_usage_job(ctx):
+    segments, events = drain_spool(progress=ctx.progress)
+    return f"Added {events} usage events from {segments} spool segments to the analytics rollups"
+
+@job_handler('forecast_spend')
+def forecast_spend_job(ctx):
+    from website.forecast import run_forecast
+    summary = run_forecast(MetronomeAPI(api_key=metronome_api_key), progress=ctx.progress)
+    return f"Projected spend for {summary['customers']} customers; {len(summary['alerts'])} budget alerts"
+
+def start_job(kind):
+    # The admin forms' "Profile" box runs the job under the profiler
+    params = {'profile': True} if request.form.get('profile') else {}
+    job, created = current_app.extensions['jobs'].submit(kind, **params)
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(job_to_dict(job)), 202
+    if created:
+        flash(f"Started {kind.replace('_', ' ')}. Progress is shown below.", "info")
+    else:
+        flash(f"{kind.replace('_', ' ').capitalize()} is already running.", "warning")
+    return redirect(url_for('main.admin'))
 
-@app.route('/admin')
+@bp.route('/admin')
 def admin():
     # Get counts from database
     customer_count = Customer.query.count()
     product_count = Product.query.count()
     contract_count = Contract.query.count()
+    recent_jobs = Job.query.order_by(Job.created_at.desc()).limit(10).all()
     return render_template('admin.html',
                          customer_count=customer_count,
                          product_count=product_count,
-                         contract_count=contract_count)
+                         contract_count=contract_count,
+                         jobs=recent_jobs,
+                         active_statuses=ACTIVE_STATUSES,
+                         reconciliation=last_summary(),
+                         profiles=list_profiles(limit=10))
 
-@app.route('/admin/refresh-contracts', methods=['POST'])
+@bp.route('/admin/profiles/<path:filename>')
+def profile_file(filename):
+    """A profile's ``.json`` summary or ``.collapsed`` stacks, for flame graph tools."""
+    return send_from_directory(profile_dir(), filename, as_attachment=filename.endswith('.collapsed'),
+                               mimetype='text/plain' if filename.endswith('.collapsed') else None)
+
+@bp.route('/admin/refresh-customers', methods=['POST'])
+def refresh_customers_route():
+    return start_job('refresh_customers')
+
+@bp.route('/admin/refresh-contracts', methods=['POST'])
 def refresh_contracts_route():
-    success, message = refresh_contracts()
-    if success:
-        flash(message, "success")
-    else:
-        flash(message, "danger")
-    return redirect(url_for('admin'))
+    return start_job('refresh_contracts')
 
-@app.route('/admin/refresh-products', methods=['POST'])
+@bp.route('/admin/refresh-products', methods=['POST'])
 def refresh_products_route():
-    success, message = refresh_products()
-    if success:
-        flash(message, "success")
-    else:
-        flash(message, "danger")
-    return redirect(url_for('admin'))
+    return start_job('refresh_products')
 
-@app.route('/admin/refresh-database', methods=['POST'])
+@bp.route('/admin/refresh-database', methods=['POST'])
 def refresh_database():
-    try:
-        # First refresh products
-        success, message = refresh_products()
-        if not success:
-            flash(message, "danger")
-            return redirect(url_for('admin'))
-        
-        # Then fetch all customers from Metronome
-        all_customers = []
-        next_page = None
-        base_url = "https://api.metronome.com/v1/customers"
-        headers = {
-            "Authorization": f"Bearer {metronome_api_key}",
-            "Accept": "application/json"
-        }
+    return start_job('refresh_database')
 
+@bp.route('/admin/reconcile', methods=['POST'])
+def reconcile_route():
+    return start_job('reconcile_customers')
+
+@bp.route('/admin/reconcile/drift.ndjson')
+def reconcile_report():
+    report = RECONCILE_DIR / 'drift.ndjson'
+    if not report.exists():
+        flash("No reconciliation has been run yet.", "warning")
+        return redirect(url_for('main.admin'))
+    return send_file(report, mimetype='application/x-ndjson', as_attachment=True, download_name='drift.ndjson')
+
+@bp.route('/admin/jobs')
+def list_jobs():
+    recent_jobs = Job.query.order_by(Job.created_at.desc()).limit(50).all()
+    return jsonify([current_app.extensions['jobs'].to_dict(job) for job in recent_jobs])
+
+@bp.route('/admin/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if current_app.extensions['jobs'].cancel(job_id):
+        flash("Cancellation requested.", "info")
+    else:
+        flash("Job is not running.", "warning")
+    return redirect(url_for('main.admin'))
+
+@bp.route('/admin/jobs/<job_id>/events')
+def job_events(job_id):
+    """Stream a job's state as Server-Sent Events until it finishes."""
+    def generate():
+        last = None
         while True:
-            # Make API request with pagination token if available
-            params = {}
-            if next_page:
-                params["next_page"] = next_page  # Using correct parameter name from API docs
-                logging.info(f"Fetching next page with token: {next_page}")
-            
-            response = requests.get(base_url, headers=headers, params=params)
-            logging.info(f"Request URL: {response.url}")  # Log the full URL to verify parameters
-            logging.info(f"Customers response status: {response.status_code}")
-            
-            if response.status_code == 200:
-                try:
-                    data = response.json()
-                    if not isinstance(data, dict):
-                        logging.error("Unexpected response format - not a dictionary")
-                        break
-                        
-                    if 'data' not in data or not isinstance(data['data'], list):
-                        logging.error("Unexpected response format - missing data array")
-                        break
-                        
-                    # Add customers from current page
-                    current_page_customers = len(data['data'])
-                    all_customers.extend(data['data'])
-                    logging.info(f"Fetched {current_page_customers} customers (total: {len(all_customers)})")
-                    
-                    # Log the current data structure for debugging
-                    logging.info(f"Response data structure: {json.dumps(data, indent=2)}")
-                    
-                    # Get next page token
-                    next_page = data.get('next_page')  # API returns 'next_page', not 'next_page_token'
-                    if next_page:
-                        logging.info(f"Found next page token: {next_page}, continuing to next page")
-                        # Add a small delay between requests to avoid rate limiting
-                        time.sleep(0.5)
-                        continue  # Continue to next iteration to fetch next page
-                    else:
-                        logging.info("No more pages to fetch")
-                        break
-                except json.JSONDecodeError as e:
-                    logging.error(f"Failed to parse JSON response: {e}")
-                    break
-            else:
-                error_msg = f"Failed to fetch customers: {response.text}"
-                logging.error(error_msg)
-                flash(error_msg, "danger")
-                return redirect(url_for('admin'))
+            # End the read transaction so each poll sees the worker's latest commit
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            if job is None:
+                yield "event: error\ndata: {}\n\n"
+                return
+            state = current_app.extensions['jobs'].to_dict(job)
+            if state != last:
+                yield f"data: {json.dumps(state)}\n\n"
+                last = state
+            if job.status not in ACTIVE_STATUSES:
+                return
+            current_app.extensions['jobs'].wait_for_change(timeout=1.0)
 
-        # Update local database with all customers
-        updated_count = 0
-        created_count = 0
-        if all_customers:
-            logging.info(f"Starting database update with {len(all_customers)} customers")
-            
-            # First, get all existing customers for bulk comparison
-            existing_customers = {c.metronome_id: c for c in Customer.query.all()}
-            logging.info(f"Found {len(existing_customers)} existing customers in database")
-            
-            for customer_data in all_customers:
-                customer_id = customer_data.get('id')
-                if not customer_id:
-                    logging.warning(f"Skipping customer with no ID: {customer_data}")
-                    continue
-                
-                # Parse created_at if present
-                created_at = None
-                if 'created_at' in customer_data:
-                    try:
-                        created_at = datetime.fromisoformat(customer_data['created_at'].replace('Z', '+00:00'))
-                    except (ValueError, AttributeError) as e:
-                        logging.warning(f"Error parsing created_at for customer {customer_id}: {e}")
-                
-                customer = existing_customers.get(customer_id)
-                if customer:
-                    # Update existing customer
-                    customer.name = customer_data.get('name', 'Unnamed Customer')
-                    customer.salesforce_id = customer_data.get('salesforce_id')
-                    customer.rate_card_id = customer_data.get('rate_card_id')
-                    customer.created_at = created_at
-                    customer.last_synced = datetime.now(timezone.utc)
-                    updated_count += 1
-                else:
-                    # Create new customer
-                    customer = Customer(
-                        metronome_id=customer_id,
-                        name=customer_data.get('name', 'Unnamed Customer'),
-                        salesforce_id=customer_data.get('salesforce_id'),
-                        rate_card_id=customer_data.get('rate_card_id'),
-                        created_at=created_at,
-                        last_synced=datetime.now(timezone.utc)
-                    )
-                    db.session.add(customer)
-                    created_count += 1
-                
-                # Commit every 100 customers to avoid memory issues
-                if (updated_count + created_count) % 100 == 0:
-                    db.session.commit()
-                    logging.info(f"Committed batch of 100 customers (Updated: {updated_count}, Created: {created_count})")
-            
-            # Final commit for remaining customers
-            db.session.commit()
-            customer_message = f"Successfully refreshed customers. Updated {updated_count} and created {created_count} customers."
-            logging.info(customer_message)
-            flash(customer_message, "success")
-        else:
-            flash("No customers found to update.", "warning")
-        
-        # Finally refresh contracts
-        success, contract_message = refresh_contracts()
-        if success:
-            flash(contract_message, "success")
-        else:
-            flash(contract_message, "danger")
-        
-        return redirect(url_for('admin'))
-            
-    except Exception as e:
-        error_msg = f"Error refreshing database: {str(e)}"
-        logging.error(error_msg)
-        logging.exception("Full traceback:")
-        flash(error_msg, "danger")
-        return redirect(url_for('admin'))
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8082, debug=True)
+    create_app(serve=True).run(host='0.0.0.0', port=8082, debug=True)
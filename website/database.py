@@ -0,0 +1,27 @@
+from sqlalchemy import event
+
+# Applied to every new SQLite connection. WAL lets page loads keep reading
+# while a sync job writes, and busy_timeout makes writers queue rather than
+# fail with "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+def configure_sqlite(engine, pragmas=None):
+    """Register a connect hook that applies the performance pragmas to a SQLite engine."""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
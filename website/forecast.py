@@ -0,0 +1,133 @@
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from website import db
+from website.models import SpendProjection, UsageRollup
+from website.upsert import chunked_upsert
+from metronome_billing.core.forecast import TREND_WINDOW_HOURS, budget_alerts, fiat_balance, forecast_spend
+from metronome_billing.utils.concurrency import bounded_map
+
+BALANCE_WORKERS = 8
+
+
+def billing_period(now):
+    """The calendar month (UTC) containing ``now``, as ``(start, end)``."""
+    start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def spend_to_date(period_start):
+    """``{customer_id: dollars}`` of rolled-up spend since ``period_start`` (a day boundary)."""
+    stmt = db.select(UsageRollup.customer_id, db.func.sum(UsageRollup.quantity)).where(
+        UsageRollup.resolution == 'day',
+        UsageRollup.metric == 'cost',
+        UsageRollup.period_start >= int(period_start.timestamp()),
+    ).group_by(UsageRollup.customer_id)
+    return dict(db.session.execute(stmt).all())
+
+
+def hourly_cost_matrix(customer_index, start, end):
+    """Matrix of rolled-up spend, one row per ``customer_index`` entry and one column per hour in [start, end)."""
+    start_epoch, end_epoch = int(start.timestamp()), int(end.timestamp())
+    stmt = db.select(UsageRollup.customer_id, UsageRollup.period_start, UsageRollup.quantity).where(
+        UsageRollup.resolution == 'hour',
+        UsageRollup.metric == 'cost',
+        UsageRollup.period_start >= start_epoch,
+        UsageRollup.period_start < end_epoch,
+    )
+    rows, columns, values = [], [], []
+    for customer_id, period_start, quantity in db.session.execute(stmt):
+        row = customer_index.get(customer_id)
+        if row is not None:
+            rows.append(row)
+            columns.append((period_start - start_epoch) // 3600)
+            values.append(quantity)
+    matrix = np.zeros((len(customer_index), (end_epoch - start_epoch) // 3600))
+    matrix[rows, columns] = values
+    return matrix
+
+
+def fetch_balances(api, customer_ids, progress=None):
+    """Dollars left on each customer's USD commits and credits, skipping customers without any."""
+    balances = {}
+    done = 0
+    for customer_id, balance, error in bounded_map(lambda c: fiat_balance(api.iter_customer_balances(c)),
+                                                   customer_ids, workers=BALANCE_WORKERS):
+        done += 1
+        if error:
+            logging.warning(f"Could not read balances for customer {customer_id}: {error}")
+        elif balance is not None:
+            balances[customer_id] = balance
+        if progress and done % 100 == 0:
+            progress(done / len(customer_ids), f"Read balances for {done}/{len(customer_ids)} customers")
+    return balances
+
+
+def run_forecast(api=None, now=None, progress=None):
+    """Project every customer's spend for the current month from the cost rollups.
+
+    With ``api``, the projections are compared to the balances left on each
+    customer's commits and credits and a warning is logged for every
+    customer projected to run out before the month ends. Results replace
+    the ``spend_projection`` table. Returns a summary.
+    """
+    def report(fraction, message):
+        if progress:
+            progress(fraction, message)
+
+    started = time.perf_counter()
+    now = now or datetime.now(timezone.utc)
+    current_hour = now.replace(minute=0, second=0, microsecond=0)
+    period_start, period_end = billing_period(now)
+    # The trend is fitted to the last week of hourly spend; the spend so far comes from the daily rollups
+    history_start = current_hour - timedelta(hours=TREND_WINDOW_HOURS)
+    remaining_hours = int((period_end - current_hour).total_seconds() // 3600)
+
+    report(0.0, "Loading spend")
+    totals = spend_to_date(period_start)
+    customer_ids = list(totals)
+    matrix = hourly_cost_matrix({customer_id: i for i, customer_id in enumerate(customer_ids)},
+                                history_start, current_hour)
+    report(0.2, f"Forecasting {len(customer_ids)} customers")
+    forecast = forecast_spend(customer_ids, matrix, [totals[customer_id] for customer_id in customer_ids],
+                              remaining_hours, first_hour_of_day=history_start.hour)
+
+    alerts = []
+    balances = {}
+    if api is not None and customer_ids:
+        spending = [customer_id for i, customer_id in enumerate(customer_ids)
+                    if forecast.projected[i] > forecast.to_date[i]]
+        balances = fetch_balances(api, spending,
+                                  progress=lambda fraction, message: report(0.3 + 0.5 * fraction, message))
+        hour_labels = [current_hour + timedelta(hours=h + 1) for h in range(remaining_hours)]
+        alerts = budget_alerts(forecast, balances, hour_labels)
+        for alert in alerts:
+            logging.warning(
+                f"Customer {alert['customer_id']} is projected to spend ${alert['projected_remaining']:,.2f} "
+                f"more this month with ${alert['balance']:,.2f} left on commits and credits; "
+                f"exhausted around {alert['exhausted_at']:%Y-%m-%d %H:00} UTC"
+            )
+
+    report(0.8, "Saving projections")
+    exhausted = {alert['customer_id']: alert['exhausted_at'] for alert in alerts}
+    computed_at = datetime.now(timezone.utc)
+    rows = ({
+        'customer_id': customer_id,
+        'period_start': period_start,
+        'spend_to_date': round(float(forecast.to_date[i]), 4),
+        'projected': round(float(forecast.projected[i]), 4),
+        'projected_high': round(float(forecast.projected_high[i]), 4),
+        'balance': balances.get(customer_id),
+        'exhausted_at': exhausted.get(customer_id),
+        'computed_at': computed_at,
+    } for i, customer_id in enumerate(customer_ids))
+    chunked_upsert(SpendProjection, rows, ['customer_id'])
+    db.session.execute(db.delete(SpendProjection).where(SpendProjection.computed_at < computed_at))
+    db.session.commit()
+
+    seconds = time.perf_counter() - started
+    logging.info(f"Forecast {len(customer_ids)} customers in {seconds:.1f}s, {len(alerts)} budget alerts")
+    return {'customers': len(customer_ids), 'alerts': alerts, 'seconds': seconds,
+            'period_start': period_start, 'period_end': period_end}
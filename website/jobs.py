@@ -0,0 +1,216 @@
+import json
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from sqlalchemy.exc import OperationalError
+from website import db
+from website.database import SQLITE_PRAGMAS
+from website.models import Job
+from metronome_billing.utils.metrics import current_job
+from metronome_billing.utils.profiling import Profile
+from metronome_billing.utils.tracing import trace
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+# Passed to JobQueue._update for a column to leave as it is; None is written as NULL
+UNCHANGED = object()
+# Progress columns, which a running job reports without waiting for the database
+PROGRESS_FIELDS = ('progress', 'message')
+
+# Job kind -> handler, filled in by the job_handler decorator
+HANDLERS = {}
+
+
+def job_handler(kind):
+    """Decorator registering ``fn(ctx, **params) -> message`` as the handler for ``kind``."""
+    def decorator(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+
+class JobCancelled(BaseException):
+    """Raised inside a job when cancellation was requested.
+
+    Derives from BaseException so the ``except Exception`` blocks in the sync
+    functions do not swallow it.
+    """
+
+
+class JobContext:
+    """Handed to a running job for progress reporting and cancellation checks."""
+
+    def __init__(self, queue, job_id):
+        self.queue = queue
+        self.job_id = job_id
+        self.cancel_event = threading.Event()
+
+    def progress(self, fraction=None, message=None):
+        """Record progress (0..1) and a message, and stop if the job was cancelled.
+
+        Either may be None to keep the recorded value: steps report a message
+        without a fraction while they count, and the bar stays where it was.
+        """
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+        self.queue._update(self.job_id, wait=False, progress=UNCHANGED if fraction is None else fraction,
+                           message=UNCHANGED if message is None else message)
+
+
+class JobQueue:
+    """Runs long admin operations on worker threads, persisting their state in the ``job`` table.
+
+    Identical jobs (same kind and parameters) submitted while one is queued
+    or running return the existing job instead of starting another.
+    """
+
+    def __init__(self, app, max_workers=4):
+        self.app = app
+        self.handlers = HANDLERS
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._contexts = {}
+        # job_id -> progress fields not written yet because the database was busy
+        self._unsaved = {}
+        self._changed = threading.Condition()
+
+    def recover(self):
+        """Mark jobs left active by a previous process as failed."""
+        Job.query.filter(Job.status.in_(ACTIVE_STATUSES)).update(
+            {'status': 'failed', 'message': 'Interrupted by server restart',
+             'finished_at': datetime.now(timezone.utc)},
+            synchronize_session=False
+        )
+        db.session.commit()
+
+    def submit(self, kind, **params):
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        dedupe_key = f"{kind}:{json.dumps(params, sort_keys=True)}"
+        with self._lock:
+            existing = Job.query.filter(Job.dedupe_key == dedupe_key, Job.status.in_(ACTIVE_STATUSES)).first()
+            if existing:
+                return existing, False
+            job = Job(id=str(uuid.uuid4()), kind=kind, params=params, dedupe_key=dedupe_key,
+                      status='queued', created_at=datetime.now(timezone.utc))
+            db.session.add(job)
+            db.session.commit()
+            self._contexts[job.id] = JobContext(self, job.id)
+        self._executor.submit(self._run, job.id, kind, params)
+        return job, True
+
+    def cancel(self, job_id):
+        job = db.session.get(Job, job_id)
+        if not job or job.status not in ACTIVE_STATUSES:
+            return False
+        job.cancel_requested = True
+        db.session.commit()
+        ctx = self._contexts.get(job_id)
+        if ctx:
+            ctx.cancel_event.set()
+        self._notify()
+        return True
+
+    def to_dict(self, job):
+        """``job_to_dict`` with progress this process has reported but not yet written."""
+        state = job_to_dict(job)
+        state.update(self._unsaved.get(job.id, {}))
+        return state
+
+    def wait_for_change(self, timeout):
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def _update(self, job_id, wait=True, **fields):
+        """Write job columns on a connection of their own, outside the job's work transaction.
+
+        Progress ticks therefore never commit (and expire) the handler's
+        session. With ``wait=False`` a write that would queue behind the
+        handler's own open write transaction (SQLite has one writer) is
+        kept in memory instead, merged into ``to_dict`` and retried on the
+        next tick; final states always wait.
+        """
+        fields = {name: value for name, value in fields.items() if value is not UNCHANGED}
+        if wait:
+            fields = {**self._unsaved.pop(job_id, {}), **fields}
+        else:
+            fields = {**self._unsaved.get(job_id, {}), **fields}
+        if fields:
+            if self._write(job_id, fields, wait):
+                if not wait:
+                    self._unsaved.pop(job_id, None)
+            else:
+                self._unsaved[job_id] = {name: fields[name] for name in PROGRESS_FIELDS if name in fields}
+        self._notify()
+
+    def _write(self, job_id, fields, wait):
+        table = Job.__table__
+        with db.engine.connect() as conn:
+            sqlite = conn.dialect.name == 'sqlite'
+            if sqlite and not wait:
+                conn.exec_driver_sql('PRAGMA busy_timeout=0')
+            try:
+                conn.execute(table.update().where(table.c.id == job_id).values(**fields))
+                conn.commit()
+                return True
+            except OperationalError:
+                if wait:
+                    raise
+                conn.rollback()
+                return False
+            finally:
+                if sqlite and not wait:
+                    conn.exec_driver_sql(f"PRAGMA busy_timeout={SQLITE_PRAGMAS['busy_timeout']}")
+
+    def _run(self, job_id, kind, params):
+        ctx = self._contexts[job_id]
+        # ``profile`` is for the queue, not the handler
+        params = dict(params)
+        profile = Profile(f"job {kind}") if params.pop('profile', False) else nullcontext()
+        # Metronome, Stripe and database timings recorded by the job are labelled with its kind
+        token = current_job.set(kind)
+        with self.app.app_context():
+            try:
+                if db.session.get(Job, job_id).cancel_requested:
+                    raise JobCancelled()
+                self._update(job_id, status='running', started_at=datetime.now(timezone.utc))
+                with profile, trace(f"job {kind}", {'job.id': job_id, 'job.kind': kind}):
+                    message = self.handlers[kind](ctx, **params)
+                # The final state is written on another connection, so the handler's work is committed first
+                db.session.commit()
+                self._update(job_id, status='succeeded', progress=1.0, message=message,
+                             finished_at=datetime.now(timezone.utc))
+            except JobCancelled:
+                db.session.rollback()
+                self._update(job_id, status='cancelled', message='Cancelled',
+                             finished_at=datetime.now(timezone.utc))
+            except Exception as e:
+                db.session.rollback()
+                logging.exception(f"Job {kind} ({job_id}) failed")
+                self._update(job_id, status='failed', message=str(e),
+                             finished_at=datetime.now(timezone.utc))
+            finally:
+                self._contexts.pop(job_id, None)
+                self._unsaved.pop(job_id, None)
+                db.session.remove()
+                current_job.reset(token)
+
+
+def job_to_dict(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -0,0 +1,103 @@
+import logging
+from datetime import datetime, timezone
+from website import db
+from website.search import create_customer_search_index, rebuild_customer_search_index
+
+# Single-row table recording the schema version the database has been migrated to
+schema_version = db.Table(
+    'schema_version', db.metadata,
+    db.Column('version', db.Integer, nullable=False),
+    db.Column('applied_at', db.DateTime)
+)
+
+
+def create_tables(conn):
+    """Create any model table that does not exist yet (the original schema on a new database)."""
+    db.metadata.create_all(bind=conn)
+
+
+def add_missing_columns(conn):
+    """Add columns declared on the models but absent from older databases.
+
+    Covers databases created before ``last_synced`` and ``content_hash`` were
+    introduced, which used to be dropped and re-synced from scratch.
+    """
+    inspector = db.inspect(conn)
+    preparer = conn.dialect.identifier_preparer
+    for table in db.metadata.sorted_tables:
+        if table.name == schema_version.name:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(db.text(
+                f"ALTER TABLE {preparer.quote(table.name)} ADD COLUMN {preparer.quote(column.name)} {column_type}"
+            ))
+            logging.info(f"Added column {table.name}.{column.name}")
+
+
+def ensure_indexes(conn):
+    """Create every index declared on the models that the database does not have yet.
+
+    ``create_all()`` only creates indexes together with new tables, so indexes
+    added to existing models are applied here. Returns the names created.
+    """
+    inspector = db.inspect(conn)
+    created = []
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=conn)
+                created.append(index.name)
+                logging.info(f"Created index {index.name} on {table.name}")
+    return created
+
+
+# Ordered schema migrations. Append new steps; never reorder or edit applied ones.
+MIGRATIONS = [
+    (1, "Create tables", create_tables),
+    (2, "Add sync tracking columns", add_missing_columns),
+    (3, "Add sort and filter indexes", ensure_indexes),
+    (4, "Add background job table", create_tables),
+    (5, "Add customer search index", create_customer_search_index),
+    (6, "Add usage rollup tables", create_tables),
+    (7, "Add spend projection table", create_tables),
+    (8, "Index Metronome IDs for customer search", rebuild_customer_search_index),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    if not db.inspect(conn).has_table(schema_version.name):
+        return 0
+    return conn.execute(db.select(schema_version.c.version)).scalar() or 0
+
+
+def run_migrations(engine=None):
+    """Bring the database schema up to ``LATEST_VERSION``.
+
+    Each pending migration runs in its own transaction together with the
+    version bump, so an interrupted upgrade resumes where it stopped. When
+    the schema is already current this costs a single query. Data is never
+    dropped.
+    """
+    engine = engine or db.engine
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version >= LATEST_VERSION:
+        return version
+
+    for number, description, migrate in MIGRATIONS:
+        if number <= version:
+            continue
+        logging.info(f"Applying migration {number}: {description}")
+        with engine.begin() as conn:
+            schema_version.create(bind=conn, checkfirst=True)
+            migrate(conn)
+            conn.execute(schema_version.delete())
+            conn.execute(schema_version.insert().values(version=number, applied_at=datetime.now(timezone.utc)))
+        version = number
+    return version
@@ -2,8 +2,13 @@ from datetime import datetime
 from website import db
 
 class LogEntry(db.Model):
+    __table_args__ = (
+        # /logs filters by level and always orders newest first
+        db.Index('ix_log_entry_level_timestamp', 'level', 'timestamp'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     level = db.Column(db.String(10))
     message = db.Column(db.Text)
 
@@ -16,28 +21,86 @@ class Product(db.Model):
     created_at = db.Column(db.DateTime)
     last_synced = db.Column(db.DateTime)
     credit_types = db.Column(db.JSON)  # Store credit types as JSON
+    content_hash = db.Column(db.String(40))  # Hash of the last synced Metronome payload
 
 class Contract(db.Model):
+    __table_args__ = (
+        # Backs the newest-first keyset pagination on /contracts
+        db.Index('ix_contract_starting_at_id', 'starting_at', 'id'),
+    )
+
     id = db.Column(db.String(36), primary_key=True)
-    customer_id = db.Column(db.String(36), db.ForeignKey('customer.metronome_id'))
+    customer_id = db.Column(db.String(36), db.ForeignKey('customer.metronome_id'), index=True)
     name = db.Column(db.String(255))
     product_name = db.Column(db.String(255))
     rate_card_name = db.Column(db.String(255))
-    status = db.Column(db.String(50))
+    status = db.Column(db.String(50), index=True)
     starting_at = db.Column(db.DateTime)
     ending_before = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime)
     last_synced = db.Column(db.DateTime)
+    content_hash = db.Column(db.String(40))
 
     customer = db.relationship('Customer', backref=db.backref('contracts', lazy=True))
 
 class Customer(db.Model):
+    # Every column /customers can sort or search on is indexed
     id = db.Column(db.Integer, primary_key=True)
     metronome_id = db.Column(db.String(255), unique=True)
-    name = db.Column(db.String(255))
-    salesforce_id = db.Column(db.String(255))
-    rate_card_id = db.Column(db.String(255))
+    name = db.Column(db.String(255), index=True)
+    salesforce_id = db.Column(db.String(255), index=True)
+    rate_card_id = db.Column(db.String(255), index=True)
     stripe_id = db.Column(db.String(255))
-    created_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, index=True)
     last_synced = db.Column(db.DateTime)
-    status = db.Column(db.String(50))
+    status = db.Column(db.String(50), index=True)
+    content_hash = db.Column(db.String(40))
+
+class SyncState(db.Model):
+    entity = db.Column(db.String(50), primary_key=True)  # 'customer', 'product' or 'contract'
+    high_water_mark = db.Column(db.DateTime)  # Latest remote updated_at seen
+    last_synced = db.Column(db.DateTime)
+
+class Job(db.Model):
+    id = db.Column(db.String(36), primary_key=True)
+    kind = db.Column(db.String(50))  # e.g. 'refresh_products'
+    params = db.Column(db.JSON)
+    dedupe_key = db.Column(db.String(255), index=True)  # Identical active jobs share a key
+    status = db.Column(db.String(20), index=True)  # queued, running, succeeded, failed, cancelled
+    progress = db.Column(db.Float)  # 0..1, or None while unknown
+    message = db.Column(db.Text)
+    cancel_requested = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+class UsageRollup(db.Model):
+    # Usage totals filled from the ingest spool. Metrics are tokens:<model> and
+    # gpu_seconds:<type>, plus per-customer totals 'tokens', 'gpu_seconds' and 'cost'
+    __table_args__ = (
+        # Covers the top-customers ranking; ordered by customer so it groups without sorting
+        db.Index('ix_usage_rollup_ranking', 'resolution', 'metric', 'customer_id', 'period_start', 'quantity'),
+        # Clustered on the primary key, so a customer's series is one contiguous range
+        {'sqlite_with_rowid': False},
+    )
+
+    resolution = db.Column(db.String(8), primary_key=True)  # 'hour' or 'day'
+    customer_id = db.Column(db.String(36), primary_key=True)
+    metric = db.Column(db.String(255), primary_key=True)
+    period_start = db.Column(db.Integer, primary_key=True)  # Epoch seconds
+    quantity = db.Column(db.Float, nullable=False, default=0.0)
+
+class UsageSpoolSegment(db.Model):
+    name = db.Column(db.String(64), primary_key=True)  # Spool segment already applied to the rollups
+    events = db.Column(db.Integer)
+    applied_at = db.Column(db.DateTime)
+
+class SpendProjection(db.Model):
+    customer_id = db.Column(db.String(36), primary_key=True)
+    period_start = db.Column(db.DateTime)  # Billing period (calendar month, UTC) projected
+    spend_to_date = db.Column(db.Float)
+    projected = db.Column(db.Float, index=True)
+    projected_high = db.Column(db.Float)  # 90th percentile
+    balance = db.Column(db.Float)  # Dollars left on USD commits and credits, when known
+    exhausted_at = db.Column(db.DateTime)  # Projected hour the balance runs out, for alerts
+    computed_at = db.Column(db.DateTime, index=True)
@@ -0,0 +1,58 @@
+import json
+from pathlib import Path
+from website import db
+from website.models import Contract, Customer
+from website.streaming import stream_rows
+from metronome_billing.core.reconcile import (
+    Reconciler, customer_drift, metronome_customer_records, stripe_customer_records
+)
+
+RECONCILE_DIR = Path(__file__).parent.parent / '.cache' / 'reconcile'
+
+
+def local_customer_records():
+    stmt = db.select(Customer.metronome_id, Customer.name, Customer.stripe_id)
+    for metronome_id, name, stripe_id in stream_rows(stmt):
+        if metronome_id:
+            yield metronome_id, {'name': name, 'stripe_id': stripe_id}
+
+
+def contract_customer_records():
+    stmt = db.select(Contract.customer_id).where(Contract.customer_id.is_not(None)).distinct()
+    for (customer_id,) in stream_rows(stmt):
+        yield customer_id, {}
+
+
+def reconcile_customers(api, stripe=None, workdir=RECONCILE_DIR, progress=None):
+    """Diff Metronome customers against the local tables and (when given) Stripe.
+
+    ``stripe`` is the configured ``stripe`` module; without it the Stripe
+    checks are skipped. Returns the summary written to ``workdir/state.json``;
+    the per-customer drift is in ``workdir/drift.ndjson``.
+    """
+    def report(fraction, message):
+        if progress:
+            progress(fraction, message)
+
+    reconciler = Reconciler(workdir, customer_drift)
+    report(0.0, "Reading Metronome customers")
+    reconciler.add_source('metronome', metronome_customer_records(api.iter_customers()),
+                          progress=lambda n: report(None, f"Read {n} Metronome customers"))
+    if stripe is not None:
+        report(0.4, "Reading Stripe customers")
+        reconciler.add_source('stripe', stripe_customer_records(stripe.Customer.list(limit=100).auto_paging_iter()),
+                              progress=lambda n: report(None, f"Read {n} Stripe customers"))
+    report(0.7, "Reading local customers and contracts")
+    reconciler.add_source('local', local_customer_records())
+    reconciler.add_source('contract', contract_customer_records())
+    return reconciler.run(progress=lambda fraction: report(0.8 + 0.2 * fraction, None))
+
+
+def last_summary(workdir=RECONCILE_DIR):
+    """Summary of the most recent reconciliation, or None."""
+    try:
+        state = json.loads((Path(workdir) / 'state.json').read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+    state.pop('buckets', None)
+    return state
@@ -0,0 +1,104 @@
+import logging
+import re
+from sqlalchemy.exc import OperationalError
+from website import db
+from website.models import Customer
+
+SEARCH_TABLE = 'customer_search'
+# Trigrams need at least three characters; shorter queries fall back to LIKE
+MIN_INDEXED_LENGTH = 3
+UUID_PATTERN = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', re.IGNORECASE)
+SEARCH_COLUMNS = ('name', 'metronome_id', 'salesforce_id')
+
+# Engine URL -> whether the database has the FTS index, checked once per engine
+_index_available = {}
+
+
+def create_customer_search_index(conn):
+    """Create an FTS5 trigram index over customer names, Metronome IDs and Salesforce IDs.
+
+    The index is an external-content table over ``customer``, kept current
+    by triggers, so it stores only the trigrams. Skipped when the database
+    is not SQLite or its SQLite build lacks FTS5 / the trigram tokenizer;
+    search then falls back to LIKE.
+    """
+    if conn.dialect.name != 'sqlite':
+        return
+    columns = ', '.join(SEARCH_COLUMNS)
+    old_values = ', '.join(f"old.{column}" for column in SEARCH_COLUMNS)
+    new_values = ', '.join(f"new.{column}" for column in SEARCH_COLUMNS)
+    changed = ' OR '.join(f"old.{column} IS NOT new.{column}" for column in SEARCH_COLUMNS)
+    try:
+        conn.execute(db.text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            f"{columns}, content='customer', content_rowid='id', tokenize='trigram')"
+        ))
+    except OperationalError as e:
+        logging.warning(f"Customer search index not available, falling back to LIKE: {e}")
+        return
+
+    conn.execute(db.text(f"""
+        CREATE TRIGGER IF NOT EXISTS customer_search_insert AFTER INSERT ON customer BEGIN
+            INSERT INTO {SEARCH_TABLE}(rowid, {columns}) VALUES (new.id, {new_values});
+        END"""))
+    conn.execute(db.text(f"""
+        CREATE TRIGGER IF NOT EXISTS customer_search_delete AFTER DELETE ON customer BEGIN
+            INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        END"""))
+    conn.execute(db.text(f"""
+        CREATE TRIGGER IF NOT EXISTS customer_search_update AFTER UPDATE OF {columns} ON customer
+        WHEN {changed} BEGIN
+            INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {SEARCH_TABLE}(rowid, {columns}) VALUES (new.id, {new_values});
+        END"""))
+    # Index the customers that already exist
+    conn.execute(db.text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"))
+
+
+def rebuild_customer_search_index(conn):
+    """Recreate the search index with the current ``SEARCH_COLUMNS`` (it used to leave out Metronome IDs)."""
+    if conn.dialect.name != 'sqlite':
+        return
+    for trigger in ('customer_search_insert', 'customer_search_delete', 'customer_search_update'):
+        conn.execute(db.text(f"DROP TRIGGER IF EXISTS {trigger}"))
+    conn.execute(db.text(f"DROP TABLE IF EXISTS {SEARCH_TABLE}"))
+    _index_available.clear()
+    create_customer_search_index(conn)
+
+
+def search_index_available():
+    engine = db.engine
+    key = str(engine.url)
+    if key not in _index_available:
+        _index_available[key] = db.inspect(engine).has_table(SEARCH_TABLE)
+    return _index_available[key]
+
+
+def _like_condition(search_query):
+    search = f"%{search_query}%"
+    return db.or_(
+        Customer.name.ilike(search),
+        Customer.metronome_id.ilike(search),
+        Customer.salesforce_id.ilike(search)
+    )
+
+
+def customer_search_condition(search_query):
+    """SQL condition matching customers for the search box.
+
+    - A full UUID is an exact lookup on the unique ``metronome_id`` index.
+    - Otherwise, with the FTS index and at least three characters, names,
+      Metronome IDs and Salesforce IDs are matched by substring
+      (case-insensitively) through the trigram index.
+    - Without the index, or for shorter queries, the LIKE scan is used.
+    """
+    if UUID_PATTERN.match(search_query):
+        return Customer.metronome_id == search_query.lower()
+    if len(search_query) < MIN_INDEXED_LENGTH or not search_index_available():
+        return _like_condition(search_query)
+
+    phrase = '"' + search_query.replace('"', '""') + '"'
+    matches = db.select(db.column('rowid')).select_from(db.table(SEARCH_TABLE)).where(
+        db.text(f"{SEARCH_TABLE} MATCH :phrase").bindparams(phrase=phrase)
+    )
+    return Customer.id.in_(matches)
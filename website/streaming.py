@@ -0,0 +1,63 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from flask import Response, stream_with_context
+from website import db
+
+# Rows fetched per round trip from the database cursor
+STREAM_BATCH_ROWS = 1000
+
+
+def _cell(value):
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+
+def stream_rows(stmt, batch_rows=STREAM_BATCH_ROWS):
+    """Execute a Core select and yield plain row tuples, ``batch_rows`` at a time from the cursor.
+
+    ``yield_per`` keeps only one batch in memory; nothing is hydrated into
+    ORM objects.
+    """
+    result = db.session.execute(stmt.execution_options(yield_per=batch_rows))
+    for partition in result.partitions():
+        yield from partition
+
+
+def csv_chunks(header, rows, rows_per_chunk=STREAM_BATCH_ROWS):
+    """Encode rows as CSV, yielding one string per ``rows_per_chunk`` rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_cell(value) for value in row])
+        if count % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_chunks(fields, rows, rows_per_chunk=STREAM_BATCH_ROWS):
+    """Encode rows as one JSON object per line, yielding one string per ``rows_per_chunk`` rows."""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(fields, row)), default=_cell, separators=(',', ':')))
+        if len(lines) >= rows_per_chunk:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def download(chunks, mimetype, filename):
+    """Stream ``chunks`` as an attachment.
+
+    Without a Content-Length the response goes out with chunked transfer
+    encoding, so the download starts with the first batch. The request
+    context (and its database session) stays open until the last chunk.
+    """
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+from website import db
+from website.models import Customer, SyncState
+from website.upsert import chunked_upsert
+from metronome_billing.utils.profiling import phase
+
+CUSTOMER_CHUNK_SIZE = 5000
+
+
+def parse_created_at(record):
+    """Parse a Metronome ``created_at`` timestamp, returning None when absent or malformed."""
+    return _parse_timestamp(record.get('created_at'))
+
+
+def _parse_timestamp(value):
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (ValueError, AttributeError):
+        return None
+    # SQLite hands back naive datetimes, so compare everything as naive UTC
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+
+
+def content_hash(record):
+    """Stable hash of a remote payload, used to detect records that have not changed."""
+    encoded = json.dumps(record, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(encoded.encode()).hexdigest()
+
+
+class DeltaTracker:
+    """Decides which remote records of one entity changed since the last sync.
+
+    Metronome's list endpoints used here take no changed-since filter, so the
+    whole list is still read. A record is then treated as unchanged when it
+    already exists locally and either its ``updated_at`` marker is at or below
+    the entity's stored high-water mark, or its content hash matches the one
+    stored with the row. Call ``save()`` after the changes are committed to
+    advance the high-water mark. Report records that could not be written
+    with ``failed()``: the mark then stays where it was, so they are not
+    skipped as unchanged on the next sync.
+    """
+
+    def __init__(self, entity, stored_hashes):
+        self.entity = entity
+        self.stored_hashes = stored_hashes
+        state = db.session.get(SyncState, entity)
+        self.high_water_mark = state.high_water_mark if state else None
+        self._new_mark = self.high_water_mark
+        self.unchanged_count = 0
+        self.failed_count = 0
+
+    def changed(self, key, record):
+        """Return the record's content hash if it needs writing, otherwise None."""
+        stored = self.stored_hashes.get(key)
+        marker = _parse_timestamp(record.get('updated_at'))
+        if marker and (self._new_mark is None or marker > self._new_mark):
+            self._new_mark = marker
+
+        if stored is not None and marker and self.high_water_mark and marker <= self.high_water_mark:
+            self.unchanged_count += 1
+            return None
+        digest = content_hash(record)
+        if digest == stored:
+            self.unchanged_count += 1
+            return None
+        return digest
+
+    def failed(self):
+        """Record that a changed record, or a batch such as one customer's contracts, was not written."""
+        self.failed_count += 1
+
+    def save(self):
+        state = db.session.get(SyncState, self.entity) or SyncState(entity=self.entity)
+        if self.failed_count:
+            logging.warning(f"Keeping the {self.entity} high-water mark: {self.failed_count} records were not written")
+        else:
+            state.high_water_mark = self._new_mark
+        state.last_synced = datetime.now(timezone.utc)
+        db.session.add(state)
+        db.session.commit()
+
+
+def customer_rows(customers, synced_at, tracker=None):
+    """Map Metronome customer payloads to ``Customer`` column values, skipping unchanged ones."""
+    for customer_data in customers:
+        customer_id = customer_data.get('id')
+        if not customer_id:
+            logging.warning(f"Skipping customer with no ID: {customer_data}")
+            continue
+        digest = tracker.changed(customer_id, customer_data) if tracker else content_hash(customer_data)
+        if digest is None:
+            continue
+        yield {
+            'metronome_id': customer_id,
+            'name': customer_data.get('name', 'Unnamed Customer'),
+            'salesforce_id': customer_data.get('salesforce_id'),
+            'rate_card_id': customer_data.get('rate_card_id'),
+            'created_at': parse_created_at(customer_data),
+            'last_synced': synced_at,
+            'content_hash': digest,
+        }
+
+
+def upsert_customers(customers, chunk_size=CUSTOMER_CHUNK_SIZE):
+    """Write changed Metronome customers to the local database.
+
+    Rows go out as ``INSERT ... ON CONFLICT (metronome_id) DO UPDATE``
+    executemany batches, one transaction per chunk; customers whose payload
+    is unchanged since the last sync are not written at all. Columns set
+    only locally (``stripe_id``, ``status``) are left untouched. Returns
+    ``(updated_count, created_count, unchanged_count)``.
+    """
+    with phase('upsert'):
+        stored_hashes = dict(db.session.query(Customer.metronome_id, Customer.content_hash))
+        tracker = DeltaTracker('customer', stored_hashes)
+        rows = list(customer_rows(customers, datetime.now(timezone.utc), tracker))
+        chunked_upsert(
+            Customer, rows, ['metronome_id'], chunk_size=chunk_size,
+            on_chunk=lambda total: logging.info(f"Committed {total}/{len(rows)} changed customers")
+        )
+        tracker.save()
+    updated_count = sum(1 for row in rows if row['metronome_id'] in stored_hashes)
+    return updated_count, len(rows) - updated_count, tracker.unchanged_count
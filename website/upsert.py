@@ -0,0 +1,60 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from website import db
+from metronome_billing.utils.tracing import span
+
+
+def bulk_upsert(model, rows, index_elements, update_columns=None):
+    """Insert or update ``rows`` for ``model`` in a single executemany statement.
+
+    Rows whose ``index_elements`` already exist have ``update_columns`` (by
+    default every supplied column except the conflict keys) overwritten.
+    The statement runs on the current session, so the caller commits.
+    """
+    if not rows:
+        return 0
+
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+    insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    stmt = insert(table)
+
+    if update_columns is None:
+        update_columns = [name for name in rows[0] if name not in index_elements]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={name: stmt.excluded[name] for name in update_columns}
+    )
+    with span('db.upsert', {'db.sql.table': table.name, 'db.rows': len(rows)}):
+        db.session.execute(stmt, rows)
+    return len(rows)
+
+
+def chunked_upsert(model, rows, index_elements, chunk_size=5000, on_chunk=None):
+    """Upsert an iterable of rows in chunks, committing one transaction per chunk.
+
+    ``on_chunk`` is called with the running total after each commit.
+    """
+    total = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            total += _commit_chunk(model, chunk, index_elements)
+            chunk = []
+            if on_chunk:
+                on_chunk(total)
+    if chunk:
+        total += _commit_chunk(model, chunk, index_elements)
+        if on_chunk:
+            on_chunk(total)
+    return total
+
+
+def _commit_chunk(model, chunk, index_elements):
+    try:
+        count = bulk_upsert(model, chunk, index_elements)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return count
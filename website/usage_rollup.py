@@ -0,0 +1,207 @@
+import logging
+import math
+import time
+from datetime import datetime, timezone
+from sqlalchemy.dialects import postgresql, sqlite
+from website import db
+from website.models import Customer, UsageRollup, UsageSpoolSegment
+from metronome_billing.core.pricing import metric_price_at
+from metronome_billing.core.rate_schedule import DEFAULT_RATE_CARD_ID, default_rate_schedule
+from metronome_billing.core.usage import usage_metric
+from metronome_billing.utils.spool import Spool
+
+RESOLUTIONS = {'hour': 3600, 'day': 86400}
+KINDS = ('tokens', 'gpu_seconds')
+# Ranges up to 30 days are charted from hourly rollups, longer ones from daily
+HOURLY_MAX_RANGE = 30 * 86400
+# Hourly rollups older than this are dropped; the daily ones are kept
+HOURLY_RETENTION = 32 * 86400
+DEFAULT_POINTS = 180
+
+
+def rollup_metrics(event, at=None, rates=None):
+    """The rollup metrics one usage event adds to, as ``(metric, quantity)`` pairs.
+
+    Besides its usage, every event adds its ``cost`` in dollars, the series
+    spend forecasts are fitted to: priced at the stored rate card rate in
+    effect at ``at`` when ``rates`` covers it, else at list price.
+    """
+    metric = usage_metric(event)
+    if metric is None:
+        return []
+    name, quantity = metric
+    cost = ('cost', quantity * metric_price_at(name, at, rates, DEFAULT_RATE_CARD_ID))
+    if name.startswith('tokens:'):
+        model = name[len('tokens:'):].rsplit(':', 1)[0]
+        return [(f"tokens:{model}", quantity), ('tokens', quantity), cost]
+    seconds = quantity * 3600
+    return [(f"gpu_seconds:{name[len('gpu:'):]}", seconds), ('gpu_seconds', seconds), cost]
+
+
+def _epoch(timestamp):
+    """Seconds since the epoch, or None for a timestamp that is not ISO 8601."""
+    try:
+        parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def aggregate_events(events):
+    """Sum events into ``{(resolution, customer_id, metric, period_start): quantity}``.
+
+    Returns the totals and the number of events skipped for an unreadable
+    timestamp, which would otherwise fail their spool segment on every run.
+    """
+    totals = {}
+    invalid_events = 0
+    rates = default_rate_schedule()
+    for event in events:
+        customer_id = event.get('customer_id')
+        timestamp = event.get('timestamp')
+        if not customer_id or not timestamp:
+            continue
+        epoch = _epoch(timestamp)
+        if epoch is None:
+            invalid_events += 1
+            continue
+        at = datetime.fromtimestamp(epoch, timezone.utc)
+        for metric, quantity in rollup_metrics(event, at, rates):
+            for resolution, step in RESOLUTIONS.items():
+                key = (resolution, customer_id, metric, epoch - epoch % step)
+                totals[key] = totals.get(key, 0.0) + quantity
+    return totals, invalid_events
+
+
+def add_to_rollups(totals):
+    """Add aggregated quantities to the stored rollups on the current session."""
+    if not totals:
+        return 0
+    table = UsageRollup.__table__
+    dialect = db.session.get_bind().dialect.name
+    insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['resolution', 'customer_id', 'metric', 'period_start'],
+        set_={'quantity': table.c.quantity + stmt.excluded.quantity}
+    )
+    rows = [
+        {'resolution': resolution, 'customer_id': customer_id, 'metric': metric,
+         'period_start': period_start, 'quantity': quantity}
+        for (resolution, customer_id, metric, period_start), quantity in totals.items()
+    ]
+    db.session.execute(stmt, rows)
+    return len(rows)
+
+
+def drain_spool(spool=None, progress=None):
+    """Apply every complete spool segment to the rollups, then delete it.
+
+    Each segment is applied in one transaction together with a record of
+    its name, so a segment left behind by an interrupted run is never
+    counted twice. Returns ``(segments, events)`` applied.
+    """
+    spool = spool or Spool()
+    segments = spool.segments()
+    applied_segments = applied_events = 0
+    for number, segment in enumerate(segments, 1):
+        if db.session.get(UsageSpoolSegment, segment.name) is None:
+            events = 0
+
+            def counted(stream):
+                nonlocal events
+                for event in stream:
+                    events += 1
+                    yield event
+
+            try:
+                totals, invalid_events = aggregate_events(counted(spool.read(segment)))
+                if invalid_events:
+                    logging.warning(f"Skipped {invalid_events} events with unreadable timestamps in spool segment "
+                                    f"{segment.name}")
+                add_to_rollups(totals)
+                db.session.add(UsageSpoolSegment(name=segment.name, events=events,
+                                                 applied_at=datetime.now(timezone.utc)))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            applied_segments += 1
+            applied_events += events
+        segment.unlink()
+        db.session.execute(db.delete(UsageSpoolSegment).where(UsageSpoolSegment.name == segment.name))
+        db.session.commit()
+        if progress:
+            progress(number / len(segments), f"Applied {number}/{len(segments)} spool segments")
+
+    cutoff = int(time.time()) - HOURLY_RETENTION
+    db.session.execute(db.delete(UsageRollup).where(UsageRollup.resolution == 'hour',
+                                                    UsageRollup.period_start < cutoff))
+    db.session.commit()
+    logging.info(f"Applied {applied_events} usage events from {applied_segments} spool segments")
+    return applied_segments, applied_events
+
+
+def chart_window(days, now=None):
+    """``(start, end, resolution, width)`` in epoch seconds for a chart of the last ``days`` days.
+
+    ``width`` is the downsampled bucket size: a multiple of the rollup
+    resolution giving at most ``DEFAULT_POINTS`` points.
+    """
+    span = days * 86400
+    resolution = 'hour' if span <= HOURLY_MAX_RANGE else 'day'
+    step = RESOLUTIONS[resolution]
+    now = int(now if now is not None else time.time())
+    end = now - now % step + step
+    start = end - span
+    width = max(1, math.ceil(span / DEFAULT_POINTS / step)) * step
+    return start, end, resolution, width
+
+
+def _kind_range(kind):
+    # Metrics of one kind sort between '<kind>:' and '<kind>;', so the primary key index is used
+    return UsageRollup.metric > f"{kind}:", UsageRollup.metric < f"{kind};"
+
+
+def customer_series(customer_id, kind, days):
+    """One customer's usage of ``kind`` per model or GPU type, downsampled to chart resolution."""
+    start, end, resolution, width = chart_window(days)
+    bucket = (UsageRollup.period_start - start) // width
+    stmt = db.select(UsageRollup.metric, bucket, db.func.sum(UsageRollup.quantity)).where(
+        UsageRollup.resolution == resolution,
+        UsageRollup.customer_id == customer_id,
+        *_kind_range(kind),
+        UsageRollup.period_start >= start,
+        UsageRollup.period_start < end,
+    ).group_by(UsageRollup.metric, bucket)
+
+    points = math.ceil((end - start) / width)
+    series = {}
+    for metric, index, quantity in db.session.execute(stmt):
+        values = series.setdefault(metric.split(':', 1)[1], [0.0] * points)
+        values[int(index)] = round(quantity, 3)
+    labels = [datetime.fromtimestamp(start + i * width, timezone.utc).strftime('%Y-%m-%d %H:%M') for i in range(points)]
+    return {'labels': labels, 'series': dict(sorted(series.items())), 'resolution': resolution, 'width': width}
+
+
+def top_customers(kind, days, limit=10):
+    """The ``limit`` customers with the most usage of ``kind`` over the last ``days`` days."""
+    start, end, _, _ = chart_window(days)
+    start -= start % RESOLUTIONS['day']
+    total = db.func.sum(UsageRollup.quantity).label('total')
+    stmt = db.select(UsageRollup.customer_id, total).where(
+        UsageRollup.resolution == 'day',
+        UsageRollup.metric == kind,
+        UsageRollup.period_start >= start,
+        UsageRollup.period_start < end,
+    ).group_by(UsageRollup.customer_id).order_by(total.desc()).limit(limit)
+    rows = db.session.execute(stmt).all()
+
+    ids = [customer_id for customer_id, _ in rows]
+    names = dict(db.session.execute(
+        db.select(Customer.metronome_id, Customer.name).where(Customer.metronome_id.in_(ids))
+    ).all()) if ids else {}
+    return [{'customer_id': customer_id, 'name': names.get(customer_id), 'total': round(quantity, 3)}
+            for customer_id, quantity in rows]